@@ -5,3 +5,9 @@ class CoreConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "api"
     label = "api"
+
+    def ready(self):
+        from api.db import pool
+        from api.metrics import register_provider
+
+        register_provider("db_pool", pool.stats)
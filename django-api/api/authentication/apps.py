@@ -7,6 +7,18 @@ class AuthenticationConfig(AppConfig):
     label = "api_authentication"
 
     def ready(self):
+        from . import signals  # noqa: F401
+        from api.metrics import register_provider
+        from .cache import token_cache
+        from .hashing import hashing_pool
+
+        register_provider("token_cache", token_cache.stats)
+        register_provider("login_hash_pool", hashing_pool.stats)
+
+        from .revocation import revocation_list
+
+        register_provider("revocation_list", revocation_list.stats)
+
         # Ensure spectacular extension is imported so it registers the auth mapping
         try:
             from . import spectacular  # noqa: F401
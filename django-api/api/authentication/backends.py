@@ -2,9 +2,22 @@ import jwt
 
 from rest_framework import authentication, exceptions
 from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.hashers import identify_hasher, get_hasher
 
 from api.user.models import User
 from api.authentication.models import ActiveSession
+from api.authentication.cache import token_cache
+from api.authentication.hashing import hashing_pool
+from api.authentication.revocation import revocation_list
+from api.authentication.tokens import ACCESS_TOKEN_TYPE, stateless_enabled, user_from_claims
+from api.authentication.principal import (
+    PROFILE_RELATIONS,
+    USER_PROFILE_RELATED,
+    Principal,
+    resolve_principal,
+)
 
 
 class ActiveSessionAuthentication(authentication.BaseAuthentication):
@@ -29,17 +42,35 @@ class ActiveSessionAuthentication(authentication.BaseAuthentication):
         if len(parts) == 2 and parts[0].lower() in ("bearer", "token"):
             token = parts[1]
 
-        return self._authenticate_credentials(token)
+        view = request.parser_context.get("view")
+        return self._authenticate_credentials(token, getattr(view, "accepts_session_token", False))
 
-    def _authenticate_credentials(self, token):
+    def _authenticate_credentials(self, token, accepts_session_token=False):
 
         try:
-            jwt.decode(token, settings.SECRET_KEY, algorithms=["HS256"])
+            claims = jwt.decode(token, settings.SECRET_KEY, algorithms=["HS256"])
         except:
             raise exceptions.AuthenticationFailed(self.auth_error_message)
 
+        if claims.get("typ") == ACCESS_TOKEN_TYPE:
+            return self._authenticate_access_token(claims, token)
+
+        if stateless_enabled() and not accepts_session_token:
+            # The long-lived session token only refreshes and logs out; every other
+            # request needs a short-lived access token
+            raise exceptions.AuthenticationFailed(self.auth_error_message)
+
+        user = token_cache.get(token)
+        if user is not None:
+            user.principal = resolve_principal(user)
+            return (user, token)
+
         try:
-            active_session = ActiveSession.objects.get(token=token)
+            # Load the session, its user and the user's clinic profiles in one query
+            related = ["user"] + [f"user__{relation}" for relation in USER_PROFILE_RELATED]
+            active_session = ActiveSession.objects.select_related(*related).get(
+                token_digest=ActiveSession.digest(token)
+            )
         except:
             raise exceptions.AuthenticationFailed(self.auth_error_message)
 
@@ -53,4 +84,80 @@ class ActiveSessionAuthentication(authentication.BaseAuthentication):
             msg = {"success": False, "msg": "This user has been deactivated."}
             raise exceptions.AuthenticationFailed(msg)
 
+        token_cache.set(token, user)
+        user.principal = resolve_principal(user)
+
+        return (user, token)
+
+    def _authenticate_access_token(self, claims, token):
+        # Stateless mode: signature and expiry are already verified, only the
+        # in-memory revocation list is consulted
+        if not stateless_enabled():
+            raise exceptions.AuthenticationFailed(self.auth_error_message)
+
+        try:
+            revoked = revocation_list.is_revoked(claims["sid"], claims["ver"])
+            user = user_from_claims(claims)
+        except KeyError:
+            raise exceptions.AuthenticationFailed(self.auth_error_message)
+
+        if revoked:
+            raise exceptions.AuthenticationFailed(self.auth_error_message)
+
+        user.principal = self._principal_from_claims(user, claims)
         return (user, token)
+
+    def _principal_from_claims(self, user, claims):
+        role = claims.get("role")
+        relation = dict(PROFILE_RELATIONS).get(role)
+        if relation is None:
+            return Principal(user, role)
+        return Principal(user, role, profile_loader=lambda: getattr(user, relation))
+
+
+class PooledModelBackend(ModelBackend):
+    """ModelBackend that runs the password hasher in the bounded hashing pool.
+
+    Only the API login asks for the pool (`pooled=True`): the calling worker does
+    the user lookup and the expensive hash runs in `hashing_pool`, which raises
+    `LoginThrottled` (HTTP 429) when saturated and `HashingUnavailable` (503). Other
+    `authenticate()` callers, such as the admin login, which cannot render those
+    DRF exceptions, hash inline as ModelBackend does.
+    """
+
+    def authenticate(self, request, username=None, password=None, pooled=False, **kwargs):
+        if not pooled:
+            return super().authenticate(request, username=username, password=password, **kwargs)
+
+        UserModel = get_user_model()
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+
+        try:
+            user = UserModel._default_manager.get_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            # Hash anyway so unknown emails take as long as wrong passwords
+            hashing_pool.make_password(password)
+            return None
+
+        if not user.password or not hashing_pool.check_password(password, user.password):
+            return None
+
+        if not self.user_can_authenticate(user):
+            return None
+
+        self._upgrade_password(user, password)
+        return user
+
+    def _upgrade_password(self, user, password):
+        # Mirror AbstractBaseUser.check_password: re-hash with the preferred hasher
+        try:
+            hasher = identify_hasher(user.password)
+        except ValueError:
+            return
+        preferred = get_hasher("default")
+        if hasher.algorithm != preferred.algorithm or preferred.must_update(user.password):
+            user.password = hashing_pool.make_password(password)
+            user.save(update_fields=["password"])
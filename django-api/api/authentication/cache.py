@@ -0,0 +1,172 @@
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+
+class TokenCache:
+    """Bounded LRU + TTL cache of verified tokens.
+
+    Each entry maps a token to the id of its user, the `is_active` flag seen when it
+    was verified and a snapshot of the user row (with its preloaded clinic profiles),
+    so a hit authenticates the request without touching the database. Entries are
+    dropped when they expire, when the cache is full (least recently used first) or
+    when invalidated explicitly.
+
+    Entries live in each worker process, but invalidations are also written to the
+    shared cache CACHES[alias]: a generation per user, bumped when the user changes,
+    and a marker per revoked token. A hit checks both with one `get_many()` and
+    falls back to the database when they do not match, so a logout or deactivation
+    handled by one worker reaches the others on their next request.
+    """
+
+    def __init__(self, max_entries=1024, ttl=60, alias="default", prefix="auth:tokens"):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.alias = alias
+        self.prefix = prefix
+        self._entries = OrderedDict()
+        # user id -> set of cached tokens, used to invalidate every token of a user
+        self._by_user = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def _shared(self):
+        return caches[self.alias]
+
+    def _user_key(self, user_id):
+        return "%s:user:%s" % (self.prefix, user_id)
+
+    def _token_key(self, token):
+        return "%s:revoked:%s" % (self.prefix, hashlib.sha256(token.encode()).hexdigest())
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0 and self.ttl > 0
+
+    def get(self, token):
+        """Return a private copy of the cached user for `token`, or None."""
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            user_id, is_active, generation, user, expires = entry
+            if not is_active or expires <= time.monotonic():
+                self._discard(token)
+                self.misses += 1
+                return None
+
+        # Invalidated by another worker since it was cached?
+        user_key, token_key = self._user_key(user_id), self._token_key(token)
+        shared = self._shared.get_many([user_key, token_key])
+        with self._lock:
+            if token_key in shared or shared.get(user_key) != generation:
+                if self._entries.get(token) is entry:
+                    self._discard(token)
+                self.misses += 1
+                return None
+            if token in self._entries:
+                self._entries.move_to_end(token)
+            self.hits += 1
+
+        # Views may mutate request.user and its profiles; never hand out the cached
+        # instances themselves
+        user = copy.copy(user)
+        user._state.fields_cache = {
+            name: copy.copy(related) for name, related in user._state.fields_cache.items()
+        }
+        return user
+
+    def set(self, token, user):
+        if not self.enabled:
+            return
+
+        generation = self._shared.get(self._user_key(user.pk))
+        with self._lock:
+            if token in self._entries:
+                self._discard(token)
+
+            snapshot = copy.copy(user)
+            # The principal points back at the original instance; rebuilt on each hit
+            snapshot.__dict__.pop("principal", None)
+            expires = time.monotonic() + self.ttl
+            self._entries[token] = (user.pk, user.is_active, generation, snapshot, expires)
+            self._by_user.setdefault(user.pk, set()).add(token)
+
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._discard(oldest)
+                self.evictions += 1
+
+    def invalidate_token(self, token):
+        if self.enabled:
+            # Other workers go back to the database for this token while they may hold it
+            self._shared.set(self._token_key(token), True, self.ttl)
+        with self._lock:
+            if token in self._entries:
+                self._discard(token)
+                self.invalidations += 1
+
+    def invalidate_user(self, user_id):
+        if self.enabled:
+            self._bump(user_id)
+            # Again once committed: another worker may have cached the old row meanwhile
+            transaction.on_commit(lambda: self._bump(user_id))
+        with self._lock:
+            for token in list(self._by_user.get(user_id, ())):
+                self._discard(token)
+                self.invalidations += 1
+
+    def _bump(self, user_id):
+        self._shared.set(self._user_key(user_id), time.time_ns(), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_user.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+    def _discard(self, token):
+        # Caller must hold the lock
+        user_id = self._entries.pop(token)[0]
+        tokens = self._by_user.get(user_id)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._by_user[user_id]
+
+
+_config = getattr(settings, "AUTH_TOKEN_CACHE", {})
+
+token_cache = TokenCache(
+    max_entries=int(_config.get("MAX_ENTRIES", 1024)),
+    ttl=float(_config.get("TTL", 60)),
+    alias=_config.get("ALIAS", "default"),
+)
@@ -0,0 +1,197 @@
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from rest_framework import exceptions
+
+
+class LoginThrottled(exceptions.Throttled):
+    """Raised when the hashing pool cannot take another login; rendered as 429."""
+
+    default_detail = {"success": False, "msg": "Too many logins in progress, retry shortly."}
+
+
+class HashingUnavailable(exceptions.APIException):
+    """Raised when the hashing processes died; the pool is rebuilt for the next login."""
+
+    status_code = 503
+    default_detail = {"success": False, "msg": "Login is temporarily unavailable, retry shortly."}
+    default_code = "service_unavailable"
+
+    def __init__(self, wait=None):
+        super().__init__()
+        # Sent as Retry-After by DRF's exception handler
+        self.wait = wait
+
+
+def _start_method():
+    # Forking a worker that runs several threads (gunicorn gthread) can copy locks held
+    # by other threads into the child; start children from a clean process instead
+    methods = multiprocessing.get_all_start_methods()
+    return "forkserver" if "forkserver" in methods else "spawn"
+
+
+def _init_worker(settings_module):
+    # Under the spawn/forkserver start methods the child starts without Django
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", settings_module)
+    import django
+
+    django.setup()
+
+
+def _check_password(password, encoded):
+    from django.contrib.auth.hashers import check_password
+
+    start = time.perf_counter()
+    ok = check_password(password, encoded)
+    return ok, time.perf_counter() - start
+
+
+def _make_password(password):
+    from django.contrib.auth.hashers import make_password
+
+    start = time.perf_counter()
+    encoded = make_password(password)
+    return encoded, time.perf_counter() - start
+
+
+class HashingPool:
+    """Bounded process pool for password hashing with admission control.
+
+    At most `workers + queue_limit` hashes are admitted at once; anything beyond
+    that is rejected immediately with `LoginThrottled` instead of queueing behind
+    the other logins. With `workers=0` hashing runs inline in the calling thread.
+    """
+
+    def __init__(self, workers=2, queue_limit=8, timeout=10.0, retry_after=1):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self._slots = threading.BoundedSemaphore(max(1, workers + queue_limit))
+        self._executor = None
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.broken = 0
+        # recent samples in seconds
+        self._hash_latency = deque(maxlen=1000)
+        self._wait_latency = deque(maxlen=1000)
+
+    def check_password(self, password, encoded):
+        return self._run(_check_password, password, encoded)
+
+    def make_password(self, password):
+        return self._run(_make_password, password)
+
+    def _run(self, fn, *args):
+        if self.workers <= 0:
+            result, elapsed = fn(*args)
+            self._record(elapsed, elapsed)
+            return result
+
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise LoginThrottled(wait=self.retry_after)
+
+        start = time.perf_counter()
+        executor = self._get_executor()
+        try:
+            future = executor.submit(fn, *args)
+        except BrokenProcessPool:
+            self._slots.release()
+            self._discard_executor(executor)
+            raise HashingUnavailable(wait=self.retry_after)
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self.in_flight += 1
+        # The slot is held until the hash really finishes, even if we stop waiting
+        future.add_done_callback(self._release)
+
+        try:
+            result, elapsed = future.result(timeout=self.timeout)
+        except FutureTimeout:
+            with self._lock:
+                self.timeouts += 1
+            raise LoginThrottled(wait=self.retry_after)
+        except BrokenProcessPool:
+            # A worker died (OOM killer, ...): every later submit would fail too
+            self._discard_executor(executor)
+            raise HashingUnavailable(wait=self.retry_after)
+
+        self._record(elapsed, time.perf_counter() - start)
+        return result
+
+    def _get_executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=multiprocessing.get_context(_start_method()),
+                        initializer=_init_worker,
+                        initargs=(os.environ.get("DJANGO_SETTINGS_MODULE", "core.settings"),),
+                    )
+        return self._executor
+
+    def _discard_executor(self, executor):
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+                self.broken += 1
+        executor.shutdown(wait=False)
+
+    def _release(self, future):
+        with self._lock:
+            self.in_flight -= 1
+        self._slots.release()
+
+    def _record(self, hash_seconds, wait_seconds):
+        with self._lock:
+            self.completed += 1
+            self._hash_latency.append(hash_seconds)
+            self._wait_latency.append(wait_seconds)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def stats(self):
+        # api.metrics imports DRF, whose settings import the authentication backends
+        from api.metrics import percentiles
+
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "queue_limit": self.queue_limit,
+                "in_flight": self.in_flight,
+                "queue_depth": max(0, self.in_flight - self.workers),
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "timeouts": self.timeouts,
+                "broken": self.broken,
+                "hash_ms": percentiles(self._hash_latency),
+                "wait_ms": percentiles(self._wait_latency),
+            }
+
+
+_config = getattr(settings, "LOGIN_HASH_POOL", {})
+
+hashing_pool = HashingPool(
+    workers=int(_config.get("WORKERS", 2)),
+    queue_limit=int(_config.get("QUEUE_LIMIT", 8)),
+    timeout=float(_config.get("TIMEOUT", 10)),
+    retry_after=int(_config.get("RETRY_AFTER", 1)),
+)
@@ -0,0 +1,44 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from api.authentication.reaper import reap_expired_revocations, reap_expired_sessions
+
+
+class Command(BaseCommand):
+    help = "Delete expired ActiveSession and RevokedSession rows in bounded batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=None, help="Rows deleted per transaction")
+        parser.add_argument("--max-batches", type=int, default=None, help="Stop after this many batches")
+        parser.add_argument("--pause", type=float, default=0.0, help="Seconds to sleep between batches")
+        parser.add_argument(
+            "--every",
+            type=float,
+            default=None,
+            help="Keep running and sweep every this many seconds (default: AUTH_SESSIONS SWEEP_INTERVAL, 0 runs once)",
+        )
+
+    def handle(self, *args, **options):
+        every = options["every"]
+        if every is None:
+            every = getattr(settings, "AUTH_SESSIONS", {}).get("SWEEP_INTERVAL", 0)
+        while True:
+            self.sweep(options)
+            if every <= 0:
+                return
+            close_old_connections()
+            time.sleep(every)
+
+    def sweep(self, options):
+        deleted = reap_expired_sessions(
+            batch_size=options["batch_size"],
+            max_batches=options["max_batches"],
+            pause=options["pause"],
+        )
+        revocations = reap_expired_revocations(batch_size=options["batch_size"])
+        self.stdout.write(
+            self.style.SUCCESS(f"Deleted {deleted} expired sessions and {revocations} revocations")
+        )
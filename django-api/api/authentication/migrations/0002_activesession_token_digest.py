@@ -0,0 +1,55 @@
+import hashlib
+
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def backfill_token_digest(apps, schema_editor):
+    ActiveSession = apps.get_model("api_authentication", "ActiveSession")
+    seen = set()
+    last_pk = 0
+    while True:
+        batch = list(
+            ActiveSession.objects.filter(pk__gt=last_pk)
+            .order_by("pk")
+            .only("pk", "token")[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+
+        duplicates = []
+        for session in batch:
+            session.token_digest = hashlib.sha256(session.token.encode("utf-8")).hexdigest()
+            # Identical tokens belong to the same user and expire together; keep one
+            if session.token_digest in seen:
+                duplicates.append(session.pk)
+            seen.add(session.token_digest)
+
+        ActiveSession.objects.bulk_update(
+            [s for s in batch if s.pk not in duplicates], ["token_digest"]
+        )
+        if duplicates:
+            ActiveSession.objects.filter(pk__in=duplicates).delete()
+        last_pk = batch[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_authentication', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='activesession',
+            name='token_digest',
+            field=models.CharField(editable=False, max_length=64, null=True),
+        ),
+        migrations.RunPython(backfill_token_digest, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='activesession',
+            name='token_digest',
+            field=models.CharField(editable=False, max_length=64, unique=True),
+        ),
+    ]
@@ -0,0 +1,19 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_authentication', '0002_activesession_token_digest'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='activesession',
+            index=models.Index(fields=['user', 'date'], name='activesession_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='activesession',
+            index=models.Index(fields=['date'], name='activesession_date_idx'),
+        ),
+    ]
@@ -1 +1,2 @@
 from .active_session import ActiveSession
+from .revoked_session import RevokedSession
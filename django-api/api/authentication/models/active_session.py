@@ -1,7 +1,46 @@
+import hashlib
+from datetime import timedelta
+
+from django.conf import settings
 from django.db import models
+from django.utils import timezone
+
+
+def token_lifetime():
+    days = getattr(settings, "AUTH_SESSIONS", {}).get("TOKEN_LIFETIME_DAYS", 7)
+    return timedelta(days=days)
+
+
+class ActiveSessionQuerySet(models.QuerySet):
+    def expired(self, now=None):
+        now = now or timezone.now()
+        return self.filter(date__lt=now - token_lifetime())
 
 
 class ActiveSession(models.Model):
     user = models.ForeignKey("api_user.User", on_delete=models.CASCADE)
     token = models.CharField(max_length=255)
+    # Fixed-width SHA-256 of `token`; sessions are looked up by this indexed column
+    token_digest = models.CharField(max_length=64, unique=True, editable=False)
     date = models.DateTimeField(auto_now_add=True)
+    # Bumped whenever the user's credentials change; stateless access tokens carry
+    # the version they were issued for (see api.authentication.tokens)
+    version = models.PositiveIntegerField(default=1)
+
+    objects = ActiveSessionQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # login: newest session of a user
+            models.Index(fields=["user", "date"], name="activesession_user_date_idx"),
+            # reaper: sessions older than the token lifetime
+            models.Index(fields=["date"], name="activesession_date_idx"),
+        ]
+
+    @staticmethod
+    def digest(token):
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    def save(self, *args, **kwargs):
+        self.token_digest = self.digest(self.token)
+        super().save(*args, **kwargs)
@@ -0,0 +1,14 @@
+from django.db import models
+
+
+class RevokedSession(models.Model):
+    """Access tokens of `session_id` with a version <= `version` are revoked.
+
+    Shared by every worker; each one mirrors the unexpired rows in memory (see
+    `api.authentication.revocation`). Rows are only needed until the access tokens
+    they target expire, so `expires_at` lets the reaper purge them.
+    """
+
+    session_id = models.BigIntegerField()
+    version = models.PositiveIntegerField()
+    expires_at = models.DateTimeField(db_index=True)
@@ -0,0 +1,98 @@
+from django.core.exceptions import ObjectDoesNotExist
+
+RECEPCIONISTA = "recepcionista"
+VETERINARIO = "veterinario"
+ADMIN = "admin"
+
+# Reverse one-to-one relations holding the clinic profile of a user, in role order
+PROFILE_RELATIONS = (
+    (RECEPCIONISTA, "recepcionista_profile"),
+    (VETERINARIO, "veterinario_profile"),
+)
+
+# Pass to select_related() on a User queryset to load every profile in the same query
+USER_PROFILE_RELATED = tuple(relation for _, relation in PROFILE_RELATIONS)
+
+
+class Principal:
+    """The authenticated user together with its clinic role and profile.
+
+    Resolved once per request by the authentication layer so views never probe the
+    `*_profile` relations themselves. `role` is one of RECEPCIONISTA, VETERINARIO,
+    ADMIN or None for users without a clinic role.
+    """
+
+    def __init__(self, user, role=None, profile=None, profile_loader=None):
+        self.user = user
+        self.role = role
+        self._profile = profile
+        self._profile_loader = profile_loader
+
+    @property
+    def profile(self):
+        # Stateless tokens only carry the role; load the profile on first use
+        if self._profile is None and self._profile_loader is not None:
+            self._profile = self._profile_loader()
+            self._profile_loader = None
+        return self._profile
+
+    @property
+    def is_recepcionista(self):
+        return self.role == RECEPCIONISTA
+
+    @property
+    def is_veterinario(self):
+        return self.role == VETERINARIO
+
+    @property
+    def is_superuser(self):
+        return bool(getattr(self.user, "is_superuser", False))
+
+    @property
+    def is_admin(self):
+        return self.role == ADMIN
+
+    @property
+    def recepcionista(self):
+        return self.profile if self.is_recepcionista else None
+
+    @property
+    def veterinario(self):
+        return self.profile if self.is_veterinario else None
+
+    @property
+    def is_clinic_staff(self):
+        """Recepcionistas, veterinarios and superusers."""
+        return self.is_recepcionista or self.is_veterinario or self.is_superuser
+
+
+def resolve_principal(user):
+    """Build the principal from a user whose profiles were loaded with select_related.
+
+    Relations that were not preloaded are fetched here, at most once each.
+    """
+    if user is None or not getattr(user, "is_authenticated", False):
+        return Principal(user)
+
+    for role, relation in PROFILE_RELATIONS:
+        try:
+            profile = getattr(user, relation)
+        except ObjectDoesNotExist:
+            profile = None
+        if profile is not None:
+            return Principal(user, role, profile)
+
+    if user.is_superuser:
+        return Principal(user, ADMIN)
+    return Principal(user)
+
+
+def get_principal(request):
+    """Return the principal attached to `request.user`, resolving it if needed."""
+    user = getattr(request, "user", None)
+    principal = getattr(user, "principal", None)
+    if principal is None:
+        principal = resolve_principal(user)
+        if user is not None and getattr(user, "is_authenticated", False):
+            user.principal = principal
+    return principal
@@ -0,0 +1,64 @@
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from api.authentication.models import ActiveSession, RevokedSession
+
+
+def _config(key, default):
+    return getattr(settings, "AUTH_SESSIONS", {}).get(key, default)
+
+
+def reap_expired_sessions(batch_size=None, max_batches=None, pause=0.0, now=None):
+    """Delete sessions whose token has expired and return how many were removed.
+
+    Rows are removed in batches of at most `batch_size`, each in its own short
+    transaction, so the table is never locked for the whole sweep. `pause` seconds
+    are slept between batches to leave room for concurrent logins.
+    """
+    batch_size = batch_size or _config("REAP_BATCH_SIZE", 1000)
+    total = 0
+    batches = 0
+
+    while max_batches is None or batches < max_batches:
+        pks = list(
+            ActiveSession.objects.expired(now)
+            .order_by("date")
+            .values_list("pk", flat=True)[:batch_size]
+        )
+        if not pks:
+            break
+
+        with transaction.atomic():
+            # Deleting through the ORM sends post_delete, which evicts the tokens
+            # from the token cache
+            deleted, _ = ActiveSession.objects.filter(pk__in=pks).delete()
+
+        total += deleted
+        batches += 1
+        if len(pks) < batch_size:
+            break
+        if pause:
+            time.sleep(pause)
+
+    return total
+
+
+def reap_expired_revocations(batch_size=None, now=None):
+    """Delete revocation entries whose access tokens have all expired."""
+    batch_size = batch_size or _config("REAP_BATCH_SIZE", 1000)
+    now = now or timezone.now()
+    total = 0
+    while True:
+        pks = list(
+            RevokedSession.objects.filter(expires_at__lte=now).values_list("pk", flat=True)[:batch_size]
+        )
+        if not pks:
+            break
+        deleted, _ = RevokedSession.objects.filter(pk__in=pks).delete()
+        total += deleted
+        if len(pks) < batch_size:
+            break
+    return total
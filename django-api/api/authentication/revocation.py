@@ -0,0 +1,83 @@
+import threading
+import time
+
+from django.conf import settings
+from django.utils import timezone
+
+from api.authentication.models import RevokedSession
+from api.authentication.tokens import access_lifetime
+
+
+class RevocationList:
+    """In-memory mirror of the unexpired `RevokedSession` rows.
+
+    Maps a session id to the highest revoked version. Every worker keeps its own copy
+    and reloads it at most once per `sync_interval` seconds, so checking a token costs
+    a dict lookup and the database sees one small indexed query per interval. Rows
+    only matter while the access tokens they target are alive, so the whole set stays
+    small enough to reload instead of tracking increments.
+    """
+
+    def __init__(self, sync_interval=5.0):
+        self.sync_interval = sync_interval
+        # session id -> (revoked up to version, expires_at)
+        self._revoked = {}
+        self._next_sync = 0.0
+        self._lock = threading.Lock()
+        self.syncs = 0
+
+    def is_revoked(self, session_id, version):
+        self._maybe_sync()
+        entry = self._revoked.get(session_id)
+        return entry is not None and version <= entry[0]
+
+    def revoke(self, session_id, version):
+        self.revoke_many([(session_id, version)])
+
+    def revoke_many(self, sessions):
+        """Revoke every access token of each `(session_id, version)` up to that version."""
+        expires_at = timezone.now() + access_lifetime()
+        rows = RevokedSession.objects.bulk_create(
+            [RevokedSession(session_id=sid, version=ver, expires_at=expires_at) for sid, ver in sessions]
+        )
+        with self._lock:
+            for row in rows:
+                _merge(self._revoked, row.session_id, row.version, row.expires_at)
+
+    def clear(self):
+        with self._lock:
+            self._revoked.clear()
+            self._next_sync = 0.0
+
+    def stats(self):
+        return {"size": len(self._revoked), "syncs": self.syncs, "sync_interval": self.sync_interval}
+
+    def _maybe_sync(self):
+        now = time.monotonic()
+        if now < self._next_sync:
+            return
+        with self._lock:
+            if now < self._next_sync:
+                return
+            self._next_sync = now + self.sync_interval
+            current = timezone.now()
+            rows = RevokedSession.objects.filter(expires_at__gt=current)
+            revoked = {}
+            for sid, ver, expires_at in rows.values_list("session_id", "version", "expires_at"):
+                _merge(revoked, sid, ver, expires_at)
+            # Swap in one step; readers never see a half-built mapping
+            self._revoked = revoked
+            self.syncs += 1
+
+
+def _merge(revoked, session_id, version, expires_at):
+    current = revoked.get(session_id)
+    if current is None:
+        revoked[session_id] = (version, expires_at)
+    else:
+        revoked[session_id] = (max(version, current[0]), max(expires_at, current[1]))
+
+
+_config = getattr(settings, "AUTH_STATELESS_TOKENS", {})
+
+revocation_list = RevocationList(sync_interval=float(_config.get("REVOCATION_SYNC_INTERVAL", 5)))
@@ -1,2 +1,3 @@
 from .register import RegisterSerializer
 from .login import LoginSerializer
+from .refresh import RefreshSerializer
@@ -1,22 +1,56 @@
 import jwt
 from rest_framework import serializers, exceptions
 from django.contrib.auth import authenticate, get_user_model
-from datetime import datetime, timedelta
+from datetime import datetime
 from django.conf import settings
-from django.core.exceptions import ObjectDoesNotExist
+from django.db import transaction
 
 from api.authentication.models import ActiveSession
+from api.authentication.models.active_session import token_lifetime
+from api.authentication.tokens import issue_access_token, stateless_enabled
 
 
 def _generate_jwt_token(user):
     token = jwt.encode(
-        {"id": user.pk, "exp": datetime.utcnow() + timedelta(days=7)},
+        {"id": user.pk, "exp": datetime.utcnow() + token_lifetime()},
         settings.SECRET_KEY,
     )
 
     return token
 
 
+def _reuse_or_replace_session(user):
+    """Return the user's newest valid session, creating one if needed.
+
+    Runs under a lock on the user row so concurrent logins of the same user
+    cannot both create a session; every other session of the user is deleted.
+    """
+    UserModel = get_user_model()
+    with transaction.atomic():
+        # Lock the user row until the transaction ends
+        UserModel.objects.select_for_update().filter(pk=user.pk).exists()
+
+        session = None
+        stale = []
+        for candidate in ActiveSession.objects.filter(user=user).order_by("-date"):
+            if session is None and candidate.token:
+                try:
+                    jwt.decode(candidate.token, settings.SECRET_KEY, algorithms=["HS256"])
+                    session = candidate
+                    continue
+                except jwt.InvalidTokenError:
+                    pass
+            stale.append(candidate.pk)
+
+        if stale:
+            ActiveSession.objects.filter(pk__in=stale).delete()
+
+        if session is None:
+            session = ActiveSession.objects.create(user=user, token=_generate_jwt_token(user))
+
+    return session
+
+
 class LoginSerializer(serializers.Serializer):
     email = serializers.CharField(max_length=255)
     password = serializers.CharField(max_length=128, write_only=True)
@@ -37,7 +71,8 @@ class LoginSerializer(serializers.Serializer):
         UserModel = get_user_model()
         username_field = getattr(UserModel._meta, 'USERNAME_FIELD', 'username')
         auth_kwargs = {username_field: email, 'password': password}
-        user = authenticate(**auth_kwargs)
+        # Hash in the login pool; saturation surfaces as 429, dead workers as 503
+        user = authenticate(self.context.get("request"), pooled=True, **auth_kwargs)
 
         if user is None:
             raise exceptions.AuthenticationFailed({"success": False, "msg": "Wrong credentials"})
@@ -47,17 +82,16 @@ class LoginSerializer(serializers.Serializer):
                 {"success": False, "msg": "User is not active"}
             )
 
-        try:
-            session = ActiveSession.objects.get(user=user)
-            if not session.token:
-                raise ValueError
+        session = _reuse_or_replace_session(user)
 
-            jwt.decode(session.token, settings.SECRET_KEY, algorithms=["HS256"])
-
-        except (ObjectDoesNotExist, ValueError, jwt.ExpiredSignatureError):
-            session = ActiveSession.objects.create(
-                user=user, token=_generate_jwt_token(user)
-            )
+        if stateless_enabled():
+            # `token` is the short-lived access token; `refresh` is the session token
+            return {
+                "success": True,
+                "token": issue_access_token(session, user),
+                "refresh": session.token,
+                "user": {"_id": user.pk, "email": user.email},
+            }
 
         return {
             "success": True,
@@ -0,0 +1,38 @@
+import jwt
+from rest_framework import serializers, exceptions
+from django.conf import settings
+
+from api.authentication.models import ActiveSession
+from api.authentication.tokens import issue_access_token, stateless_enabled
+
+
+class RefreshSerializer(serializers.Serializer):
+    refresh = serializers.CharField(max_length=255, write_only=True)
+
+    def validate(self, data):
+        if not stateless_enabled():
+            raise exceptions.ValidationError(
+                {"success": False, "msg": "Stateless tokens are not enabled"}
+            )
+
+        refresh = data.get("refresh")
+        error = {"success": False, "msg": "Invalid refresh token"}
+
+        try:
+            jwt.decode(refresh, settings.SECRET_KEY, algorithms=["HS256"])
+        except jwt.InvalidTokenError:
+            raise exceptions.AuthenticationFailed(error)
+
+        try:
+            session = ActiveSession.objects.select_related("user").get(
+                token_digest=ActiveSession.digest(refresh)
+            )
+        except ActiveSession.DoesNotExist:
+            raise exceptions.AuthenticationFailed(error)
+
+        if not session.user.is_active:
+            raise exceptions.AuthenticationFailed(
+                {"success": False, "msg": "User is not active"}
+            )
+
+        return {"success": True, "token": issue_access_token(session, session.user)}
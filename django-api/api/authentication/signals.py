@@ -0,0 +1,85 @@
+from django.db.models import F
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from api.user.models import User
+from api.authentication.models import ActiveSession
+from api.authentication.models.active_session import token_lifetime
+from api.authentication.cache import token_cache
+from api.authentication.revocation import revocation_list
+from api.authentication.tokens import CLAIMED_FIELDS, stateless_enabled
+
+# User fields whose change invalidates issued access tokens: the credentials and
+# everything the tokens embed
+_CREDENTIAL_FIELDS = ("password", "is_active") + CLAIMED_FIELDS
+
+
+@receiver(post_delete, sender=ActiveSession)
+def invalidate_session_token(sender, instance, **kwargs):
+    token_cache.invalidate_token(instance.token)
+
+    # Access tokens of an expired session can no longer be alive; skip those
+    if stateless_enabled() and instance.date and instance.date > timezone.now() - token_lifetime():
+        revocation_list.revoke(instance.pk, instance.version)
+
+
+def _credentials(user):
+    # Read __dict__ directly so deferred fields are not loaded
+    return tuple(user.__dict__.get(field) for field in _CREDENTIAL_FIELDS)
+
+
+@receiver(post_init, sender=User)
+def remember_credentials(sender, instance, **kwargs):
+    instance._credentials_snapshot = _credentials(instance)
+
+
+@receiver(pre_save, sender=User)
+def refuse_claims_user(sender, instance, **kwargs):
+    # Built from access token claims: saving would write back what the token says
+    # (a former superuser flag, is_active=True, ...) over the current row
+    if getattr(instance, "_from_claims", False):
+        raise ValueError("A user built from token claims cannot be saved; load the row first.")
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_tokens(sender, instance, **kwargs):
+    # Any change to the user row (deactivation, password or email change, ...)
+    # makes the cached snapshot stale.
+    token_cache.invalidate_user(instance.pk)
+
+
+@receiver(post_save, sender="api_clinic.Recepcionista")
+@receiver(post_delete, sender="api_clinic.Recepcionista")
+@receiver(post_save, sender="api_clinic.Veterinario")
+@receiver(post_delete, sender="api_clinic.Veterinario")
+def invalidate_profile_owner_tokens(sender, instance, created=True, **kwargs):
+    # Cached users carry their profile; a changed profile means a stale snapshot
+    if instance.user_id is not None:
+        token_cache.invalidate_user(instance.user_id)
+        # A new or removed profile changes the role access tokens carry
+        if created:
+            revoke_access_tokens(instance.user_id)
+
+
+@receiver(post_save, sender=User)
+def revoke_access_tokens_on_credentials_change(sender, instance, created, **kwargs):
+    previous = getattr(instance, "_credentials_snapshot", (None,) * len(_CREDENTIAL_FIELDS))
+    current = _credentials(instance)
+    instance._credentials_snapshot = current
+    if created or previous == current:
+        return
+    revoke_access_tokens(instance.pk)
+
+
+def revoke_access_tokens(user_id):
+    """Revoke the access tokens issued so far to `user_id` (stateless mode)."""
+    if not stateless_enabled():
+        return
+    # Bump the session versions too so the next refresh issues tokens for the new one
+    sessions = ActiveSession.objects.filter(user_id=user_id)
+    current_versions = list(sessions.values_list("pk", "version"))
+    if current_versions:
+        revocation_list.revoke_many(current_versions)
+        sessions.update(version=F("version") + 1)
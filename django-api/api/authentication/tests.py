@@ -1,7 +1,23 @@
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import override_settings
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework.test import APITestCase
 from rest_framework import status
 
+from api.user.models import User
+from api.authentication.cache import TokenCache, token_cache
+from api.authentication.models import ActiveSession, RevokedSession
+from api.authentication.revocation import revocation_list
+from api.authentication.hashing import hashing_pool
+from api.authentication.tokens import access_token_claims, user_from_claims
+
 
 class AuthenticationTest(APITestCase):
     base_url_register = reverse("api:register-list")
@@ -44,6 +60,14 @@ class AuthenticationTest(APITestCase):
         response_data = response.json()
         self.assertEqual(response_data["success"], True)
 
+    def test_session_is_stored_with_digest(self):
+        response = self.client.post(f"{self.base_url_login}", data=self.data_login)
+        token = response.json()["token"]
+
+        session = ActiveSession.objects.get(token_digest=ActiveSession.digest(token))
+        self.assertEqual(session.token, token)
+        self.assertEqual(len(session.token_digest), 64)
+
     def test_check_session(self):
         # Login to retrieve token
 
@@ -60,3 +84,315 @@ class AuthenticationTest(APITestCase):
 
         response_data = response.json()
         self.assertEqual(response_data["success"], True)
+
+
+class TokenCacheTest(APITestCase):
+    base_url_login = reverse("api:login-list")
+    base_url_logout = reverse("api:logout-list")
+    base_url_check_session = reverse("api:check-session-list")
+
+    data_login = {"password": "12345678", "email": "teast@admin.com"}
+
+    def setUp(self):
+        token_cache.clear()
+        cache.clear()
+        response = self.client.post(f"{self.base_url_login}", data=self.data_login)
+        self.token = response.json()["token"]
+        self.client.credentials(HTTP_AUTHORIZATION=self.token)
+
+    def test_cached_token_skips_database(self):
+        # First request verifies the token against the database
+        with self.assertNumQueries(1):
+            response = self.client.post(f"{self.base_url_check_session}")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        hits = token_cache.hits
+        with self.assertNumQueries(0):
+            response = self.client.post(f"{self.base_url_check_session}")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(token_cache.hits, hits + 1)
+
+    def test_logout_invalidates_cache(self):
+        self.client.post(f"{self.base_url_check_session}")
+
+        response = self.client.post(f"{self.base_url_logout}")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.post(f"{self.base_url_check_session}")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_deactivation_invalidates_cache(self):
+        self.client.post(f"{self.base_url_check_session}")
+
+        user = User.objects.get(email=self.data_login["email"])
+        user.is_active = False
+        user.save()
+
+        response = self.client.post(f"{self.base_url_check_session}")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_logout_reaches_other_workers(self):
+        self.client.post(f"{self.base_url_check_session}")
+        # Another worker's cache: same shared cache, its own entries
+        other = TokenCache(ttl=60)
+        user = User.objects.get(email=self.data_login["email"])
+        other.set(self.token, user)
+        self.assertIsNotNone(other.get(self.token))
+
+        self.client.post(f"{self.base_url_logout}")
+        self.assertIsNone(other.get(self.token))
+
+    def test_user_change_reaches_other_workers(self):
+        user = User.objects.get(email=self.data_login["email"])
+        other = TokenCache(ttl=60)
+        other.set(self.token, user)
+
+        user.is_active = False
+        user.save()
+        self.assertIsNone(other.get(self.token))
+
+    def test_logout_of_a_closed_session(self):
+        self.client.post(f"{self.base_url_check_session}")
+        # Gone without signals, so the cache still accepts the token
+        sessions = ActiveSession.objects.filter(token_digest=ActiveSession.digest(self.token))
+        sessions._raw_delete(sessions.db)
+        response = self.client.post(f"{self.base_url_logout}")
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_password_change_invalidates_cache(self):
+        self.client.post(f"{self.base_url_check_session}")
+
+        user = User.objects.get(email=self.data_login["email"])
+        user.set_password("another-password")
+        user.save()
+
+        self.assertEqual(token_cache.stats()["size"], 0)
+
+
+class SessionReaperTest(APITestCase):
+    base_url_login = reverse("api:login-list")
+
+    data_login = {"password": "12345678", "email": "teast@admin.com"}
+
+    def setUp(self):
+        self.user = User.objects.get(email=self.data_login["email"])
+
+    def _expired_session(self, token):
+        session = ActiveSession.objects.create(user=self.user, token=token)
+        ActiveSession.objects.filter(pk=session.pk).update(date=timezone.now() - timedelta(days=30))
+        return session
+
+    def test_reap_command_deletes_expired_sessions(self):
+        for i in range(5):
+            self._expired_session(f"expired-{i}")
+        fresh = ActiveSession.objects.create(user=self.user, token="fresh")
+
+        call_command("reap_sessions", batch_size=2, stdout=StringIO())
+
+        self.assertEqual(list(ActiveSession.objects.values_list("pk", flat=True)), [fresh.pk])
+
+    def test_reap_command_keeps_sweeping_with_every(self):
+        self._expired_session("expired-0")
+        stdout = StringIO()
+        with mock.patch("time.sleep", side_effect=[None, KeyboardInterrupt]) as sleep:
+            with self.assertRaises(KeyboardInterrupt):
+                call_command("reap_sessions", every=60, stdout=stdout)
+        sleep.assert_called_with(60)
+        self.assertEqual(stdout.getvalue().count("Deleted"), 2)
+        self.assertFalse(ActiveSession.objects.filter(token_digest=ActiveSession.digest("expired-0")).exists())
+
+    def test_login_replaces_duplicate_sessions(self):
+        self._expired_session("expired")
+        ActiveSession.objects.create(user=self.user, token="not-a-jwt")
+
+        response = self.client.post(f"{self.base_url_login}", data=self.data_login)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        token = response.json()["token"]
+
+        self.assertEqual(list(ActiveSession.objects.filter(user=self.user).values_list("token", flat=True)), [token])
+
+        # A second login reuses the same valid session
+        response = self.client.post(f"{self.base_url_login}", data=self.data_login)
+        self.assertEqual(response.json()["token"], token)
+        self.assertEqual(ActiveSession.objects.filter(user=self.user).count(), 1)
+
+
+class LoginHashPoolTest(APITestCase):
+    base_url_login = reverse("api:login-list")
+
+    data_login = {"password": "12345678", "email": "teast@admin.com"}
+
+    def test_login_hashes_in_pool(self):
+        completed = hashing_pool.stats()["completed"]
+
+        response = self.client.post(f"{self.base_url_login}", data=self.data_login)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.post(f"{self.base_url_login}", data={**self.data_login, "password": "wrong"})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.assertEqual(hashing_pool.stats()["completed"], completed + 2)
+
+    def test_saturated_pool_rejects_with_retry_after(self):
+        if hashing_pool.workers <= 0:
+            self.skipTest("login hashing runs inline")
+
+        with mock.patch.object(hashing_pool._slots, "acquire", return_value=False):
+            response = self.client.post(f"{self.base_url_login}", data=self.data_login)
+
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response["Retry-After"], str(hashing_pool.retry_after))
+        self.assertGreaterEqual(hashing_pool.stats()["rejected"], 1)
+
+    def test_admin_login_hashes_inline(self):
+        User.objects.create_superuser(email="staff@admin.com", password="pass")
+        with mock.patch.object(hashing_pool._slots, "acquire", return_value=False):
+            response = self.client.post(
+                reverse("admin:login"), {"username": "staff@admin.com", "password": "pass", "next": "/admin/"}
+            )
+        self.assertEqual(response.status_code, status.HTTP_302_FOUND)
+
+    def test_broken_pool_is_rebuilt(self):
+        if hashing_pool.workers <= 0:
+            self.skipTest("login hashing runs inline")
+
+        broken = mock.Mock()
+        broken.submit.side_effect = BrokenProcessPool("a worker died")
+        with mock.patch.object(hashing_pool, "_executor", broken):
+            response = self.client.post(f"{self.base_url_login}", data=self.data_login)
+            self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+            self.assertEqual(response["Retry-After"], str(hashing_pool.retry_after))
+            self.assertIsNone(hashing_pool._executor)
+            broken.shutdown.assert_called_once_with(wait=False)
+
+        response = self.client.post(f"{self.base_url_login}", data=self.data_login)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+@override_settings(AUTH_STATELESS_TOKENS={"ENABLED": True, "ACCESS_LIFETIME_SECONDS": 300})
+class StatelessTokenTest(APITestCase):
+    base_url_login = reverse("api:login-list")
+    base_url_logout = reverse("api:logout-list")
+    base_url_refresh = reverse("api:refresh-list")
+    base_url_check_session = reverse("api:check-session-list")
+
+    data_login = {"password": "12345678", "email": "teast@admin.com"}
+
+    def setUp(self):
+        revocation_list.clear()
+        response = self.client.post(f"{self.base_url_login}", data=self.data_login)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.access = response.json()["token"]
+        self.refresh = response.json()["refresh"]
+        self.client.credentials(HTTP_AUTHORIZATION=self.access)
+
+    def test_access_token_needs_no_queries(self):
+        # The first check loads the revocation list; later ones are pure memory
+        self.client.post(f"{self.base_url_check_session}")
+        with self.assertNumQueries(0):
+            response = self.client.post(f"{self.base_url_check_session}")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_refresh_issues_new_access_token(self):
+        self.client.credentials()
+        response = self.client.post(f"{self.base_url_refresh}", data={"refresh": self.refresh})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.client.credentials(HTTP_AUTHORIZATION=response.json()["token"])
+        response = self.client.post(f"{self.base_url_check_session}")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_logout_revokes_access_and_refresh(self):
+        response = self.client.post(f"{self.base_url_logout}")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.post(f"{self.base_url_check_session}")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.credentials()
+        response = self.client.post(f"{self.base_url_refresh}", data={"refresh": self.refresh})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_password_change_revokes_access_token(self):
+        user = User.objects.get(email=self.data_login["email"])
+        user.set_password("another-password")
+        user.save()
+
+        response = self.client.post(f"{self.base_url_check_session}")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        # The session survives with a new version
+        self.client.credentials()
+        response = self.client.post(f"{self.base_url_refresh}", data={"refresh": self.refresh})
+        self.client.credentials(HTTP_AUTHORIZATION=response.json()["token"])
+        response = self.client.post(f"{self.base_url_check_session}")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_demotion_revokes_access_token(self):
+        user = User.objects.get(email=self.data_login["email"])
+        user.is_superuser = user.is_staff = True
+        user.save()
+        self.client.credentials()
+        response = self.client.post(f"{self.base_url_refresh}", data={"refresh": self.refresh})
+        self.client.credentials(HTTP_AUTHORIZATION=response.json()["token"])
+
+        user.is_superuser = False
+        user.save()
+        response = self.client.post(f"{self.base_url_check_session}")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_writes_never_save_the_claims(self):
+        user = User.objects.get(email=self.data_login["email"])
+        user.is_superuser = user.is_staff = True
+        user.save()
+        self.client.credentials()
+        response = self.client.post(f"{self.base_url_refresh}", data={"refresh": self.refresh})
+        self.client.credentials(HTTP_AUTHORIZATION=response.json()["token"])
+        # Demoted (or deactivated) while the token is still accepted, e.g. before
+        # this worker syncs the revocation
+        User.objects.filter(pk=user.pk).update(is_superuser=False, is_staff=False, is_active=False)
+
+        response = self.client.patch(reverse("api:current-user"), {"telefono": "555"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        user.refresh_from_db()
+        self.assertEqual((user.telefono, user.is_superuser, user.is_staff, user.is_active), ("555", False, False, False))
+
+    def test_admin_profile_writes_the_current_row(self):
+        user = User.objects.get(email=self.data_login["email"])
+        user.is_superuser = user.is_staff = True
+        user.save()
+        self.client.credentials()
+        response = self.client.post(f"{self.base_url_refresh}", data={"refresh": self.refresh})
+        self.client.credentials(HTTP_AUTHORIZATION=response.json()["token"])
+        User.objects.filter(pk=user.pk).update(is_active=False)
+
+        response = self.client.patch(reverse("clinic:profile-detail", args=["me"]), {"telefono": "555"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        user.refresh_from_db()
+        self.assertEqual((user.telefono, user.is_superuser, user.is_active), ("555", True, False))
+
+    def test_session_token_only_refreshes_and_logs_out(self):
+        self.client.credentials(HTTP_AUTHORIZATION=self.refresh)
+        response = self.client.get(reverse("api:current-user"))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        response = self.client.post(f"{self.base_url_refresh}", data={"refresh": self.refresh})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.post(f"{self.base_url_logout}")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_claims_user_cannot_be_saved(self):
+        claims = access_token_claims(self.access)
+        with self.assertRaises(ValueError):
+            user_from_claims(claims).save()
+
+    def test_revocations_from_other_workers_are_synced(self):
+        session = ActiveSession.objects.get(token_digest=ActiveSession.digest(self.refresh))
+        RevokedSession.objects.create(
+            session_id=session.pk, version=session.version, expires_at=timezone.now() + timedelta(minutes=5)
+        )
+        # Force the next check to reload the shared list, as a new interval would
+        revocation_list.clear()
+
+        response = self.client.post(f"{self.base_url_check_session}")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
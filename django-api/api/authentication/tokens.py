@@ -0,0 +1,70 @@
+from datetime import datetime, timedelta
+
+import jwt
+from django.conf import settings
+from django.contrib.auth import get_user_model
+
+from api.authentication.principal import resolve_principal
+
+ACCESS_TOKEN_TYPE = "access"
+
+# claim -> User field embedded in access tokens; other fields load lazily on access.
+# Changing any of them revokes the tokens issued so far (see signals.py)
+_USER_CLAIMS = (("id", "id"), ("email", "email"), ("su", "is_superuser"), ("st", "is_staff"))
+
+CLAIMED_FIELDS = tuple(field for _, field in _USER_CLAIMS if field != "id")
+
+
+def _config():
+    return getattr(settings, "AUTH_STATELESS_TOKENS", {})
+
+
+def stateless_enabled():
+    return bool(_config().get("ENABLED", False))
+
+
+def access_lifetime():
+    return timedelta(seconds=_config().get("ACCESS_LIFETIME_SECONDS", 300))
+
+
+def issue_access_token(session, user):
+    """Short-lived token bound to `session` at its current version."""
+    claims = {
+        "typ": ACCESS_TOKEN_TYPE,
+        "sid": session.pk,
+        "ver": session.version,
+        "exp": datetime.utcnow() + access_lifetime(),
+    }
+    for claim, field in _USER_CLAIMS:
+        claims[claim] = getattr(user, field)
+    # The role lets the backend build the request principal without a query
+    claims["role"] = resolve_principal(user).role
+    return jwt.encode(claims, settings.SECRET_KEY, algorithm="HS256")
+
+
+def access_token_claims(token):
+    """Return the verified claims of an access token, or None for any other token."""
+    try:
+        claims = jwt.decode(token, settings.SECRET_KEY, algorithms=["HS256"])
+    except jwt.InvalidTokenError:
+        return None
+    if claims.get("typ") != ACCESS_TOKEN_TYPE:
+        return None
+    return claims
+
+
+def user_from_claims(claims):
+    """Build the request user from the token claims without a database query.
+
+    The values are those of when the token was issued, so the instance refuses to be
+    saved; load the row (`User.objects.get(pk=user.pk)`) to write.
+    """
+    UserModel = get_user_model()
+    field_names = [field for _, field in _USER_CLAIMS] + ["is_active"]
+    values = [claims[claim] for claim, _ in _USER_CLAIMS] + [True]
+    by_attname = dict(zip(field_names, values))
+    # from_db expects the loaded values in concrete field order
+    ordered = [f.attname for f in UserModel._meta.concrete_fields if f.attname in by_attname]
+    user = UserModel.from_db("default", ordered, [by_attname[name] for name in ordered])
+    user._from_claims = True
+    return user
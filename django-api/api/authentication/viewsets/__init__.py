@@ -2,3 +2,4 @@ from .register import RegisterViewSet
 from .login import LoginViewSet
 from .active_session import ActiveSessionViewSet
 from .logout import LogoutViewSet
+from .refresh import RefreshViewSet
@@ -8,6 +8,8 @@ from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
 from drf_spectacular.utils import extend_schema
 
+from api.db.replicas import stick_to_primary
+
 
 @extend_schema(tags=["Auth"], summary="Iniciar sesión")
 @method_decorator(csrf_exempt, name="dispatch")
@@ -19,5 +21,7 @@ class LoginViewSet(viewsets.GenericViewSet, mixins.CreateModelMixin):
         serializer = self.get_serializer(data=request.data)
 
         serializer.is_valid(raise_exception=True)
+        # The session was just written; the next request authenticates with this token
+        stick_to_primary(request, serializer.validated_data["token"])
 
         return Response(serializer.validated_data, status=status.HTTP_200_OK)
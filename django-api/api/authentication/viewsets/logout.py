@@ -4,6 +4,8 @@ from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
 
 from api.authentication.models import ActiveSession
+from api.authentication.cache import token_cache
+from api.authentication.tokens import access_token_claims
 from drf_spectacular.utils import extend_schema
 
 
@@ -15,13 +17,26 @@ class LogoutSerializer(serializers.Serializer):
 
 @extend_schema(tags=["Auth"], summary="Cerrar sesión")
 class LogoutViewSet(viewsets.GenericViewSet, mixins.CreateModelMixin):
+    # Stateless mode only accepts the session token here (see ActiveSessionAuthentication)
+    accepts_session_token = True
     permission_classes = (IsAuthenticated,)
     serializer_class = LogoutSerializer
 
     def create(self, request, *args, **kwargs):
-        user = request.user
-
-        session = ActiveSession.objects.get(user=user)
+        claims = access_token_claims(request.auth)
+        if claims is not None:
+            # Stateless access token: the session is identified by its `sid` claim
+            sessions = ActiveSession.objects.filter(pk=claims.get("sid"))
+        else:
+            sessions = ActiveSession.objects.filter(token_digest=ActiveSession.digest(request.auth))
+        session = sessions.first()
+        token_cache.invalidate_token(request.auth)
+        if session is None:
+            # Already logged out (or reaped) while a cache still accepted the token
+            return Response(
+                {"success": False, "msg": "User is not logged on."}, status=status.HTTP_401_UNAUTHORIZED
+            )
+        # post_delete also revokes the outstanding access tokens of the session
         session.delete()
 
         return Response(
@@ -0,0 +1,29 @@
+from rest_framework import viewsets, mixins
+from rest_framework.response import Response
+from rest_framework import status
+from rest_framework.permissions import AllowAny
+
+from api.authentication.serializers import RefreshSerializer
+from django.utils.decorators import method_decorator
+from django.views.decorators.csrf import csrf_exempt
+from drf_spectacular.utils import extend_schema
+
+from api.db.replicas import stick_to_primary
+
+
+@extend_schema(tags=["Auth"], summary="Renovar token de acceso")
+@method_decorator(csrf_exempt, name="dispatch")
+class RefreshViewSet(viewsets.GenericViewSet, mixins.CreateModelMixin):
+    # Stateless mode only accepts the session token here (see ActiveSessionAuthentication)
+    accepts_session_token = True
+    permission_classes = (AllowAny,)
+    serializer_class = RefreshSerializer
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+
+        serializer.is_valid(raise_exception=True)
+        # The session was just written; the next request authenticates with this token
+        stick_to_primary(request, serializer.validated_data["token"])
+
+        return Response(serializer.validated_data, status=status.HTTP_200_OK)
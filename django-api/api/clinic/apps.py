@@ -5,3 +5,10 @@ class ClinicConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "api.clinic"
     label = "api_clinic"
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from api.metrics import register_provider
+        from .cache import availability_cache
+
+        register_provider("availability_cache", availability_cache.stats)
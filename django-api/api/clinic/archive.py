@@ -0,0 +1,77 @@
+"""Hot/cold archival of old consultas.
+
+`archive()` (the archive_consultas command) moves the consultas dated before
+`cutoff()`, CLINIC_ARCHIVE["AFTER_DAYS"] days ago, from Consulta to
+ConsultaArchivada, BATCH_SIZE rows per transaction, keeping their idConsulta;
+`restore()` (restore_consultas) moves them back. Consulta, its indexes and every
+listing over it then only hold recent history. Read paths that may reach further
+back (a mascota's history) union both tables when their date range starts before
+the cutoff, see ProjectedListMixin.merged_response().
+
+Rows are moved with bulk_create() and a raw DELETE, so model signals do not run:
+VetDailyStats keeps counting archived consultas (stats.rebuild() reads both
+tables), while full-text search only covers Consulta. A restored consulta older
+than the cutoff goes back to the archive on the next run.
+"""
+
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import Consulta, ConsultaArchivada
+
+DEFAULTS = {"AFTER_DAYS": 730, "BATCH_SIZE": 1000}
+
+# Columns copied between the two tables
+FIELDS = [field.attname for field in ConsultaArchivada._meta.concrete_fields]
+
+
+def archive_setting(name):
+    return getattr(settings, "CLINIC_ARCHIVE", {}).get(name, DEFAULTS[name])
+
+
+def cutoff():
+    """Consultas dated before this day may be archived."""
+    return date.today() - timedelta(days=archive_setting("AFTER_DAYS"))
+
+
+def reaches_archive(start):
+    """Whether a date range starting on `start` (None: from the beginning) may include archived rows."""
+    return start is None or start < cutoff()
+
+
+def _move(queryset, target, batch_size):
+    moved = 0
+    while True:
+        with transaction.atomic():
+            # Locked, so an edit cannot land between the copy and the delete
+            rows = list(queryset.select_for_update().order_by("fecha", "hora", "pk").values(*FIELDS)[:batch_size])
+            if not rows:
+                return moved
+            target.objects.bulk_create([target(**row) for row in rows])
+            done = queryset.model.objects.filter(pk__in=[row["idConsulta"] for row in rows])
+            done._raw_delete(done.db)
+        moved += len(rows)
+
+
+def archive(before=None, batch_size=None):
+    """Move the consultas dated before `before` (default: the cutoff) to the archive; returns how many."""
+    if before is None:
+        before = cutoff()
+    elif before > cutoff():
+        # Reads starting after the cutoff do not look at the archive
+        raise ValueError("Cannot archive consultas from %s on, after the cutoff %s" % (cutoff(), before))
+    return _move(Consulta.objects.filter(fecha__lt=before), ConsultaArchivada, batch_size or archive_setting("BATCH_SIZE"))
+
+
+def restore(mascota_id=None, start=None, end=None, batch_size=None):
+    """Move archived consultas (of a mascota, between two days) back to Consulta; returns how many."""
+    queryset = ConsultaArchivada.objects.all()
+    if mascota_id is not None:
+        queryset = queryset.filter(mascota_id=mascota_id)
+    if start is not None:
+        queryset = queryset.filter(fecha__gte=start)
+    if end is not None:
+        queryset = queryset.filter(fecha__lte=end)
+    return _move(queryset, Consulta, batch_size or archive_setting("BATCH_SIZE"))
@@ -0,0 +1,149 @@
+"""Free-slot computation for veterinarios.
+
+All bookings needed for a request are loaded with a single query and matched
+against each vet's working-hours grid in memory. The occupancy of a vet's day
+is kept as an int bitset where bit i is set when slot i is taken, and cached per
+(vet, day) in `availability_cache`.
+"""
+
+from datetime import time, timedelta
+
+from django.conf import settings
+
+from .cache import availability_cache
+from .models import Consulta
+
+# Accepted spellings for Veterinario.work_days, mapped to date.weekday() (Mon=0)
+_DAY_NAMES = {
+    "mon": 0, "monday": 0, "lun": 0, "lunes": 0,
+    "tue": 1, "tuesday": 1, "mar": 1, "martes": 1,
+    "wed": 2, "wednesday": 2, "mie": 2, "mié": 2, "miercoles": 2, "miércoles": 2,
+    "thu": 3, "thursday": 3, "jue": 3, "jueves": 3,
+    "fri": 4, "friday": 4, "vie": 4, "viernes": 4,
+    "sat": 5, "saturday": 5, "sab": 5, "sáb": 5, "sabado": 5, "sábado": 5,
+    "sun": 6, "sunday": 6, "dom": 6, "domingo": 6,
+}
+
+
+def default_slot_minutes():
+    return getattr(settings, "CLINIC_SLOT_MINUTES", 60)
+
+
+def parse_work_days(value):
+    """Return the set of weekdays (Mon=0) in `value`, or None when every day is worked.
+
+    `value` is a comma-separated list of day names ("Mon,Tue", "lun,mar") or ISO
+    day numbers (1=Mon ... 7=Sun, 0 is also accepted for Sunday). Unknown tokens
+    are ignored; an empty or unparseable value means no restriction.
+    """
+    if not value:
+        return None
+
+    days = set()
+    for token in value.replace(";", ",").split(","):
+        token = token.strip().lower()
+        if not token:
+            continue
+        if token.isdigit():
+            number = int(token)
+            if 0 <= number <= 7:
+                days.add((number - 1) % 7)
+        elif token in _DAY_NAMES:
+            days.add(_DAY_NAMES[token])
+    return frozenset(days) or None
+
+
+def _minutes(value):
+    return value.hour * 60 + value.minute
+
+
+def slot_starts(work_start, work_end, slot_minutes):
+    """Minutes-of-day at which each slot starting before `work_end` begins."""
+    if not work_start or not work_end or slot_minutes <= 0:
+        return []
+    return list(range(_minutes(work_start), _minutes(work_end), slot_minutes))
+
+
+def occupancy(first, slot_minutes, count, horas):
+    """Bitset of the slots (of `count` starting at minute `first`) overlapped by `horas`."""
+    bits = 0
+    for hora in horas:
+        offset = _minutes(hora) - first
+        if offset >= 0:
+            index = offset // slot_minutes
+            if index < count:
+                bits |= 1 << index
+    return bits
+
+
+def _labels(starts):
+    return [time(start // 60, start % 60).strftime("%H:%M") for start in starts]
+
+
+def _free_labels(labels, taken):
+    if not taken:
+        return list(labels)
+    return [label for index, label in enumerate(labels) if not taken >> index & 1]
+
+
+def _load_occupancy(pairs, grids, slot_minutes):
+    """Bitsets of the (vet id, fecha) `pairs` read from Consulta with one range query."""
+    taken = dict.fromkeys(pairs, 0)
+    if not pairs:
+        return taken
+
+    days = [fecha for _, fecha in pairs]
+    rows = Consulta.objects.filter(
+        veterinario_id__in={vet_id for vet_id, _ in pairs},
+        fecha__range=(min(days), max(days)),
+        hora__isnull=False,
+        cancelada=False,
+    ).values_list("veterinario_id", "fecha", "hora")
+    for vet_id, fecha, hora in rows:
+        if (vet_id, fecha) in taken:
+            first, count = grids[vet_id][:2]
+            taken[vet_id, fecha] |= occupancy(first, slot_minutes, count, (hora,))
+    return taken
+
+
+def availability_for_range(vets, start, end, slot_minutes=None):
+    """{vet id: {date: free slots}} for every day from `start` to `end` inclusive.
+
+    Occupancy bitsets come from the cache; the days missing from it are read with
+    one range query over Consulta. The slot grid and labels of each vet are built
+    once and reused for every day.
+    """
+    slot_minutes = slot_minutes or default_slot_minutes()
+    vets = list(vets)
+    days = [start + timedelta(days=n) for n in range((end - start).days + 1)]
+
+    grids = {}
+    worked = []
+    for v in vets:
+        starts = slot_starts(v.work_start, v.work_end, slot_minutes)
+        work_days = parse_work_days(v.work_days)
+        grids[v.pk] = (starts[0] if starts else 0, len(starts), _labels(starts))
+        if starts:
+            worked.extend((v.pk, day) for day in days if work_days is None or day.weekday() in work_days)
+
+    taken = availability_cache.fetch(
+        {v.pk: (v.work_start, v.work_end, v.work_days) for v in vets},
+        worked,
+        slot_minutes,
+        lambda pairs: _load_occupancy(pairs, grids, slot_minutes),
+    )
+
+    out = {}
+    for v in vets:
+        labels = grids[v.pk][2]
+        out[v.pk] = {
+            day: _free_labels(labels, taken[v.pk, day]) if (v.pk, day) in taken else []
+            for day in days
+        }
+    return out
+
+
+def availability_for_date(vets, fecha, slot_minutes=None):
+    """{vet id: free slots} for every vet in `vets` on `fecha`, in at most one query."""
+    free = availability_for_range(vets, fecha, fecha, slot_minutes)
+    return {vet_id: days[fecha] for vet_id, days in free.items()}
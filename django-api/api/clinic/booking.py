@@ -0,0 +1,109 @@
+"""Optimistic booking of consulta slots.
+
+Slot uniqueness is enforced by the `consulta_unique_active_slot` constraint. The
+insert (or update) is attempted directly inside a savepoint; when the database
+rejects it because another active consulta holds the slot, the caller gets a 409
+listing the nearest free slots of the same vet instead of a 500.
+
+SQLite does not wait for a transaction that has already read (the mascota's dueño)
+to become the writer while another one writes: it fails at once with "database is
+locked". Outside any other transaction such a booking is started over, a few times.
+"""
+
+import random
+import time
+from datetime import datetime, timedelta
+
+from django.db import IntegrityError, OperationalError, transaction
+from rest_framework import exceptions
+
+from .availability import availability_for_range
+from .models import Consulta
+
+# How many alternatives a conflict returns and how far ahead they are searched
+ALTERNATIVES = 3
+ALTERNATIVES_DAYS = 7
+
+# Attempts after the first one of a booking SQLite found locked, and the base delay
+# (seconds, doubled each time) before them
+SQLITE_LOCK_RETRIES = 8
+SQLITE_LOCK_DELAY = 0.005
+
+
+class SlotTaken(exceptions.APIException):
+    """The requested (veterinario, fecha, hora) is already booked; rendered as 409."""
+
+    status_code = 409
+    default_detail = "The slot is already booked."
+    default_code = "slot_taken"
+
+    def __init__(self, alternatives):
+        super().__init__()
+        self.detail = {
+            "detail": exceptions.ErrorDetail(self.default_detail, self.default_code),
+            "alternatives": alternatives,
+        }
+
+
+def nearest_free_slots(vet, fecha, hora, limit=ALTERNATIVES, days=ALTERNATIVES_DAYS):
+    """Up to `limit` free slots of `vet` closest to `fecha` `hora`, from that day on."""
+    requested = datetime.combine(fecha, hora)
+    free = availability_for_range([vet], fecha, fecha + timedelta(days=days - 1))[vet.pk]
+    candidates = [
+        datetime.combine(day, datetime.strptime(slot, "%H:%M").time())
+        for day, slots in free.items()
+        for slot in slots
+    ]
+    candidates.sort(key=lambda moment: (abs(moment - requested), moment))
+    return [{"fecha": moment.date().isoformat(), "hora": moment.strftime("%H:%M")} for moment in candidates[:limit]]
+
+
+def _conflicting(instance):
+    return (
+        Consulta.objects.filter(
+            veterinario_id=instance.veterinario_id,
+            fecha=instance.fecha,
+            hora=instance.hora,
+            cancelada=False,
+        )
+        .exclude(pk=instance.pk)
+        .exists()
+    )
+
+
+def _save(serializer, **kwargs):
+    connection = transaction.get_connection()
+    # Only a transaction of our own can be started over
+    retries = SQLITE_LOCK_RETRIES if connection.vendor == "sqlite" and not connection.in_atomic_block else 0
+    for attempt in range(retries + 1):
+        try:
+            with transaction.atomic():
+                return serializer.save(**kwargs)
+        except OperationalError as exc:
+            if attempt == retries or "database is locked" not in str(exc):
+                raise
+            time.sleep(random.uniform(1, 2) * SQLITE_LOCK_DELAY * 2 ** attempt)
+
+
+def book(serializer, **kwargs):
+    """`serializer.save(**kwargs)`, raising SlotTaken when the slot is already booked.
+
+    No lock is taken: concurrent bookings of one slot race on the insert and the
+    unique constraint lets exactly one of them through.
+    """
+    try:
+        return _save(serializer, **kwargs)
+    except IntegrityError:
+        instance = serializer.instance
+        slot = {**serializer.validated_data, **kwargs}
+
+        def value(name):
+            return slot[name] if name in slot else getattr(instance, name, None)
+
+        vet, fecha, hora = value("veterinario"), value("fecha"), value("hora")
+        if vet is None or fecha is None or hora is None or value("cancelada"):
+            raise
+        probe = Consulta(pk=getattr(instance, "pk", None), veterinario=vet, fecha=fecha, hora=hora)
+        if not _conflicting(probe):
+            raise
+        raise SlotTaken(nearest_free_slots(vet, fecha, hora))
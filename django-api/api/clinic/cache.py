@@ -0,0 +1,121 @@
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from .models import Consulta
+
+
+class AvailabilityCache:
+    """Occupancy bitsets per (veterinario, fecha) kept in Django's cache framework.
+
+    An entry stores the vet's grid (work_start, work_end, work_days) it was computed
+    for and one bitset per slot length. Entries are deleted when a Consulta of that
+    vet and day is saved or deleted (see signals.py); an entry whose grid differs
+    from the vet's current one is treated as a miss, so editing the working hours or
+    days of a vet invalidates exactly that vet's days.
+
+    Writes that bypass model signals (queryset.update(), bulk_create()) must call
+    `invalidate()` themselves. With the default local-memory backend each worker
+    process has its own cache and only sees its own invalidations; configure a shared
+    backend (CACHE_BACKEND / CACHE_LOCATION) when running several workers.
+    """
+
+    def __init__(self, alias="default", timeout=300, prefix="clinic:occupancy"):
+        self.alias = alias
+        self.timeout = timeout
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self):
+        return self.timeout > 0
+
+    @property
+    def _cache(self):
+        return caches[self.alias]
+
+    def key(self, vet_id, fecha):
+        # Signals pass Consulta.fecha as it was assigned, which may still be a string
+        fecha = Consulta._meta.get_field("fecha").to_python(fecha)
+        return "%s:%s:%s" % (self.prefix, vet_id, fecha.isoformat())
+
+    def fetch(self, grids, pairs, slot_minutes, compute):
+        """{(vet id, fecha): bitset} for `pairs`, calling `compute(missing pairs)` on misses.
+
+        `grids` maps each vet id to its current (work_start, work_end, work_days).
+        """
+        if not self.enabled:
+            return compute(pairs)
+
+        keys = {self.key(*pair): pair for pair in pairs}
+        found = self._cache.get_many(list(keys))
+
+        out = {}
+        stale = {}
+        for key, pair in keys.items():
+            grid = grids[pair[0]]
+            entry = found.get(key)
+            if entry is None or entry[0] != grid:
+                entry = (grid, {})
+            bits = entry[1].get(slot_minutes)
+            if bits is None:
+                stale[key] = entry
+            else:
+                out[pair] = bits
+
+        with self._lock:
+            self.hits += len(out)
+            self.misses += len(stale)
+
+        if stale:
+            computed = compute([keys[key] for key in stale])
+            out.update(computed)
+            self._cache.set_many(
+                {key: (grid, {**slots, slot_minutes: computed[keys[key]]}) for key, (grid, slots) in stale.items()},
+                self.timeout,
+            )
+        return out
+
+    def invalidate(self, pairs):
+        """Drop the entries of the (vet id, fecha) `pairs`, now and once the transaction commits."""
+        keys = [self.key(vet_id, fecha) for vet_id, fecha in pairs if vet_id is not None and fecha is not None]
+        if not keys or not self.enabled:
+            return
+
+        cache = self._cache
+        cache.delete_many(keys)
+        # A concurrent request may have cached the pre-commit bookings in between
+        transaction.on_commit(lambda: cache.delete_many(keys))
+        with self._lock:
+            self.invalidations += len(keys)
+
+    def clear(self):
+        """Reset the counters and the whole cache alias (meant for tests)."""
+        self._cache.clear()
+        with self._lock:
+            self.hits = self.misses = self.invalidations = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "alias": self.alias,
+                "timeout": self.timeout,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "invalidations": self.invalidations,
+            }
+
+
+_config = getattr(settings, "CLINIC_AVAILABILITY_CACHE", {})
+
+availability_cache = AvailabilityCache(
+    alias=_config.get("ALIAS", "default"),
+    timeout=int(_config.get("TIMEOUT", 300)),
+)
@@ -0,0 +1,126 @@
+"""Conditional GET for clinic lists and details.
+
+The validators of a response are derived from the rows it is built from, with a
+single aggregate query: the row count and the latest `updated_at` of the listed
+model and of every related model the serializer reads (a consulta list also
+renders its mascota and that mascota's dueño). A matching `If-None-Match` or
+`If-Modified-Since` is answered with 304 before the rows are fetched or
+serialized; otherwise the response carries `ETag` and `Last-Modified`.
+
+Paginated lists are validated over the rows of the requested page only, so a 304
+costs about as little on the last page as on the first. The ETag also covers the
+request path and query string, so every page, fieldset and filter has its own.
+Deleting a row changes the count and pk sum, hence the ETag, but not
+`Last-Modified`; clients sending only `If-Modified-Since` may miss deletions.
+
+Serializers reading a model without `updated_at` get no validators, and writes
+that skip `save()` (QuerySet.update(), bulk_create()) must set `updated_at`
+themselves.
+"""
+
+import hashlib
+from functools import lru_cache
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Count, Max, Sum
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from .fieldsets import load_plan
+
+UPDATED_AT = "updated_at"
+
+
+def _has_updated_at(model):
+    try:
+        model._meta.get_field(UPDATED_AT)
+    except FieldDoesNotExist:
+        return False
+    return True
+
+
+# Relations read by serializers whose changes bump the parent's updated_at instead
+# of their own (see signals.py)
+TOUCHES_PARENT = {("api_clinic.Veterinario", "user")}
+
+
+@lru_cache(maxsize=256)
+def tracked_paths(serializer_class, fieldset=None):
+    """Relation paths whose `updated_at` bound the output, "" for the model itself.
+
+    None when some data the serializer reads is not covered by an `updated_at`.
+    """
+    plan = load_plan(serializer_class, fieldset)
+    model = serializer_class.Meta.model
+    if plan is None or not _has_updated_at(model):
+        return None
+    _, related = plan
+    paths = [""]
+    for path in related:
+        *steps, name = path.split("__")
+        owner = model
+        for step in steps:
+            owner = owner._meta.get_field(step).related_model
+        if _has_updated_at(owner._meta.get_field(name).related_model):
+            paths.append(path)
+        elif (owner._meta.label, name) not in TOUCHES_PARENT:
+            return None
+    return tuple(paths)
+
+
+def validators(request, queryset, serializer_class, fieldset=None, allow_empty=True):
+    """(etag, last_modified) for `queryset` rendered by `serializer_class`, or None.
+
+    With `allow_empty=False` an empty `queryset` (a detail about to 404) has none.
+    """
+    if request.method not in ("GET", "HEAD"):
+        return None
+    paths = tracked_paths(serializer_class, fieldset)
+    if paths is None:
+        return None
+
+    # The pk sum tells apart windows (pages) where a row was swapped for an older one
+    aggregates = {"rows": Count("pk"), "pks": Sum("pk")}
+    for index, path in enumerate(paths):
+        aggregates["m%d" % index] = Max("%s__%s" % (path, UPDATED_AT) if path else UPDATED_AT)
+    if not queryset.query.is_sliced:
+        queryset = queryset.order_by()
+    values = queryset.aggregate(**aggregates)
+
+    if not values["rows"] and not allow_empty:
+        return None
+    stamps = [values["m%d" % index] for index in range(len(paths))]
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(repr((request.get_full_path(), values["rows"], values["pks"], stamps)).encode())
+    known = [stamp for stamp in stamps if stamp is not None]
+    return digest.hexdigest(), (int(max(known).timestamp()) if known else None)
+
+
+def combine(founds):
+    """Validators of a response built from several querysets, each validated on its own."""
+    if not founds or any(found is None for found in founds):
+        return None
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(repr([etag for etag, _ in founds]).encode())
+    known = [last_modified for _, last_modified in founds if last_modified is not None]
+    return digest.hexdigest(), (max(known) if known else None)
+
+
+def not_modified(request, found):
+    """The 304 to send instead of the response, or None."""
+    if found is None:
+        return None
+    etag, last_modified = found
+    response = get_conditional_response(request, etag=quote_etag(etag), last_modified=last_modified)
+    return None if response is None else stamp(response, found)
+
+
+def stamp(response, found):
+    """Add the validators to a 200 or 304 `response`; browsers must revalidate every use."""
+    if found is not None and response.status_code in (200, 304):
+        etag, last_modified = found
+        response["ETag"] = quote_etag(etag)
+        if last_modified is not None:
+            response["Last-Modified"] = http_date(last_modified)
+        patch_cache_control(response, private=True, no_cache=True)
+    return response
@@ -0,0 +1,117 @@
+"""Streaming CSV / NDJSON exports for reporting.
+
+Rows are read with `QuerySet.iterator(chunk_size=CLINIC_EXPORT_CHUNK_SIZE)` (a
+server-side cursor on Postgres) and encoded one at a time into a
+StreamingHttpResponse, so a worker holds one chunk of rows whatever the size of
+the export. Each export is a flat list of `(header, lookup)` columns read with
+`values_list()`; relations are followed in the same query.
+"""
+
+import csv
+import json
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from rest_framework.negotiation import BaseContentNegotiation
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+OUTPUTS = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+CONSULTA_COLUMNS = (
+    ("idConsulta", "idConsulta"),
+    ("fecha", "fecha"),
+    ("hora", "hora"),
+    ("motivo", "motivo"),
+    ("descripcion", "descripcion"),
+    ("sintomas", "sintomas"),
+    ("tratamiento", "tratamiento"),
+    ("asistio", "asistio"),
+    ("cancelada", "cancelada"),
+    ("idVeterinario", "veterinario_id"),
+    ("veterinario", "veterinario__nombre"),
+    ("idMascota", "mascota_id"),
+    ("mascota", "mascota__nombre"),
+    ("especie", "mascota__especie"),
+    ("idDueno", "dueno_id"),
+    ("dueno", "dueno__nombre"),
+    ("idRecepcionista", "registrada_por_id"),
+)
+
+MASCOTA_COLUMNS = (
+    ("idMascota", "idMascota"),
+    ("nombre", "nombre"),
+    ("especie", "especie"),
+    ("raza", "raza"),
+    ("edad", "edad"),
+    ("idDueno", "dueno_id"),
+    ("dueno", "dueno__nombre"),
+)
+
+DUENO_COLUMNS = (
+    ("idDueno", "idDueno"),
+    ("nombre", "nombre"),
+    ("telefono", "telefono"),
+)
+
+
+def chunk_size():
+    return getattr(settings, "CLINIC_EXPORT_CHUNK_SIZE", 2000)
+
+
+def _cell(value):
+    """Dates and times as ISO 8601, as the JSON API renders them."""
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return value
+
+
+class _Echo:
+    """File-like object handing back whatever csv.writer writes to it."""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(headers, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(headers).encode("utf-8")
+    for row in rows:
+        yield writer.writerow(["" if value is None else _cell(value) for value in row]).encode("utf-8")
+
+
+def ndjson_lines(headers, rows):
+    if orjson is not None:
+        for row in rows:
+            yield orjson.dumps(dict(zip(headers, map(_cell, row)))) + b"\n"
+        return
+    for row in rows:
+        yield (json.dumps(dict(zip(headers, map(_cell, row))), ensure_ascii=False, separators=(",", ":")) + "\n").encode(
+            "utf-8"
+        )
+
+
+def export_response(queryset, columns, output, filename):
+    """Stream `queryset` as `output` ("csv" or "ndjson"); the query runs while streaming."""
+    headers = [header for header, _ in columns]
+    rows = queryset.values_list(*[lookup for _, lookup in columns]).iterator(chunk_size=chunk_size())
+    lines = csv_lines(headers, rows) if output == "csv" else ndjson_lines(headers, rows)
+    response = StreamingHttpResponse(lines, content_type=OUTPUTS[output])
+    response["Content-Disposition"] = 'attachment; filename="%s.%s"' % (filename, output)
+    return response
+
+
+class ExportContentNegotiation(BaseContentNegotiation):
+    """Exports pick their format from `?output=`; errors still render with the first renderer."""
+
+    def select_parser(self, request, parsers):
+        return parsers[0] if parsers else None
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
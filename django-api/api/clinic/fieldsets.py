@@ -0,0 +1,173 @@
+"""Sparse fieldsets: `?fields=` / `?exclude=` on the clinic list and detail endpoints.
+
+Both take comma-separated serializer field names; `mascota.nombre` reaches into a
+nested serializer. The request resolves to a fieldset, a tuple of
+`(name, sub-fieldset or None)` pairs in serializer order, which is applied where
+the data is read rather than after it:
+
+- list projections compile only the kept fields, so `values_list()` selects only
+  their columns;
+- querysets serialized the regular way get `only()`/`select_related()` for exactly
+  the columns the kept fields read;
+- the serializer itself drops the other fields.
+
+Only GET (and HEAD) responses are trimmed; writes validate the full serializer.
+"""
+
+from functools import lru_cache
+
+from drf_spectacular.openapi import AutoSchema
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import OpenApiParameter
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+
+FIELDS_PARAM = "fields"
+EXCLUDE_PARAM = "exclude"
+
+_MISSING = object()
+
+
+def _parse(value):
+    """Parse "a,b.c" into {"a": None, "b": {"c": None}}; None stands for the whole field."""
+    tree = {}
+    for path in value.split(","):
+        path = path.strip()
+        if not path:
+            continue
+        node = tree
+        *parents, leaf = path.split(".")
+        for name in parents:
+            if node.get(name, _MISSING) is None:
+                break
+            node = node.setdefault(name, {})
+        else:
+            node[leaf] = None
+    return tree
+
+
+def _readable_fields(serializer):
+    return {name: field for name, field in serializer.fields.items() if not field.write_only}
+
+
+def _resolve(serializer, requested, exclude, param, prefix=""):
+    fields = _readable_fields(serializer)
+    unknown = sorted(prefix + name for name in requested if name not in fields)
+    if unknown:
+        raise ValidationError({param: "Unknown fields: %s" % ", ".join(unknown)})
+
+    fieldset = []
+    for name, field in fields.items():
+        wanted = requested.get(name, _MISSING)
+        if wanted is _MISSING:
+            if exclude:
+                fieldset.append((name, None))
+            continue
+        if wanted is None:
+            if not exclude:
+                fieldset.append((name, None))
+            continue
+        if not isinstance(field, serializers.Serializer):
+            raise ValidationError({param: "%s%s has no subfields" % (prefix, name)})
+        fieldset.append((name, _resolve(field, wanted, exclude, param, "%s%s." % (prefix, name))))
+    return tuple(fieldset)
+
+
+@lru_cache(maxsize=256)
+def _fieldset(serializer_class, value, exclude):
+    param = EXCLUDE_PARAM if exclude else FIELDS_PARAM
+    return _resolve(serializer_class(), _parse(value), exclude, param)
+
+
+def requested_fieldset(request, serializer_class):
+    """The fieldset asked for by `request` for `serializer_class`, or None for every field."""
+    if request is None or request.method not in ("GET", "HEAD"):
+        return None
+    fields = request.query_params.get(FIELDS_PARAM)
+    exclude = request.query_params.get(EXCLUDE_PARAM)
+    if fields is None and exclude is None:
+        return None
+    if fields is not None and exclude is not None:
+        raise ValidationError({FIELDS_PARAM: "Use either fields or exclude, not both"})
+    return _fieldset(serializer_class, fields if fields is not None else exclude, exclude is not None)
+
+
+def trim(serializer, fieldset):
+    """Drop from `serializer` (or the child of a many=True one) the fields not in `fieldset`."""
+    if isinstance(serializer, serializers.ListSerializer):
+        serializer = serializer.child
+    kept = dict(fieldset)
+    for name in list(serializer.fields):
+        if name not in kept:
+            serializer.fields.pop(name)
+        elif kept[name] is not None:
+            trim(serializer.fields[name], kept[name])
+    return serializer
+
+
+def _lookups(serializer, fieldset, prefix, only, related):
+    """Collect the columns and joins `fieldset` reads; False when they cannot be told."""
+    kept = dict(fieldset) if fieldset is not None else None
+    projected = getattr(serializer, "projected_fields", {})
+    for name, field in _readable_fields(serializer).items():
+        if kept is not None and name not in kept:
+            continue
+        if isinstance(field, serializers.SerializerMethodField):
+            if name not in projected:
+                return False
+            for lookup in projected[name][0]:
+                parts = (prefix + lookup).split("__")
+                for depth in range(1, len(parts)):
+                    related.append("__".join(parts[:depth]))
+                only.extend("__".join(parts[:depth]) for depth in range(1, len(parts) + 1))
+            continue
+        if field.source == "*" or "." in field.source:
+            return False
+        only.append(prefix + field.source)
+        if isinstance(field, serializers.BaseSerializer):
+            if isinstance(field, serializers.ListSerializer):
+                return False
+            related.append(prefix + field.source)
+            sub = kept[name] if kept is not None else None
+            if not _lookups(field, sub, "%s%s__" % (prefix, field.source), only, related):
+                return False
+    return True
+
+
+@lru_cache(maxsize=256)
+def load_plan(serializer_class, fieldset):
+    """(only, select_related) lookups reading exactly `fieldset`, or None when unknown."""
+    only, related = [], []
+    if not _lookups(serializer_class(), fieldset, "", only, related):
+        return None
+    return tuple(dict.fromkeys(only)), tuple(dict.fromkeys(related))
+
+
+def restrict(queryset, serializer_class, fieldset):
+    """`queryset` loading only what `fieldset` of `serializer_class` reads.
+
+    Returned unchanged when the serializer reads something that cannot be traced
+    to a column (a SerializerMethodField without projected_fields, ...).
+    """
+    plan = load_plan(serializer_class, fieldset)
+    if plan is None:
+        return queryset
+    only, related = plan
+    queryset = queryset.select_related(None)
+    if related:
+        queryset = queryset.select_related(*related)
+    return queryset.only(*only)
+
+
+class SparseFieldsetSchema(AutoSchema):
+    """Documents `fields`/`exclude` on list and retrieve operations."""
+
+    def get_override_parameters(self):
+        parameters = super().get_override_parameters()
+        if self.method == "GET" and getattr(self.view, "action", None) in ("list", "retrieve"):
+            description = "Comma-separated field names %s the response; use a.b for nested fields"
+            parameters = parameters + [
+                OpenApiParameter(FIELDS_PARAM, OpenApiTypes.STR, description=description % "kept in"),
+                OpenApiParameter(EXCLUDE_PARAM, OpenApiTypes.STR, description=description % "dropped from"),
+            ]
+        return parameters
@@ -0,0 +1,395 @@
+"""Bulk CSV / NDJSON imports of dueños, mascotas and consultas.
+
+Files use the column names of the exports (export.py), so an export can be
+imported elsewhere; columns an import does not read are ignored. Records are
+read in chunks of CLINIC_IMPORT_CHUNK_SIZE and each chunk is
+
+1. converted and validated record by record with the model fields' clean();
+2. checked against the database with one `IN` query per referenced model, plus
+   one for taken ids and, for consultas, one for taken slots;
+3. inserted with bulk_create() in a transaction of its own.
+
+Invalid records are skipped and reported by line number; the rest is imported.
+bulk_create() skips save() and the model signals, so importers set what those
+would: Consulta.dueno and updated_at, the availability cache and VetDailyStats
+(recounted over the imported days once every chunk is in).
+"""
+
+import codecs
+import csv
+import json
+import os
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.validators import MinValueValidator
+from django.core.management.color import no_style
+from django.db import DatabaseError, connections, router, transaction
+from django.utils import timezone
+from rest_framework.parsers import BaseParser
+
+from . import stats
+from .cache import availability_cache
+from .models import Consulta, ConsultaArchivada, Dueno, Mascota
+
+INPUTS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+_EXTENSIONS = {".csv": "csv", ".ndjson": "ndjson", ".jsonl": "ndjson"}
+
+# Errors listed in a report; the count covers all of them
+MAX_REPORTED_ERRORS = 1000
+
+NON_FIELD_ERRORS = "non_field_errors"
+
+# PositiveIntegerField.clean() leaves the range to the backend, and SQLite has none
+_POSITIVE = MinValueValidator(0)
+
+_BOOLEANS = {"true": True, "t": True, "1": True, "false": False, "f": False, "0": False}
+
+
+def default_chunk_size():
+    return getattr(settings, "CLINIC_IMPORT_CHUNK_SIZE", 2000)
+
+
+def guess_input(content_type=None, name=None):
+    """The input format of a file from its name or media type, or None."""
+    extension = os.path.splitext(name or "")[1].lower()
+    if extension in _EXTENSIONS:
+        return _EXTENSIONS[extension]
+    media_type = (content_type or "").split(";")[0].strip().lower()
+    for input, known in INPUTS.items():
+        if media_type == known:
+            return input
+    return None
+
+
+def decode(lines):
+    """Text lines of an UTF-8 byte stream (a request body, an upload), without its BOM."""
+    return codecs.iterdecode(lines, "utf-8-sig")
+
+
+class _UploadParser(BaseParser):
+    """Hands the request body to the view unread, as the `file` to import."""
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        return {"file": stream}
+
+
+class CSVUploadParser(_UploadParser):
+    media_type = INPUTS["csv"]
+
+
+class NDJSONUploadParser(_UploadParser):
+    media_type = INPUTS["ndjson"]
+
+
+def read_records(lines, input):
+    """(line number, record dict or error message) for each record in the text `lines`."""
+    if input == "csv":
+        reader = csv.DictReader(lines)
+        for record in reader:
+            yield reader.line_num, record
+        return
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield number, "Invalid JSON"
+            continue
+        yield number, record if isinstance(record, dict) else "Expected a JSON object"
+
+
+class Importer:
+    """Imports the records of one model; subclasses declare the columns read."""
+
+    model = None
+    # Header of the optional explicit primary key
+    pk = None
+    # (header, field name) of the plain columns
+    columns = ()
+    # (header, foreign key name) of the referenced rows, resolved per chunk
+    references = ()
+    # Tables other than the model's whose primary keys an explicit id may not take
+    other_tables = ()
+
+    def __init__(self, registrada_por=None, dry_run=False, chunk_size=None):
+        self.registrada_por = registrada_por
+        self.dry_run = dry_run
+        self.chunk_size = chunk_size or default_chunk_size()
+        self.created = 0
+        self.invalid = 0
+        self.errors = []
+        self._pks = set()
+        self._fields = [(header, self.model._meta.get_field(name)) for header, name in self.columns]
+        self._references = [(header, self.model._meta.get_field(name)) for header, name in self.references]
+        # What each record is converted with
+        self._converted = self._fields + [(header, field.target_field) for header, field in self._references]
+        if self.pk is not None:
+            self._converted.append((self.pk, self.model._meta.pk))
+
+    def run(self, records):
+        """Import `records` ((line, record) pairs); returns the report."""
+        chunk, line = [], 0
+        try:
+            for line, record in records:
+                chunk.append((line, record))
+                if len(chunk) >= self.chunk_size:
+                    self._import_chunk(chunk)
+                    chunk = []
+        except (UnicodeDecodeError, csv.Error) as exc:
+            # The rest of the file cannot be read; the records before it are imported
+            self._import_chunk(chunk)
+            chunk = []
+            self._error(line + 1, {NON_FIELD_ERRORS: ["Unreadable input: %s" % exc]})
+        self._import_chunk(chunk)
+        self.done()
+        return self.report()
+
+    def report(self):
+        return {
+            "created": self.created,
+            "invalid": self.invalid,
+            "dry_run": self.dry_run,
+            "errors": self.errors,
+        }
+
+    def _error(self, line, errors):
+        self.invalid += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "errors": errors})
+
+    def _convert(self, record):
+        values, errors = {}, {}
+        for header, field in self._converted:
+            value = record.get(header)
+            if isinstance(value, str):
+                value = value.strip()
+                if field.get_internal_type() == "BooleanField":
+                    value = _BOOLEANS.get(value.lower(), value)
+            if value in ("", None):
+                if header == self.pk:
+                    continue
+                if header not in record and field.has_default():
+                    continue
+                value = None if field.null else ""
+            try:
+                values[header] = field.clean(value, None)
+                if values[header] is not None and field.get_internal_type().startswith("Positive"):
+                    _POSITIVE(values[header])
+            except ValidationError as exc:
+                errors[header] = exc.messages
+        return values, errors
+
+    def _import_chunk(self, chunk):
+        if not chunk:
+            return
+        rows, errors = [], defaultdict(dict)
+        for line, record in chunk:
+            if isinstance(record, str):
+                errors[line][NON_FIELD_ERRORS] = [record]
+                continue
+            values, row_errors = self._convert(record)
+            if row_errors:
+                errors[line].update(row_errors)
+            else:
+                rows.append((line, values))
+
+        self._check_references(rows, errors)
+        self._check_pks(rows, errors)
+        self.check(rows, errors)
+        valid = [(line, values) for line, values in rows if line not in errors]
+        objs = [self.build(values) for _, values in valid]
+        if objs and not self.dry_run:
+            objs = self._insert(valid, objs, errors)
+        for line in sorted(errors):
+            self._error(line, errors[line])
+        if objs:
+            self.created += len(objs)
+            if not self.dry_run:
+                self.imported(objs)
+
+    def _insert(self, valid, objs, errors):
+        """Insert `objs`; returns those inserted."""
+        using = router.db_for_write(self.model)
+        try:
+            with transaction.atomic(using=using):
+                self.model.objects.bulk_create(objs)
+            return objs
+        except DatabaseError:
+            pass
+        # Some row got past the checks (or was taken concurrently): one at a time to tell which
+        inserted = []
+        for (line, _), obj in zip(valid, objs):
+            try:
+                with transaction.atomic(using=using):
+                    self.model.objects.bulk_create([obj])
+            except DatabaseError as exc:
+                errors[line][NON_FIELD_ERRORS] = ["Not imported: %s" % exc]
+            else:
+                inserted.append(obj)
+        return inserted
+
+    def _check_references(self, rows, errors):
+        self.referenced = {}
+        for header, field in self._references:
+            ids = {values[header] for _, values in rows if values.get(header) is not None}
+            found = {
+                row[0]: row[1:]
+                for row in field.related_model.objects.filter(pk__in=ids).values_list("pk", *self.copied(field))
+            }
+            self.referenced[field.name] = found
+            for line, values in rows:
+                if values.get(header) is not None and values[header] not in found:
+                    errors[line][header] = ["No %s with id %s" % (field.related_model._meta.verbose_name, values[header])]
+
+    def _check_pks(self, rows, errors):
+        if self.pk is None:
+            return
+        pks = {values[self.pk] for _, values in rows if self.pk in values}
+        if not pks:
+            return
+        taken = set(self.model.objects.filter(pk__in=pks).values_list("pk", flat=True))
+        for model in self.other_tables:
+            taken.update(model.objects.filter(pk__in=pks).values_list("pk", flat=True))
+        for line, values in rows:
+            pk = values.get(self.pk)
+            if pk is None:
+                continue
+            if pk in taken or pk in self._pks:
+                errors[line][self.pk] = ["Id %s is already taken" % pk]
+            elif line not in errors:
+                self._pks.add(pk)
+
+    def copied(self, field):
+        """Attnames of the rows referenced through `field` that build() needs."""
+        return ()
+
+    def check(self, rows, errors):
+        """Add to `errors` ({line: {header: messages}}) what the checks of a whole chunk find."""
+
+    def build(self, values):
+        obj = self.model()
+        for header, field in self._fields:
+            if header in values:
+                setattr(obj, field.attname, values[header])
+        for header, field in self._references:
+            setattr(obj, field.attname, values.get(header))
+        if self.pk in values:
+            obj.pk = values[self.pk]
+        return obj
+
+    def imported(self, objs):
+        """Called with the objects of every chunk inserted."""
+
+    def done(self):
+        if self._pks and not self.dry_run:
+            # Explicit ids do not move the primary key sequences (PostgreSQL)
+            connection = connections[router.db_for_write(self.model)]
+            statements = connection.ops.sequence_reset_sql(no_style(), [self.model])
+            with connection.cursor() as cursor:
+                for sql in statements:
+                    cursor.execute(sql)
+
+
+class DuenoImporter(Importer):
+    model = Dueno
+    pk = "idDueno"
+    columns = (("nombre", "nombre"), ("telefono", "telefono"))
+
+    def build(self, values):
+        obj = super().build(values)
+        obj.registrado_por_recepcionista = self.registrada_por
+        obj.updated_at = timezone.now()
+        return obj
+
+
+class MascotaImporter(Importer):
+    model = Mascota
+    pk = "idMascota"
+    columns = (("nombre", "nombre"), ("especie", "especie"), ("raza", "raza"), ("edad", "edad"))
+    references = (("idDueno", "dueno"),)
+
+    def build(self, values):
+        obj = super().build(values)
+        obj.registrada_por_recepcionista = self.registrada_por
+        obj.updated_at = timezone.now()
+        return obj
+
+
+class ConsultaImporter(Importer):
+    model = Consulta
+    pk = "idConsulta"
+    columns = (
+        ("fecha", "fecha"),
+        ("hora", "hora"),
+        ("motivo", "motivo"),
+        ("descripcion", "descripcion"),
+        ("sintomas", "sintomas"),
+        ("tratamiento", "tratamiento"),
+        ("asistio", "asistio"),
+        ("cancelada", "cancelada"),
+    )
+    references = (("idVeterinario", "veterinario"), ("idMascota", "mascota"))
+    other_tables = (ConsultaArchivada,)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._slots = set()
+        self._first = self._last = None
+
+    def copied(self, field):
+        return ("dueno_id",) if field.name == "mascota" else ()
+
+    def check(self, rows, errors):
+        # One active consulta per vet and slot (consulta_unique_active_slot)
+        booked = [(line, values) for line, values in rows if values.get("hora") is not None and not values.get("cancelada")]
+        taken = set(
+            Consulta.objects.filter(
+                cancelada=False,
+                veterinario_id__in={values["idVeterinario"] for _, values in booked},
+                fecha__in={values["fecha"] for _, values in booked},
+                hora__isnull=False,
+            ).values_list("veterinario_id", "fecha", "hora")
+        )
+        for line, values in booked:
+            slot = (values["idVeterinario"], values["fecha"], values["hora"])
+            if slot in taken or slot in self._slots:
+                errors[line]["hora"] = ["The veterinario already has a consulta at this time"]
+            elif line not in errors:
+                self._slots.add(slot)
+
+    def build(self, values):
+        obj = super().build(values)
+        obj.dueno_id = self.referenced["mascota"][values["idMascota"]][0] if values.get("idMascota") else None
+        obj.registrada_por = self.registrada_por
+        obj.updated_at = timezone.now()
+        return obj
+
+    def imported(self, objs):
+        availability_cache.invalidate({(obj.veterinario_id, obj.fecha) for obj in objs})
+        first, last = min(obj.fecha for obj in objs), max(obj.fecha for obj in objs)
+        self._first = first if self._first is None else min(self._first, first)
+        self._last = last if self._last is None else max(self._last, last)
+
+    def done(self):
+        super().done()
+        if self._first is not None:
+            stats.rebuild(start=self._first, end=self._last)
+
+
+IMPORTERS = {
+    "duenos": DuenoImporter,
+    "mascotas": MascotaImporter,
+    "consultas": ConsultaImporter,
+}
+
+
+def import_records(kind, lines, input, **options):
+    """Import the text `lines` of an `input` ("csv" or "ndjson") file of `kind`; returns the report."""
+    return IMPORTERS[kind](**options).run(read_records(lines, input))
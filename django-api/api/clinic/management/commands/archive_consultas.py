@@ -0,0 +1,29 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.clinic import archive
+
+
+def _date(value):
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f"Invalid date {value!r}, expected YYYY-MM-DD")
+
+
+class Command(BaseCommand):
+    help = "Move consultas older than CLINIC_ARCHIVE['AFTER_DAYS'] to the archive, one transaction per batch."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--before", type=_date, default=None, help="Archive consultas dated before this day (default: the cutoff)")
+        parser.add_argument("--batch-size", type=int, default=None, help="Consultas moved per transaction")
+
+    def handle(self, *args, **options):
+        if options["batch_size"] is not None and options["batch_size"] < 1:
+            raise CommandError("--batch-size must be at least 1")
+        try:
+            moved = archive.archive(before=options["before"], batch_size=options["batch_size"])
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        self.stdout.write(self.style.SUCCESS(f"Archived {moved} consultas"))
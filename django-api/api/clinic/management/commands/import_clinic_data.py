@@ -0,0 +1,42 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.clinic import imports
+
+
+class Command(BaseCommand):
+    help = "Import dueños, mascotas or consultas from a CSV or NDJSON file with the columns of the exports."
+
+    def add_arguments(self, parser):
+        parser.add_argument("kind", choices=list(imports.IMPORTERS))
+        parser.add_argument("path", help="File to import, - for standard input")
+        parser.add_argument("--input", choices=list(imports.INPUTS), default=None, help="Default: from the file extension")
+        parser.add_argument("--chunk-size", type=int, default=None, help="Rows validated and inserted per transaction")
+        parser.add_argument("--dry-run", action="store_true", help="Validate without importing")
+
+    def handle(self, *args, **options):
+        if options["chunk_size"] is not None and options["chunk_size"] < 1:
+            raise CommandError("--chunk-size must be at least 1")
+        path = options["path"]
+        input = options["input"] or imports.guess_input(name=path)
+        if input is None:
+            raise CommandError("Cannot tell the format of %r, pass --input" % path)
+
+        kwargs = {"dry_run": options["dry_run"], "chunk_size": options["chunk_size"]}
+        if path == "-":
+            report = imports.import_records(options["kind"], sys.stdin, input, **kwargs)
+        else:
+            try:
+                with open(path, newline="", encoding="utf-8-sig") as lines:
+                    report = imports.import_records(options["kind"], lines, input, **kwargs)
+            except OSError as exc:
+                raise CommandError(str(exc))
+
+        for error in report["errors"]:
+            messages = "; ".join("%s: %s" % (field, " ".join(texts)) for field, texts in error["errors"].items())
+            self.stderr.write("Line %s: %s" % (error["line"], messages))
+        if report["invalid"] > len(report["errors"]):
+            self.stderr.write("... and %d more invalid rows" % (report["invalid"] - len(report["errors"])))
+        verb = "Would import" if report["dry_run"] else "Imported"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {report['created']} rows, {report['invalid']} invalid"))
@@ -0,0 +1,27 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.clinic.stats import rebuild
+
+
+def _date(value):
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f"Invalid date {value!r}, expected YYYY-MM-DD")
+
+
+class Command(BaseCommand):
+    help = "Recompute VetDailyStats from Consulta, one transaction per batch of days."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-days", type=int, default=31, help="Days recomputed per transaction")
+        parser.add_argument("--start", type=_date, default=None, help="First day (default: first consulta)")
+        parser.add_argument("--end", type=_date, default=None, help="Last day (default: last consulta)")
+
+    def handle(self, *args, **options):
+        if options["batch_days"] < 1:
+            raise CommandError("--batch-days must be at least 1")
+        written = rebuild(batch_days=options["batch_days"], start=options["start"], end=options["end"])
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} daily stats rows"))
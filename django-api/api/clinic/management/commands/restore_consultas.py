@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.clinic import archive
+from api.clinic.management.commands.archive_consultas import _date
+
+
+class Command(BaseCommand):
+    help = "Move archived consultas back to Consulta, one transaction per batch."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--mascota", type=int, default=None, help="Only the consultas of this idMascota")
+        parser.add_argument("--start", type=_date, default=None, help="First day restored")
+        parser.add_argument("--end", type=_date, default=None, help="Last day restored")
+        parser.add_argument("--all", action="store_true", help="Restore the whole archive")
+        parser.add_argument("--batch-size", type=int, default=None, help="Consultas moved per transaction")
+
+    def handle(self, *args, **options):
+        if not (options["all"] or options["mascota"] is not None or options["start"] or options["end"]):
+            raise CommandError("Pass --mascota, --start/--end or --all")
+        if options["batch_size"] is not None and options["batch_size"] < 1:
+            raise CommandError("--batch-size must be at least 1")
+        restored = archive.restore(
+            mascota_id=options["mascota"],
+            start=options["start"],
+            end=options["end"],
+            batch_size=options["batch_size"],
+        )
+        self.stdout.write(self.style.SUCCESS(f"Restored {restored} consultas"))
+        if restored:
+            self.stdout.write("Consultas dated before %s go back to the archive on the next archive_consultas run." % archive.cutoff())
@@ -0,0 +1,38 @@
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def cancel_double_bookings(apps, schema_editor):
+    # Keep the first appointment of every double-booked slot and cancel the rest,
+    # otherwise the unique constraint below cannot be created
+    Consulta = apps.get_model("api_clinic", "Consulta")
+    slots = (
+        Consulta.objects.filter(hora__isnull=False)
+        .values("veterinario_id", "fecha", "hora")
+        .annotate(n=Count("pk"), first=Min("pk"))
+        .filter(n__gt=1)
+    )
+    for slot in slots:
+        Consulta.objects.filter(
+            veterinario_id=slot["veterinario_id"], fecha=slot["fecha"], hora=slot["hora"]
+        ).exclude(pk=slot["first"]).update(cancelada=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_clinic', '0002_consulta_registrada_por'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='consulta',
+            name='cancelada',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(cancel_double_bookings, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='consulta',
+            constraint=models.UniqueConstraint(condition=models.Q(('cancelada', False), ('hora__isnull', False)), fields=('veterinario', 'fecha', 'hora'), name='consulta_unique_active_slot'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 3.2.13 on 2026-10-18 11:34
+
+from django.db import migrations, models
+
+import api.operations
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY cannot run in a transaction
+    atomic = False
+
+    dependencies = [
+        ('api_clinic', '0003_consulta_cancelada_unique_slot'),
+    ]
+
+    operations = [
+        api.operations.AddIndexConcurrently(
+            model_name='consulta',
+            index=models.Index(fields=['fecha', 'hora', 'idConsulta'], name='consulta_fecha_hora_idx'),
+        ),
+        api.operations.AddIndexConcurrently(
+            model_name='consulta',
+            index=models.Index(fields=['veterinario', 'fecha', 'hora', 'idConsulta'], name='consulta_vet_fecha_idx'),
+        ),
+        api.operations.AddIndexConcurrently(
+            model_name='consulta',
+            index=models.Index(fields=['mascota', 'fecha', 'hora', 'idConsulta'], name='consulta_mascota_fecha_idx'),
+        ),
+        api.operations.AddIndexConcurrently(
+            model_name='mascota',
+            index=models.Index(fields=['dueno', 'idMascota'], name='mascota_dueno_idx'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 3.2.13 on 2026-10-18 11:55
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+import django.db.models.deletion
+
+import api.operations
+
+BATCH_SIZE = 5000
+
+
+def backfill_consulta_dueno(apps, schema_editor):
+    # One UPDATE per pk range; the migration is not atomic, so each batch commits
+    # on its own and no lock is held on the whole table
+    Consulta = apps.get_model("api_clinic", "Consulta")
+    Mascota = apps.get_model("api_clinic", "Mascota")
+    dueno = Subquery(Mascota.objects.filter(pk=OuterRef("mascota_id")).values("dueno_id")[:1])
+    last_pk = 0
+    while True:
+        pks = list(Consulta.objects.filter(pk__gt=last_pk).order_by("pk").values_list("pk", flat=True)[:BATCH_SIZE])
+        if not pks:
+            break
+        Consulta.objects.filter(pk__gte=pks[0], pk__lte=pks[-1], mascota__isnull=False).update(dueno_id=dueno)
+        last_pk = pks[-1]
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY cannot run in a transaction
+    atomic = False
+
+    dependencies = [
+        ('api_clinic', '0005_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='consulta',
+            name='dueno',
+            field=models.ForeignKey(blank=True, db_index=False, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='consultas', to='api_clinic.dueno'),
+        ),
+        migrations.RunPython(backfill_consulta_dueno, migrations.RunPython.noop),
+        api.operations.AddIndexConcurrently(
+            model_name='consulta',
+            index=models.Index(fields=['dueno', 'fecha', 'hora', 'idConsulta'], name='consulta_dueno_fecha_idx'),
+        ),
+    ]
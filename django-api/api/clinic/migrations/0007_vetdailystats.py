@@ -0,0 +1,49 @@
+# Generated by Django 3.2.13 on 2026-10-18 12:05
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+import django.db.models.deletion
+
+
+def count_consultas(apps, schema_editor):
+    # One GROUP BY over the active consultas; see api/clinic/stats.py for later rebuilds
+    Consulta = apps.get_model("api_clinic", "Consulta")
+    VetDailyStats = apps.get_model("api_clinic", "VetDailyStats")
+    rows = Consulta.objects.filter(cancelada=False).values("veterinario_id", "fecha").annotate(
+        booked=Count("pk"),
+        attended=Count("pk", filter=Q(asistio=True)),
+        no_show=Count("pk", filter=Q(asistio=False)),
+        pending=Count("pk", filter=Q(asistio__isnull=True)),
+    ).order_by()
+    VetDailyStats.objects.bulk_create((VetDailyStats(**row) for row in rows.iterator()), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_clinic', '0006_consulta_dueno'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VetDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('booked', models.IntegerField(default=0)),
+                ('attended', models.IntegerField(default=0)),
+                ('no_show', models.IntegerField(default=0)),
+                ('pending', models.IntegerField(default=0)),
+                ('veterinario', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='api_clinic.veterinario')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='vetdailystats',
+            index=models.Index(fields=['fecha'], name='vetdailystats_fecha_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='vetdailystats',
+            constraint=models.UniqueConstraint(fields=('veterinario', 'fecha'), name='vetdailystats_vet_fecha_uniq'),
+        ),
+        migrations.RunPython(count_consultas, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,83 @@
+from django.db import OperationalError, migrations
+
+# The index and triggers as this migration creates them, written out so later
+# changes to api.clinic.search do not change what it applies
+
+GIN_INDEX_NAME = "consulta_search_idx"
+GIN_INDEX_FIELDS = ("motivo", "descripcion", "sintomas", "tratamiento")
+GIN_INDEX_CONFIG = "spanish"
+
+FTS_TABLE = "api_clinic_consulta_fts"
+
+_FTS_DELETE = (
+    "INSERT INTO api_clinic_consulta_fts(api_clinic_consulta_fts, rowid, motivo, descripcion, sintomas, tratamiento) "
+    "VALUES ('delete', old.\"idConsulta\", old.motivo, old.descripcion, old.sintomas, old.tratamiento);"
+)
+_FTS_INSERT = (
+    "INSERT INTO api_clinic_consulta_fts(rowid, motivo, descripcion, sintomas, tratamiento) "
+    "VALUES (new.\"idConsulta\", new.motivo, new.descripcion, new.sintomas, new.tratamiento);"
+)
+
+SQLITE_STATEMENTS = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS api_clinic_consulta_fts "
+    "USING fts5(motivo, descripcion, sintomas, tratamiento, content='api_clinic_consulta', "
+    "content_rowid='idConsulta', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS api_clinic_consulta_fts_ai AFTER INSERT ON api_clinic_consulta "
+    "BEGIN %s END" % _FTS_INSERT,
+    "CREATE TRIGGER IF NOT EXISTS api_clinic_consulta_fts_ad AFTER DELETE ON api_clinic_consulta "
+    "BEGIN %s END" % _FTS_DELETE,
+    "CREATE TRIGGER IF NOT EXISTS api_clinic_consulta_fts_au "
+    "AFTER UPDATE OF motivo, descripcion, sintomas, tratamiento ON api_clinic_consulta "
+    "BEGIN %s %s END" % (_FTS_DELETE, _FTS_INSERT),
+    # Index the rows already there
+    "INSERT INTO api_clinic_consulta_fts(api_clinic_consulta_fts) VALUES ('rebuild')",
+]
+
+
+def _gin_index():
+    from django.contrib.postgres.indexes import GinIndex
+    from django.contrib.postgres.search import SearchVector
+
+    return GinIndex(SearchVector(*GIN_INDEX_FIELDS, config=GIN_INDEX_CONFIG), name=GIN_INDEX_NAME)
+
+
+def _drop_sqlite(schema_editor):
+    for suffix in ("_ai", "_ad", "_au"):
+        schema_editor.execute("DROP TRIGGER IF EXISTS %s%s" % (FTS_TABLE, suffix))
+    schema_editor.execute("DROP TABLE IF EXISTS %s" % FTS_TABLE)
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        # Same expression the searches use, or the planner will not pick the index
+        schema_editor.add_index(apps.get_model("api_clinic", "Consulta"), _gin_index(), concurrently=True)
+    elif vendor == "sqlite":
+        try:
+            for statement in SQLITE_STATEMENTS:
+                schema_editor.execute(statement)
+        except OperationalError:
+            # SQLite built without FTS5: searches fall back to a scan
+            _drop_sqlite(schema_editor)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        schema_editor.remove_index(apps.get_model("api_clinic", "Consulta"), _gin_index(), concurrently=True)
+    elif vendor == "sqlite":
+        _drop_sqlite(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY cannot run in a transaction
+    atomic = False
+
+    dependencies = [
+        ('api_clinic', '0007_vetdailystats'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
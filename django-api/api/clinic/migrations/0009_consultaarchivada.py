@@ -0,0 +1,41 @@
+# Generated by Django 3.2.13 on 2026-10-18 12:16
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_clinic', '0008_consulta_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConsultaArchivada',
+            fields=[
+                ('idConsulta', models.IntegerField(primary_key=True, serialize=False)),
+                ('motivo', models.CharField(max_length=255)),
+                ('descripcion', models.TextField(blank=True, null=True)),
+                ('fecha', models.DateField()),
+                ('sintomas', models.TextField(blank=True, null=True)),
+                ('asistio', models.BooleanField(blank=True, default=None, null=True)),
+                ('tratamiento', models.TextField(blank=True, null=True)),
+                ('hora', models.TimeField(blank=True, null=True)),
+                ('cancelada', models.BooleanField(default=False)),
+                ('updated_at', models.DateTimeField()),
+                ('dueno', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='consultas_archivadas', to='api_clinic.dueno')),
+                ('mascota', models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='consultas_archivadas', to='api_clinic.mascota')),
+                ('registrada_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='api_clinic.recepcionista')),
+                ('veterinario', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='consultas_archivadas', to='api_clinic.veterinario')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='consultaarchivada',
+            index=models.Index(fields=['mascota', 'fecha', 'hora', 'idConsulta'], name='archivada_mascota_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='consultaarchivada',
+            index=models.Index(fields=['fecha'], name='archivada_fecha_idx'),
+        ),
+    ]
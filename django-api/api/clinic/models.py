@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models import Q
 from django.conf import settings
 from datetime import time
 
@@ -24,6 +25,15 @@ class Dueno(models.Model):
     # Note: Dueno is no longer linked to a User account.
     nombre = models.CharField(max_length=255, blank=True, null=True)
     telefono = models.CharField(max_length=50, blank=True, null=True)
+    # recepcionista that registered this dueño (column created by 0001_initial)
+    registrado_por_recepcionista = models.ForeignKey(
+        "api_clinic.Recepcionista",
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name="duenos_registrados",
+    )
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
 
     def __str__(self):
@@ -47,6 +57,8 @@ class Veterinario(models.Model):
     work_end = models.TimeField(null=True, blank=True, default=time(14, 0))
     # Comma-separated week day names or numbers (e.g. "Mon,Tue,Wed")
     work_days = models.CharField(max_length=100, blank=True, null=True)
+    # Also bumped when the linked user's telefono changes (see signals.py)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self):
         return self.nombre
@@ -61,7 +73,21 @@ class Mascota(models.Model):
     dueno = models.ForeignKey(
         "api_clinic.Dueno", on_delete=models.CASCADE, related_name="mascotas"
     )
+    # recepcionista that registered this mascota (column created by 0001_initial)
+    registrada_por_recepcionista = models.ForeignKey(
+        "api_clinic.Recepcionista",
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name="mascotas_registradas",
+    )
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
+    class Meta:
+        indexes = [
+            # keyset pages of an owner's mascotas
+            models.Index(fields=["dueno", "idMascota"], name="mascota_dueno_idx"),
+        ]
 
     def __str__(self):
         return f"{self.nombre} ({self.especie})"
@@ -70,6 +96,12 @@ class Mascota(models.Model):
 # Historial model intentionally removed — consultations are linked directly to Mascota
 
 
+class ConsultaQuerySet(models.QuerySet):
+    def for_listing(self):
+        """Join every relation ConsultaSerializer reads, so listing N consultas is one query."""
+        return self.select_related("mascota__dueno", "veterinario", "registrada_por")
+
+
 class Consulta(models.Model):
     idConsulta = models.AutoField(primary_key=True)
     motivo = models.CharField(max_length=255)
@@ -96,8 +128,19 @@ class Consulta(models.Model):
         on_delete=models.CASCADE,
         related_name="consultas",
     )
-    # Link consulta directly to a Mascota and Veterinario for querying
-    # `dueno` relationship was removed — Dueno is not a User-linked profile anymore
+    # Owner of the mascota, copied here so an owner's consultas are one range over
+    # consulta_dueno_fecha_idx instead of a join through Mascota. Kept in sync by
+    # signals.py on save; QuerySet.update() of Consulta.mascota or Mascota.dueno must
+    # set it too
+    dueno = models.ForeignKey(
+        "api_clinic.Dueno",
+        null=True,
+        blank=True,
+        editable=False,
+        on_delete=models.CASCADE,
+        related_name="consultas",
+        db_index=False,
+    )
     # Optional time for appointments
     hora = models.TimeField(null=True, blank=True)
     
@@ -109,11 +152,149 @@ class Consulta(models.Model):
         on_delete=models.SET_NULL,
         related_name="consultas_registradas",
     )
+    # Cancelled appointments are kept for history but free their slot
+    cancelada = models.BooleanField(default=False)
+    # Validators for conditional GETs (see conditional.py). auto_now is not applied
+    # by QuerySet.update() or bulk_create(): set it explicitly there
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    objects = ConsultaQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            # One active appointment per vet and slot; enforced by the database so
+            # concurrent bookings cannot both succeed (see booking.py)
+            models.UniqueConstraint(
+                fields=["veterinario", "fecha", "hora"],
+                condition=Q(cancelada=False, hora__isnull=False),
+                name="consulta_unique_active_slot",
+            ),
+        ]
+        # Keyset pagination orders by (fecha, hora, idConsulta), overall and per
+        # veterinario, mascota or dueno; descending listings scan the same indexes backwards.
+        # Availability and the vet dashboard range over the veterinario index; a
+        # mascota has few consultas, so asistio=True is a filter on the mascota
+        # index rather than an index of its own. Plans are checked in tests.py
+        # (IndexUsageTest) and benchmarks/indexes.py; build new indexes with
+        # api.operations.AddIndexConcurrently
+        indexes = [
+            models.Index(fields=["fecha", "hora", "idConsulta"], name="consulta_fecha_hora_idx"),
+            models.Index(fields=["veterinario", "fecha", "hora", "idConsulta"], name="consulta_vet_fecha_idx"),
+            models.Index(fields=["mascota", "fecha", "hora", "idConsulta"], name="consulta_mascota_fecha_idx"),
+            models.Index(fields=["dueno", "fecha", "hora", "idConsulta"], name="consulta_dueno_fecha_idx"),
+        ]
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None or {"mascota", "mascota_id"} & set(update_fields):
+            self.dueno_id = self._mascota_dueno_id()
+            if update_fields is not None:
+                kwargs["update_fields"] = {*update_fields, "dueno"}
+        super().save(*args, **kwargs)
+
+    def _mascota_dueno_id(self):
+        if self.mascota_id is None:
+            return None
+        if Consulta.mascota.is_cached(self) and self.mascota.pk == self.mascota_id:
+            return self.mascota.dueno_id
+        return Mascota.objects.filter(pk=self.mascota_id).values_list("dueno_id", flat=True).first()
 
     def __str__(self):
         return f"Consulta {self.idConsulta} - {self.motivo}"
 
 
+class ConsultaArchivada(models.Model):
+    """A consulta older than the archive horizon, moved out of Consulta by archive.py.
+
+    Same columns and idConsulta as the Consulta it was; only the indexes the
+    archived read paths (a mascota's history) and restores need.
+    """
+
+    idConsulta = models.IntegerField(primary_key=True)
+    motivo = models.CharField(max_length=255)
+    descripcion = models.TextField(blank=True, null=True)
+    fecha = models.DateField()
+    sintomas = models.TextField(blank=True, null=True)
+    asistio = models.BooleanField(null=True, blank=True, default=None)
+    tratamiento = models.TextField(blank=True, null=True)
+    veterinario = models.ForeignKey(
+        "api_clinic.Veterinario",
+        on_delete=models.PROTECT,
+        related_name="consultas_archivadas",
+    )
+    mascota = models.ForeignKey(
+        "api_clinic.Mascota",
+        null=True,
+        blank=True,
+        on_delete=models.CASCADE,
+        related_name="consultas_archivadas",
+        db_index=False,
+    )
+    dueno = models.ForeignKey(
+        "api_clinic.Dueno",
+        null=True,
+        blank=True,
+        on_delete=models.CASCADE,
+        related_name="consultas_archivadas",
+    )
+    hora = models.TimeField(null=True, blank=True)
+    registrada_por = models.ForeignKey(
+        "api_clinic.Recepcionista",
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name="+",
+    )
+    cancelada = models.BooleanField(default=False)
+    # Copied from the Consulta, not touched by archiving
+    updated_at = models.DateTimeField()
+
+    objects = ConsultaQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["mascota", "fecha", "hora", "idConsulta"], name="archivada_mascota_fecha_idx"),
+            models.Index(fields=["fecha"], name="archivada_fecha_idx"),
+        ]
+
+    def __str__(self):
+        return f"Consulta archivada {self.idConsulta} - {self.motivo}"
+
+
+class VetDailyStats(models.Model):
+    """Active (not cancelled) consultas of a veterinario on a day, by attendance.
+
+    booked = attended + no_show + pending. Kept up to date by signals.py as
+    consultas are saved and deleted; see stats.py, and the rebuild_vet_stats
+    command to recompute it.
+    """
+
+    veterinario = models.ForeignKey(
+        "api_clinic.Veterinario",
+        on_delete=models.CASCADE,
+        related_name="daily_stats",
+        db_index=False,
+    )
+    fecha = models.DateField()
+    booked = models.IntegerField(default=0)
+    # asistio True / False / NULL
+    attended = models.IntegerField(default=0)
+    no_show = models.IntegerField(default=0)
+    pending = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["veterinario", "fecha"], name="vetdailystats_vet_fecha_uniq"),
+        ]
+        indexes = [
+            # clinic-wide dashboards over a date range
+            models.Index(fields=["fecha"], name="vetdailystats_fecha_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.veterinario_id} {self.fecha}: {self.booked}"
+
+
 # Cita model removed: appointments are now represented by Consulta.
 
 
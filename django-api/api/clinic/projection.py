@@ -0,0 +1,233 @@
+"""Read-only fast path for list responses.
+
+A `Projection` compiles a ModelSerializer into the list of columns it reads and a
+generated function turning one `values_list()` row into the dict the serializer
+would have produced, key for key, so the rendered JSON is byte-identical while the
+per-row field machinery of DRF is skipped.
+
+SerializerMethodFields cannot be introspected; a serializer using them declares
+`projected_fields = {name: (lookups, function)}`, where `lookups` are paths relative
+to its model and `function(*values)` returns what the method would return.
+
+A projection can be compiled for a sparse fieldset (see fieldsets.py), in which case
+only the kept fields are rendered and only their columns are selected.
+"""
+
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework import relations, serializers
+from rest_framework.response import Response
+from rest_framework import ISO_8601
+from rest_framework.settings import api_settings
+
+from . import conditional
+from .fieldsets import SparseFieldsetSchema, requested_fieldset, restrict, trim
+
+# Fields whose to_representation() returns the database value unchanged
+_IDENTITY_FIELDS = (serializers.CharField, serializers.IntegerField, relations.PrimaryKeyRelatedField)
+
+
+def fast_lists_enabled():
+    return getattr(settings, "CLINIC_FAST_LISTS", True)
+
+
+class Projection:
+    def __init__(self, serializer_class, fieldset=None):
+        self.serializer_class = serializer_class
+        self.fieldset = fieldset
+        self.columns = []
+        self._namespace = {}
+        body = self._compile(serializer_class(), "", fieldset)
+        source = "def convert(row):\n    return %s\n" % body
+        exec(compile(source, "<projection %s>" % serializer_class.__name__, "exec"), self._namespace)
+        self.convert = self._namespace["convert"]
+        self.source = source
+
+    def values(self, queryset):
+        """`queryset` reduced to the projected columns, in the projection's order."""
+        return queryset.values_list(*self.columns)
+
+    def convert_many(self, rows):
+        convert = self.convert
+        return [convert(row) for row in rows]
+
+    def data(self, queryset):
+        return self.convert_many(self.values(queryset))
+
+    def _column(self, lookup):
+        self.columns.append(lookup)
+        return "row[%d]" % (len(self.columns) - 1)
+
+    def _helper(self, fn):
+        name = "_f%d" % len(self._namespace)
+        self._namespace[name] = fn
+        return name
+
+    def _compile(self, serializer, prefix, fieldset=None):
+        model = serializer.Meta.model
+        projected = getattr(serializer, "projected_fields", {})
+        kept = dict(fieldset) if fieldset is not None else None
+        items = []
+        for name, field in serializer.fields.items():
+            if field.write_only or (kept is not None and name not in kept):
+                continue
+            if isinstance(field, serializers.SerializerMethodField):
+                if name not in projected:
+                    raise ImproperlyConfigured(
+                        "%s.%s needs an entry in projected_fields" % (type(serializer).__name__, name)
+                    )
+                lookups, fn = projected[name]
+                args = ", ".join(self._column(prefix + lookup) for lookup in lookups)
+                items.append("%r: %s(%s)" % (name, self._helper(fn), args))
+                continue
+
+            source = field.source
+            if "." in source or source == "*":
+                raise ImproperlyConfigured("%s.%s: dotted sources are not projected" % (type(serializer).__name__, name))
+            if isinstance(field, serializers.BaseSerializer):
+                if isinstance(field, serializers.ListSerializer):
+                    raise ImproperlyConfigured("%s.%s: many=True is not projected" % (type(serializer).__name__, name))
+                related_pk = field.Meta.model._meta.pk.name
+                # Checked first: a missing relation renders as null, as in Serializer.to_representation
+                present = self._column("%s%s__%s" % (prefix, source, related_pk))
+                nested = self._compile(field, "%s%s__" % (prefix, source), kept[name] if kept is not None else None)
+                items.append("%r: (None if %s is None else %s)" % (name, present, nested))
+            else:
+                model._meta.get_field(source)
+                items.append("%r: %s" % (name, self._scalar(field, self._column(prefix + source))))
+        return "{%s}" % ", ".join(items)
+
+    def _scalar(self, field, value):
+        if isinstance(field, _IDENTITY_FIELDS) and not getattr(field, "pk_field", None):
+            return value
+        if isinstance(field, (serializers.DateField, serializers.TimeField)) and not isinstance(
+            field, serializers.DateTimeField
+        ):
+            default = api_settings.DATE_FORMAT if isinstance(field, serializers.DateField) else api_settings.TIME_FORMAT
+            output_format = getattr(field, "format", default)
+            if output_format is not None and str(output_format).lower() == ISO_8601:
+                return "(None if %s is None else %s.isoformat())" % (value, value)
+        return "(None if %s is None else %s(%s))" % (value, self._helper(field.to_representation), value)
+
+
+@lru_cache(maxsize=256)
+def projection_for(serializer_class, fieldset=None):
+    return Projection(serializer_class, fieldset)
+
+
+class ProjectedListMixin:
+    """List responses built through the serializer's Projection instead of DRF fields.
+
+    Also honours `?fields=`/`?exclude=` (see fieldsets.py) and conditional GETs (see
+    conditional.py) on lists and retrieve. Set CLINIC_FAST_LISTS = False to serialize
+    through the regular serializers.
+    """
+
+    schema = SparseFieldsetSchema()
+
+    def list(self, request, *args, **kwargs):
+        return self.projected_response(self.filter_queryset(self.get_queryset()))
+
+    def retrieve(self, request, *args, **kwargs):
+        # Answered before get_object(): the clinic viewsets have no object permissions
+        serializer_class = self.get_serializer_class()
+        lookup = {self.lookup_field: kwargs[self.lookup_url_kwarg or self.lookup_field]}
+        found = conditional.validators(
+            request,
+            self.filter_queryset(self.get_queryset()).filter(**lookup),
+            serializer_class,
+            requested_fieldset(request, serializer_class),
+            allow_empty=False,
+        )
+        not_modified = conditional.not_modified(request, found)
+        if not_modified is not None:
+            return not_modified
+        return conditional.stamp(super().retrieve(request, *args, **kwargs), found)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == "retrieve":
+            fieldset = requested_fieldset(self.request, self.get_serializer_class())
+            if fieldset is not None:
+                queryset = restrict(queryset, self.get_serializer_class(), fieldset)
+        return queryset
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        if self.action == "retrieve":
+            fieldset = requested_fieldset(self.request, self.get_serializer_class())
+            if fieldset is not None:
+                trim(serializer, fieldset)
+        return serializer
+
+    def projected_response(self, queryset, serializer_class=None):
+        serializer_class = serializer_class or self.get_serializer_class()
+        fieldset = requested_fieldset(self.request, serializer_class)
+        found = conditional.validators(self.request, self._validated_rows(queryset), serializer_class, fieldset)
+        not_modified = conditional.not_modified(self.request, found)
+        if not_modified is not None:
+            return not_modified
+        return conditional.stamp(self._projected_response(queryset, serializer_class, fieldset), found)
+
+    def merged_response(self, querysets, serializer_class=None):
+        """projected_response() over the union of `querysets` (Consulta and its archive).
+
+        The querysets must share the ordering and the lookups the serializer reads,
+        and never return the same row.
+        """
+        serializer_class = serializer_class or self.get_serializer_class()
+        fieldset = requested_fieldset(self.request, serializer_class)
+        found = conditional.combine(
+            [conditional.validators(self.request, self._validated_rows(queryset), serializer_class, fieldset) for queryset in querysets]
+        )
+        not_modified = conditional.not_modified(self.request, found)
+        if not_modified is not None:
+            return not_modified
+        return conditional.stamp(self._merged_response(querysets, serializer_class, fieldset), found)
+
+    def _merged_response(self, querysets, serializer_class, fieldset):
+        if fast_lists_enabled():
+            projection = projection_for(serializer_class, fieldset)
+            querysets = [projection.values(queryset) for queryset in querysets]
+            convert = projection.convert_many
+        else:
+            if fieldset is not None:
+                querysets = [restrict(queryset, serializer_class, fieldset) for queryset in querysets]
+
+            def convert(rows):
+                serializer = serializer_class(rows, many=True, context=self.get_serializer_context())
+                if fieldset is not None:
+                    trim(serializer, fieldset)
+                return serializer.data
+
+        page = self.paginator.paginate_querysets(querysets, self.request, view=self)
+        if page is not None:
+            return self.get_paginated_response(convert(page))
+        return Response(convert(self.paginator.merge(querysets, view=self)), status=200)
+
+    def _validated_rows(self, queryset):
+        """The rows the response is built from: the page window when paginated."""
+        get_window = getattr(self.paginator, "get_window", None)
+        window = get_window(queryset, self.request, view=self) if get_window else None
+        return queryset if window is None else window
+
+    def _projected_response(self, queryset, serializer_class, fieldset):
+        if not fast_lists_enabled():
+            if fieldset is not None:
+                queryset = restrict(queryset, serializer_class, fieldset)
+            page = self.paginate_queryset(queryset)
+            serializer = serializer_class(queryset if page is None else page, many=True, context=self.get_serializer_context())
+            if fieldset is not None:
+                trim(serializer, fieldset)
+            if page is not None:
+                return self.get_paginated_response(serializer.data)
+            return Response(serializer.data, status=200)
+
+        projection = projection_for(serializer_class, fieldset)
+        rows = projection.values(queryset)
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(projection.convert_many(page))
+        return Response(projection.convert_many(rows), status=200)
@@ -6,6 +6,8 @@ from .viewsets import (
     ConsultaViewSet,
     VeterinarioViewSet,
     ProfileViewSet,
+    ExportViewSet,
+    ImportViewSet,
 )
 
 router = routers.SimpleRouter(trailing_slash=False)
@@ -16,5 +18,7 @@ router.register(r"mascotas", MascotaViewSet, basename="mascota")
 router.register(r"consultas", ConsultaViewSet, basename="consulta")
 router.register(r"veterinarios", VeterinarioViewSet, basename="veterinario")
 router.register(r"profile", ProfileViewSet, basename="profile")
+router.register(r"export", ExportViewSet, basename="export")
+router.register(r"import", ImportViewSet, basename="import")
 
 urlpatterns = [*router.urls]
@@ -0,0 +1,165 @@
+"""Full-text search over the clinical notes of consultas.
+
+`motivo`, `descripcion`, `sintomas` and `tratamiento` are searched as one document:
+
+- on PostgreSQL through the GIN expression index `consulta_search_idx` over
+  `document()`, which the database keeps current on every write (including
+  QuerySet.update() and bulk_create());
+- on SQLite through the FTS5 table `FTS_TABLE`, an external-content index of
+  the consulta table maintained by triggers. Migrations that rebuild the
+  consulta table on SQLite drop those triggers and must create them again
+  (migration 0008 spells them out); `install_sqlite()` repairs a database;
+- elsewhere, or on an SQLite built without FTS5, with a case-insensitive scan.
+
+Hits are ranked (higher is better) and carry an HTML snippet of the notes with
+the matched terms wrapped in <mark>; the rest of the snippet is escaped.
+"""
+
+import re
+
+from django.db import connections, router
+from django.db.models import Func, Q, TextField, Value
+from django.utils.html import escape
+
+from .models import Consulta
+
+FIELDS = ("motivo", "descripcion", "sintomas", "tratamiento")
+
+# Text search configuration of the PostgreSQL index; changing it needs a new index
+CONFIG = "spanish"
+INDEX_NAME = "consulta_search_idx"
+
+FTS_TABLE = "api_clinic_consulta_fts"
+
+# Words shown around the matches in a snippet
+SNIPPET_WORDS = 16
+
+# Markers the database puts around matched terms, replaced after escaping
+_START, _STOP = "\x02", "\x03"
+
+_WORD = re.compile(r"\w+")
+
+
+def document():
+    """The tsvector the PostgreSQL index is built over; queries must use the same expression."""
+    from django.contrib.postgres.search import SearchVector
+
+    return SearchVector(*FIELDS, config=CONFIG)
+
+
+def index():
+    from django.contrib.postgres.indexes import GinIndex
+
+    return GinIndex(document(), name=INDEX_NAME)
+
+
+def _sqlite_statements(table, pk):
+    columns = ", ".join(FIELDS)
+    new = ", ".join("new.%s" % name for name in FIELDS)
+    old = ", ".join("old.%s" % name for name in FIELDS)
+    delete = "INSERT INTO %s(%s, rowid, %s) VALUES ('delete', old.\"%s\", %s);" % (FTS_TABLE, FTS_TABLE, columns, pk, old)
+    insert = "INSERT INTO %s(rowid, %s) VALUES (new.\"%s\", %s);" % (FTS_TABLE, columns, pk, new)
+    return [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS %s USING fts5(%s, content='%s', content_rowid='%s', "
+        "tokenize='unicode61 remove_diacritics 2')" % (FTS_TABLE, columns, table, pk),
+        "CREATE TRIGGER IF NOT EXISTS %s_ai AFTER INSERT ON %s BEGIN %s END" % (FTS_TABLE, table, insert),
+        "CREATE TRIGGER IF NOT EXISTS %s_ad AFTER DELETE ON %s BEGIN %s END" % (FTS_TABLE, table, delete),
+        "CREATE TRIGGER IF NOT EXISTS %s_au AFTER UPDATE OF %s ON %s BEGIN %s %s END"
+        % (FTS_TABLE, columns, table, delete, insert),
+        # Index the rows already there
+        "INSERT INTO %s(%s) VALUES ('rebuild')" % (FTS_TABLE, FTS_TABLE),
+    ]
+
+
+def install_sqlite(schema_editor, model=Consulta):
+    """Create (or repair) the FTS5 table and its triggers and reindex every consulta."""
+    for statement in _sqlite_statements(model._meta.db_table, model._meta.pk.column):
+        schema_editor.execute(statement)
+
+
+def uninstall_sqlite(schema_editor):
+    for suffix in ("_ai", "_ad", "_au"):
+        schema_editor.execute("DROP TRIGGER IF EXISTS %s%s" % (FTS_TABLE, suffix))
+    schema_editor.execute("DROP TABLE IF EXISTS %s" % FTS_TABLE)
+
+
+def _words(text):
+    return _WORD.findall(text)
+
+
+def highlight(snippet):
+    """Escape a database snippet and turn its match markers into <mark> tags."""
+    if snippet is None:
+        return None
+    return escape(snippet).replace(_START, "<mark>").replace(_STOP, "</mark>")
+
+
+def _postgres(text, limit, offset):
+    from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank
+
+    query = SearchQuery(text, config=CONFIG, search_type="websearch")
+    notes = Func(Value(" "), *FIELDS, function="CONCAT_WS", output_field=TextField())
+    hits = (
+        Consulta.objects.annotate(document=document())
+        .filter(document=query)
+        .annotate(
+            rank=SearchRank(document(), query),
+            snippet=SearchHeadline(
+                notes,
+                query,
+                config=CONFIG,
+                start_sel=_START,
+                stop_sel=_STOP,
+                max_words=SNIPPET_WORDS,
+                min_words=SNIPPET_WORDS // 2,
+                max_fragments=2,
+                fragment_delimiter=" … ",
+            ),
+        )
+        .order_by("-rank", "-pk")
+        .values_list("pk", "rank", "snippet")
+    )
+    return list(hits[offset : offset + limit])
+
+
+def _sqlite(text, limit, offset):
+    words = _words(text)
+    if not words:
+        return []
+    # Quoted, so the user's text is never read as FTS5 query syntax; terms are ANDed
+    match = " ".join('"%s"' % word for word in words)
+    with connections[router.db_for_read(Consulta)].cursor() as cursor:
+        cursor.execute(
+            "SELECT rowid, -bm25({0}), snippet({0}, -1, %s, %s, ' … ', %s) FROM {0} "
+            "WHERE {0} MATCH %s ORDER BY bm25({0}), rowid DESC LIMIT %s OFFSET %s".format(FTS_TABLE),
+            [_START, _STOP, SNIPPET_WORDS, match, limit, offset],
+        )
+        return cursor.fetchall()
+
+
+def _scan(text, limit, offset):
+    words = _words(text)
+    if not words:
+        return []
+    condition = Q()
+    for word in words:
+        condition &= Q(*[Q(**{"%s__icontains" % name: word}) for name in FIELDS], _connector=Q.OR)
+    pks = Consulta.objects.filter(condition).order_by("-pk").values_list("pk", flat=True)
+    return [(pk, None, None) for pk in pks[offset : offset + limit]]
+
+
+def _search_function():
+    connection = connections[router.db_for_read(Consulta)]
+    if connection.vendor == "postgresql":
+        return _postgres
+    if connection.vendor == "sqlite" and FTS_TABLE in connection.introspection.table_names():
+        return _sqlite
+    return _scan
+
+
+def search(text, limit, offset=0):
+    """[(consulta id, rank, snippet)] of the best matches for `text`, best first.
+
+    `rank` and `snippet` are None on backends without a full-text index.
+    """
+    return [(pk, rank, highlight(snippet)) for pk, rank, snippet in _search_function()(text, limit, offset)]
@@ -97,6 +97,9 @@ class RecepcionistaSerializer(serializers.ModelSerializer):
         # explicit fields for consistent response shape with Veterinario
         fields = ("idRecepcionista", "user", "nombre", "telefono")
 
+    # get_telefono as a column projection, for api.clinic.projection
+    projected_fields = {"telefono": (("telefono", "user__telefono"), lambda own, user: own or user or None)}
+
     def get_telefono(self, obj):
         try:
             # prefer the telefono stored on the Recepcionista profile
@@ -121,6 +124,9 @@ class VeterinarioSerializer(serializers.ModelSerializer):
         # include telefono derived from linked user for GET responses and working hours
         fields = ("idVeterinario", "user", "nombre", "telefono", "work_start", "work_end", "work_days")
 
+    # get_telefono as a column projection, for api.clinic.projection
+    projected_fields = {"telefono": (("user__telefono",), lambda telefono: telefono or None)}
+
     def get_telefono(self, obj):
         try:
             if obj.user and getattr(obj.user, "telefono", None):
@@ -338,6 +344,9 @@ class MascotaSerializer(serializers.ModelSerializer):
             "dueno_nombre",
         )
 
+    # get_dueno_nombre as a column projection, for api.clinic.projection
+    projected_fields = {"dueno_nombre": (("dueno__nombre",), lambda nombre: nombre)}
+
     def get_dueno_nombre(self, obj):
         try:
             if obj.dueno:
@@ -379,6 +388,7 @@ class ConsultaSerializer(serializers.ModelSerializer):
             "mascota",
             "mascota_id",
             "registrada_por",
+            "cancelada",
         )
         read_only_fields = ("registrada_por",)
 
@@ -0,0 +1,74 @@
+from django.conf import settings
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from api.clinic import stats
+from api.clinic.cache import availability_cache
+from api.clinic.models import Consulta, ConsultaArchivada, Mascota, Veterinario
+
+
+def _availability_key(consulta):
+    # Read __dict__ directly so deferred fields are not loaded
+    return (consulta.__dict__.get("veterinario_id"), consulta.__dict__.get("fecha"))
+
+
+@receiver(post_init, sender=Consulta)
+def remember_availability_key(sender, instance, **kwargs):
+    instance._availability_snapshot = _availability_key(instance)
+
+
+@receiver(post_save, sender=Consulta)
+@receiver(post_delete, sender=Consulta)
+def invalidate_availability(sender, instance, **kwargs):
+    # A moved consulta frees its old (vet, day) and occupies the new one
+    previous = getattr(instance, "_availability_snapshot", (None, None))
+    current = _availability_key(instance)
+    instance._availability_snapshot = current
+    availability_cache.invalidate({previous, current})
+
+
+@receiver(post_init, sender=Consulta)
+def remember_stats_values(sender, instance, **kwargs):
+    instance._stats_snapshot = stats.snapshot(instance)
+
+
+@receiver(pre_save, sender=Consulta)
+@receiver(pre_delete, sender=Consulta)
+def complete_stats_values(sender, instance, **kwargs):
+    # Only costs a query when TRACKED fields were deferred
+    instance._stats_snapshot = stats.complete(instance, instance._stats_snapshot)
+
+
+@receiver(post_save, sender=Consulta)
+def count_saved_consulta(sender, instance, created, update_fields=None, **kwargs):
+    instance._stats_snapshot = stats.saved(instance, instance._stats_snapshot, created, update_fields)
+
+
+@receiver(post_delete, sender=Consulta)
+def count_deleted_consulta(sender, instance, **kwargs):
+    stats.deleted(instance._stats_snapshot)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def touch_veterinario(sender, instance, created, update_fields=None, **kwargs):
+    # VeterinarioSerializer renders the user's telefono; keep the vet's validators honest
+    if created or (update_fields is not None and "telefono" not in update_fields):
+        return
+    Veterinario.objects.filter(user_id=instance.pk).update(updated_at=timezone.now())
+
+
+@receiver(post_init, sender=Mascota)
+def remember_dueno(sender, instance, **kwargs):
+    instance._dueno_snapshot = instance.__dict__.get("dueno_id")
+
+
+@receiver(post_save, sender=Mascota)
+def move_consultas_with_mascota(sender, instance, created, **kwargs):
+    # Consulta.dueno mirrors the mascota's owner (see models.py)
+    previous = getattr(instance, "_dueno_snapshot", None)
+    current = instance._dueno_snapshot = instance.__dict__.get("dueno_id")
+    if created or current is None or previous == current:
+        return
+    Consulta.objects.filter(mascota_id=instance.pk).update(dueno_id=current, updated_at=timezone.now())
+    ConsultaArchivada.objects.filter(mascota_id=instance.pk).update(dueno_id=current)
@@ -0,0 +1,161 @@
+"""Per-veterinario daily consulta counts, kept incrementally in VetDailyStats.
+
+Each active consulta counts once in the row of its (veterinario, fecha): in
+`booked` and in one of `attended`, `no_show` or `pending` depending on asistio.
+signals.py remembers what a consulta counted for when it was loaded and applies
+the difference when it is saved or deleted, so editing the motivo of a consulta
+costs nothing and moving it costs one UPDATE per affected row. Rows whose
+consultas all moved away stay behind with zero counts until the next rebuild.
+
+Writes that bypass model signals (QuerySet.update(), bulk_create()) must call
+`refresh()` for the days they touch, or run `rebuild()` (the rebuild_vet_stats
+command) afterwards. Archived consultas (archive.py) keep counting: the archive
+moves rows without signals, and recounts read ConsultaArchivada too.
+"""
+
+from collections import Counter
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, Min, Q, Sum
+
+from .models import Consulta, ConsultaArchivada, VetDailyStats
+
+COUNTERS = ("booked", "attended", "no_show", "pending")
+
+_BUCKETS = {True: "attended", False: "no_show", None: "pending"}
+
+# The Consulta attributes a contribution depends on
+TRACKED = ("veterinario_id", "fecha", "asistio", "cancelada")
+
+
+def snapshot(consulta):
+    """The TRACKED values of `consulta` that are loaded; deferred ones are not fetched."""
+    return {name: consulta.__dict__[name] for name in TRACKED if name in consulta.__dict__}
+
+
+def complete(consulta, previous):
+    """`previous` with the TRACKED values deferred when `consulta` was loaded read from the database."""
+    missing = [name for name in TRACKED if name not in previous]
+    if not missing or consulta._state.adding:
+        return previous
+    stored = Consulta.objects.filter(pk=consulta.pk).values(*missing).first()
+    return previous if stored is None else {**previous, **stored}
+
+
+def contribution(values):
+    """(veterinario id, fecha, bucket) counted for TRACKED `values`, or None."""
+    if len(values) < len(TRACKED) or values["cancelada"] or values["veterinario_id"] is None or values["fecha"] is None:
+        return None
+    return values["veterinario_id"], values["fecha"], _BUCKETS[values["asistio"]]
+
+
+def saved(consulta, previous, created, update_fields=None):
+    """Count the save of `consulta`, whose TRACKED values were `previous` when loaded."""
+    current = snapshot(consulta)
+    if update_fields is not None:
+        # Only these columns were written; the others keep their loaded values
+        written = {Consulta._meta.get_field(name).attname for name in update_fields}
+        current = {**previous, **{name: value for name, value in current.items() if name in written}}
+    apply(None if created else contribution(previous), contribution(current))
+    return current
+
+
+def deleted(previous):
+    """Uncount a deleted consulta whose TRACKED values were `previous`."""
+    apply(contribution(previous), None)
+
+
+def apply(previous, current):
+    """Move one consulta's count from the `previous` contribution to the `current` one."""
+    if previous == current:
+        return
+
+    deltas = {}
+    for sign, counted in ((-1, previous), (1, current)):
+        if counted is None:
+            continue
+        vet_id, fecha, bucket = counted
+        row = deltas.setdefault((vet_id, fecha), Counter())
+        row["booked"] += sign
+        row[bucket] += sign
+    for (vet_id, fecha), row in deltas.items():
+        _add(vet_id, fecha, {name: delta for name, delta in row.items() if delta})
+
+
+def _add(vet_id, fecha, deltas):
+    if not deltas:
+        return
+    rows = VetDailyStats.objects.filter(veterinario_id=vet_id, fecha=fecha)
+    if rows.update(**{name: F(name) + delta for name, delta in deltas.items()}):
+        return
+    try:
+        with transaction.atomic():
+            VetDailyStats.objects.create(veterinario_id=vet_id, fecha=fecha, **deltas)
+    except IntegrityError:
+        # Created concurrently since the update above
+        rows.update(**{name: F(name) + delta for name, delta in deltas.items()})
+
+
+def _counts(consultas):
+    return consultas.filter(cancelada=False).values("veterinario_id", "fecha").annotate(
+        booked=Count("pk"),
+        attended=Count("pk", filter=Q(asistio=True)),
+        no_show=Count("pk", filter=Q(asistio=False)),
+        pending=Count("pk", filter=Q(asistio__isnull=True)),
+    ).order_by()
+
+
+def _recount(**lookups):
+    """VetDailyStats rows for the consultas matching `lookups`, hot and archived."""
+    rows = {}
+    for model in (Consulta, ConsultaArchivada):
+        for row in _counts(model.objects.filter(**lookups)):
+            counts = rows.setdefault((row["veterinario_id"], row["fecha"]), Counter())
+            counts.update({name: row[name] for name in COUNTERS})
+    return [VetDailyStats(veterinario_id=vet_id, fecha=fecha, **counts) for (vet_id, fecha), counts in rows.items()]
+
+
+def refresh(vet_id, fecha):
+    """Recount the row of `vet_id` on `fecha` from Consulta and its archive."""
+    with transaction.atomic():
+        VetDailyStats.objects.filter(veterinario_id=vet_id, fecha=fecha).delete()
+        VetDailyStats.objects.bulk_create(_recount(veterinario_id=vet_id, fecha=fecha))
+
+
+def rebuild(batch_days=31, start=None, end=None):
+    """Recompute every row from Consulta and its archive, `batch_days` days per transaction; returns rows written.
+
+    Without `start`/`end` the whole history is rebuilt and rows outside it removed.
+    Consultas written while a batch runs may be counted twice or missed; run it
+    again, or when the clinic is closed, for exact numbers.
+    """
+    if start is None or end is None:
+        found = [model.objects.aggregate(first=Min("fecha"), last=Max("fecha")) for model in (Consulta, ConsultaArchivada)]
+        first = min((bounds["first"] for bounds in found if bounds["first"] is not None), default=None)
+        last = max((bounds["last"] for bounds in found if bounds["last"] is not None), default=None)
+        if first is None:
+            if start is None and end is None:
+                VetDailyStats.objects.all().delete()
+            return 0
+        if start is None and end is None:
+            VetDailyStats.objects.exclude(fecha__range=(first, last)).delete()
+        start, end = start or first, end or last
+
+    written = 0
+    day = start
+    while day <= end:
+        last = min(end, day + timedelta(days=batch_days - 1))
+        with transaction.atomic():
+            VetDailyStats.objects.filter(fecha__range=(day, last)).delete()
+            rows = _recount(fecha__range=(day, last))
+            VetDailyStats.objects.bulk_create(rows, batch_size=1000)
+        written += len(rows)
+        day = last + timedelta(days=1)
+    return written
+
+
+def totals(rows):
+    """{counter: sum} over the VetDailyStats `rows`."""
+    found = rows.aggregate(**{name: Sum(name) for name in COUNTERS})
+    return {name: found[name] or 0 for name in COUNTERS}
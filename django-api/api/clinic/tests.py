@@ -0,0 +1,1173 @@
+import csv
+import io
+import json
+import tempfile
+import threading
+from importlib import import_module
+from datetime import date, time, timedelta
+from unittest import mock
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management import CommandError, call_command
+from django.db import connection, connections
+from django.test.utils import CaptureQueriesContext
+from django.core.exceptions import ImproperlyConfigured
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.test import APIClient, APITestCase, APITransactionTestCase
+
+from api.user.models import User
+from api.authentication.cache import token_cache
+from api.authentication.models import ActiveSession
+from api.authentication.serializers.login import _generate_jwt_token
+from api.clinic.models import Consulta, ConsultaArchivada, Dueno, Mascota, Recepcionista, VetDailyStats, Veterinario
+from api.clinic import archive, imports, search, stats
+from api.clinic.cache import availability_cache
+from api.clinic.projection import projection_for
+from api.clinic.availability import availability_for_date, availability_for_range, parse_work_days
+
+
+class ClinicFixturesMixin:
+    """Users for every role plus a small clinic: 2 vets, 2 dueños, 3 mascotas, 6 consultas."""
+
+    def setUp(self):
+        token_cache.clear()
+        availability_cache.clear()
+        # Lists answer with pages; the array compat mode is covered by KeysetPaginationTest
+        paginated = override_settings(API_PAGINATION={**settings.API_PAGINATION, "COMPAT": False})
+        paginated.enable()
+        self.addCleanup(paginated.disable)
+
+        self.admin = User.objects.create_superuser(email="admin@clinic.test", password="pass")
+        recep_user = User.objects.create_user(email="recep@clinic.test", password="pass")
+        vet_user = User.objects.create_user(email="vet@clinic.test", password="pass")
+        self.plain = User.objects.create_user(email="plain@clinic.test", password="pass")
+
+        self.recepcionista = Recepcionista.objects.create(user=recep_user, nombre="Recep")
+        self.vet = Veterinario.objects.create(user=vet_user, nombre="Vet Uno", work_start=time(9), work_end=time(13))
+        self.other_vet = Veterinario.objects.create(nombre="Vet Dos", work_start=time(9), work_end=time(13))
+
+        self.dueno = Dueno.objects.create(nombre="Ana", telefono="123")
+        other_dueno = Dueno.objects.create(nombre="Luis")
+        self.mascota = Mascota.objects.create(nombre="Firulais", especie="perro", dueno=self.dueno)
+        Mascota.objects.create(nombre="Michi", especie="gato", dueno=self.dueno)
+        Mascota.objects.create(nombre="Rex", especie="perro", dueno=other_dueno)
+
+        today = date.today()
+        for offset, hora, asistio in ((-2, 9, True), (-1, 10, False), (0, 11, None), (1, 9, None), (2, 10, None), (3, 12, None)):
+            Consulta.objects.create(
+                motivo="control",
+                fecha=today + timedelta(days=offset),
+                hora=time(hora),
+                asistio=asistio,
+                veterinario=self.vet if offset % 2 == 0 else self.other_vet,
+                mascota=self.mascota,
+                registrada_por=self.recepcionista,
+            )
+
+        self.tokens = {}
+        for role, user in (
+            ("admin", self.admin),
+            ("recepcionista", recep_user),
+            ("veterinario", vet_user),
+            ("plain", self.plain),
+        ):
+            self.tokens[role] = ActiveSession.objects.create(user=user, token=_generate_jwt_token(user)).token
+
+    def login_as(self, role):
+        if role is None:
+            self.client.credentials()
+        else:
+            self.client.credentials(HTTP_AUTHORIZATION=self.tokens[role])
+
+
+class PrincipalQueryCountTest(ClinicFixturesMixin, APITestCase):
+    """Query budget per endpoint, including the single authentication query."""
+
+    def endpoints(self):
+        mascota = self.mascota.pk
+        vet = self.vet.pk
+        dueno = self.dueno.pk
+        # Role checks add nothing on top of the authentication query; consulta lists
+        # are covered row-count independently by ConsultaListQueryBudgetTest
+        return [
+            # (role, method, url, data, expected status, expected queries)
+            (None, "get", reverse("clinic:dueno-list"), None, 200, 2),
+            ("recepcionista", "post", reverse("clinic:dueno-list"), {"nombre": "Nuevo"}, 201, 2),
+            ("recepcionista", "get", reverse("clinic:dueno-me-summary"), None, 200, 1),
+            ("veterinario", "get", reverse("clinic:dueno-me-summary"), None, 200, 1),
+            ("admin", "get", reverse("clinic:dueno-me-summary"), None, 200, 1),
+            ("recepcionista", "get", reverse("clinic:dueno-me-past-citas") + f"?dueno_id={dueno}", None, 200, 3),
+            ("recepcionista", "get", reverse("clinic:dueno-me-future-citas") + f"?dueno_id={dueno}", None, 200, 3),
+            ("recepcionista", "get", reverse("clinic:recepcionista-me"), None, 200, 1),
+            ("recepcionista", "get", reverse("clinic:recepcionista-me-summary"), None, 200, 4),
+            ("veterinario", "get", reverse("clinic:veterinario-me"), None, 200, 1),
+            ("veterinario", "get", reverse("clinic:veterinario-me-summary"), None, 200, 5),
+            (None, "get", reverse("clinic:veterinario-with-availability"), None, 200, 2),
+            ("veterinario", "get", reverse("clinic:veterinario-consultas", args=[vet]), None, 200, 4),
+            ("recepcionista", "get", reverse("clinic:mascota-list"), None, 200, 3),
+            ("recepcionista", "post", reverse("clinic:mascota-list"), {"nombre": "Tom", "especie": "gato", "dueno": dueno}, 201, 4),
+            ("recepcionista", "get", reverse("clinic:mascota-user"), None, 200, 3),
+            ("recepcionista", "get", reverse("clinic:mascota-with-dueno"), None, 200, 3),
+            ("veterinario", "get", reverse("clinic:mascota-consultas", args=[mascota]), None, 200, 6),
+            ("veterinario", "get", reverse("clinic:mascota-consultas-asistidas", args=[mascota]), None, 200, 6),
+            ("plain", "get", reverse("clinic:mascota-consultas", args=[mascota]), None, 403, 2),
+            (None, "get", reverse("clinic:consulta-list"), None, 200, 2),
+            ("veterinario", "get", reverse("clinic:consulta-list") + f"?mascota_id={mascota}", None, 200, 4),
+            ("recepcionista", "get", reverse("clinic:consulta-user-recent") + f"?dueno_id={dueno}", None, 200, 3),
+            ("recepcionista", "get", reverse("clinic:profile-detail", args=["me"]), None, 200, 1),
+            ("veterinario", "get", reverse("clinic:profile-detail", args=["me"]), None, 200, 1),
+            ("admin", "get", reverse("clinic:profile-detail", args=["me"]), None, 200, 1),
+            ("recepcionista", "get", reverse("api:current-user"), None, 200, 1),
+            ("veterinario", "get", reverse("api:current-user"), None, 200, 1),
+        ]
+
+    def test_query_budget_per_endpoint(self):
+        for role, method, url, data, expected_status, expected_queries in self.endpoints():
+            with self.subTest(role=role, method=method, url=url):
+                self.login_as(role)
+                token_cache.clear()
+                with CaptureQueriesContext(connection) as ctx:
+                    response = getattr(self.client, method)(url, data=data)
+                self.assertEqual(response.status_code, expected_status)
+                self.assertEqual(len(ctx.captured_queries), expected_queries, [q["sql"] for q in ctx.captured_queries])
+
+    def test_principal_is_resolved_with_the_session(self):
+        # Role probes in the view must not cost anything beyond the auth query
+        for role in ("recepcionista", "veterinario", "admin"):
+            with self.subTest(role=role):
+                self.login_as(role)
+                token_cache.clear()
+                with self.assertNumQueries(1):
+                    response = self.client.get(reverse("clinic:profile-detail", args=["me"]))
+                self.assertEqual(response.status_code, 200)
+
+
+class ConsultaListQueryBudgetTest(ClinicFixturesMixin, APITestCase):
+    """Every consulta listing costs a constant number of queries, whatever the row count."""
+
+    def endpoints(self):
+        mascota = self.mascota.pk
+        dueno = self.dueno.pk
+        return [
+            # (role, url, queries)
+            # lists include the conditional GET validators query
+            (None, reverse("clinic:consulta-list"), 2),
+            ("veterinario", reverse("clinic:consulta-list") + f"?mascota_id={mascota}", 4),
+            ("recepcionista", reverse("clinic:consulta-user-recent") + f"?dueno_id={dueno}", 3),
+            ("veterinario", reverse("clinic:veterinario-consultas", args=[self.vet.pk]), 4),
+            # whole histories also read the archive (validators and rows)
+            ("veterinario", reverse("clinic:mascota-consultas", args=[mascota]), 6),
+            ("veterinario", reverse("clinic:mascota-consultas", args=[mascota]) + f"?start_date={date.today()}", 4),
+            ("veterinario", reverse("clinic:mascota-consultas-asistidas", args=[mascota]), 6),
+            ("recepcionista", reverse("clinic:dueno-me-past-citas") + f"?dueno_id={dueno}", 3),
+            ("recepcionista", reverse("clinic:dueno-me-future-citas") + f"?dueno_id={dueno}", 3),
+            ("recepcionista", reverse("clinic:recepcionista-me-summary"), 4),
+            ("veterinario", reverse("clinic:veterinario-me-summary"), 5),
+        ]
+
+    def add_consultas(self, count):
+        # Distinct dueños, mascotas and registering recepcionistas so that any
+        # per-row relation access would show up as extra queries
+        today = date.today()
+        for i in range(count):
+            dueno = Dueno.objects.create(nombre=f"Dueño {i}")
+            mascota = Mascota.objects.create(nombre=f"Mascota {i}", especie="perro", dueno=dueno)
+            for fecha, hora in ((today - timedelta(days=i + 5), time(9)), (today + timedelta(days=i + 5), time(10))):
+                for owned_mascota in (mascota, self.mascota):
+                    Consulta.objects.create(
+                        motivo="control", fecha=fecha, hora=hora if owned_mascota is mascota else time(11),
+                        asistio=True, veterinario=self.vet, mascota=owned_mascota, registrada_por=self.recepcionista,
+                    )
+
+    def assert_budgets(self):
+        for role, url, budget in self.endpoints():
+            with self.subTest(role=role, url=url):
+                self.login_as(role)
+                token_cache.clear()
+                with CaptureQueriesContext(connection) as ctx:
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertLessEqual(len(ctx.captured_queries), budget, [q["sql"] for q in ctx.captured_queries])
+
+    def test_budget_does_not_grow_with_rows(self):
+        self.assert_budgets()
+        self.add_consultas(12)
+        self.assert_budgets()
+
+
+class IndexUsageTest(ClinicFixturesMixin, APITestCase):
+    """The hot Consulta queries read the composite indexes in the order they return.
+
+    The fixtures are tiny, so on PostgreSQL sequential scans are disabled to see
+    which index the planner would use; benchmarks/indexes.py checks the same plans
+    on a large table.
+    """
+
+    def assertUsesIndex(self, queryset, index):
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+        plan = queryset.explain()
+        self.assertIn(index, plan)
+        if connection.vendor == "sqlite":
+            self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_veterinario_agenda(self):
+        today = date.today()
+        consultas = Consulta.objects.filter(veterinario=self.vet)
+        self.assertUsesIndex(consultas.order_by("fecha", "hora", "idConsulta"), "consulta_vet_fecha_idx")
+        self.assertUsesIndex(consultas.filter(fecha=today).order_by("hora"), "consulta_vet_fecha_idx")
+        self.assertUsesIndex(consultas.filter(fecha__gte=today, asistio=False), "consulta_vet_fecha_idx")
+
+    def test_mascota_history(self):
+        consultas = Consulta.objects.filter(mascota=self.mascota).order_by("-fecha", "-hora", "-idConsulta")
+        self.assertUsesIndex(consultas, "consulta_mascota_fecha_idx")
+        self.assertUsesIndex(consultas.filter(asistio=True), "consulta_mascota_fecha_idx")
+
+    def test_date_range(self):
+        today = date.today()
+        consultas = Consulta.objects.order_by("fecha", "hora", "idConsulta")
+        self.assertUsesIndex(consultas.filter(fecha__range=(today, today + timedelta(days=7))), "consulta_fecha_hora_idx")
+        self.assertUsesIndex(consultas.reverse()[:5], "consulta_fecha_hora_idx")
+
+    def test_dueno_timeline(self):
+        consultas = Consulta.objects.filter(dueno=self.dueno)
+        self.assertUsesIndex(consultas.order_by("fecha", "hora", "idConsulta"), "consulta_dueno_fecha_idx")
+        self.assertUsesIndex(consultas.order_by("-fecha", "-hora", "-idConsulta")[:5], "consulta_dueno_fecha_idx")
+
+
+class ConsultaDuenoTest(ClinicFixturesMixin, APITestCase):
+    """Consulta.dueno follows the mascota's owner."""
+
+    def test_set_on_create_and_when_the_mascota_changes(self):
+        self.login_as("recepcionista")
+        response = self.client.post(reverse("clinic:consulta-list"), {
+            "motivo": "turno", "fecha": date.today().isoformat(), "hora": "12:00",
+            "veterinario": self.vet.pk, "mascota_id": self.mascota.pk,
+        })
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Consulta.objects.get(pk=response.json()["idConsulta"]).dueno_id, self.dueno.pk)
+
+        other = Mascota.objects.get(nombre="Rex")
+        consulta = Consulta.objects.get(pk=response.json()["idConsulta"])
+        consulta.mascota_id = other.pk
+        consulta.save(update_fields=["mascota"])
+        self.assertEqual(Consulta.objects.get(pk=consulta.pk).dueno_id, other.dueno_id)
+
+    def test_follows_the_mascota_to_its_new_owner(self):
+        nuevo = Dueno.objects.create(nombre="Nuevo")
+        self.mascota.dueno = nuevo
+        self.mascota.save()
+        self.assertFalse(Consulta.objects.filter(mascota=self.mascota).exclude(dueno=nuevo).exists())
+
+        self.login_as("recepcionista")
+        results = self.client.get(reverse("clinic:dueno-me-future-citas"), {"dueno_id": nuevo.pk}).json()["results"]
+        self.assertTrue(results)
+        self.assertEqual({item["mascota"]["idMascota"] for item in results}, {self.mascota.pk})
+        response = self.client.get(reverse("clinic:dueno-me-future-citas"), {"dueno_id": self.dueno.pk})
+        self.assertEqual(response.json()["results"], [])
+
+    def test_backfill(self):
+        migration = import_module("api.clinic.migrations.0006_consulta_dueno")
+        Consulta.objects.update(dueno=None)
+        migration.backfill_consulta_dueno(apps, None)
+        self.assertFalse(Consulta.objects.exclude(dueno=self.dueno).exists())
+
+
+class AvailabilityTest(ClinicFixturesMixin, APITestCase):
+    url = reverse("clinic:veterinario-with-availability")
+
+    def slots_for(self, vet, fecha, **params):
+        response = self.client.get(self.url, {"fecha": fecha.isoformat(), **params})
+        self.assertEqual(response.status_code, 200)
+        return {item["idVeterinario"]: item["available_slots"] for item in response.json()}[vet.pk]
+
+    def test_parse_work_days(self):
+        self.assertIsNone(parse_work_days(None))
+        self.assertIsNone(parse_work_days("  "))
+        self.assertEqual(parse_work_days("Mon,Tue"), {0, 1})
+        self.assertEqual(parse_work_days("lun, mié ,dom"), {0, 2, 6})
+        self.assertEqual(parse_work_days("1,5,7"), {0, 4, 6})
+        self.assertEqual(parse_work_days("0"), {6})
+
+    def test_booked_slots_are_removed(self):
+        today = date.today()
+        # the fixture books the vet at 11:00 today
+        self.assertEqual(self.slots_for(self.vet, today), ["09:00", "10:00", "12:00"])
+
+    def test_work_days_are_honoured(self):
+        today = date.today()
+        self.vet.work_days = str(((today.weekday() + 1) % 7) + 1)  # only tomorrow
+        self.vet.save()
+        self.assertEqual(self.slots_for(self.vet, today), [])
+        self.assertEqual(len(self.slots_for(self.vet, today + timedelta(days=1))), 4)
+
+    def test_configurable_slot_length(self):
+        fecha = date.today() + timedelta(days=10)
+        Consulta.objects.create(motivo="x", fecha=fecha, hora=time(9, 40), veterinario=self.vet, mascota=self.mascota)
+
+        slots = self.slots_for(self.vet, fecha, slot_minutes=30)
+        self.assertEqual(slots[:3], ["09:00", "10:00", "10:30"])
+        self.assertEqual(len(slots), 7)
+
+        response = self.client.get(self.url, {"slot_minutes": 1})
+        self.assertEqual(response.status_code, 400)
+
+    def test_single_query_for_every_vet(self):
+        for i in range(10):
+            Veterinario.objects.create(nombre=f"Extra {i}")
+        vets = list(Veterinario.objects.all())
+        with self.assertNumQueries(1):
+            free = availability_for_date(vets, date.today())
+        self.assertEqual(len(free), len(vets))
+
+
+class AvailabilityRangeTest(ClinicFixturesMixin, APITestCase):
+    url = reverse("clinic:veterinario-availability-range")
+
+    def test_free_slots_per_vet_per_day(self):
+        today = date.today()
+        response = self.client.get(self.url, {
+            "start": (today - timedelta(days=2)).isoformat(),
+            "end": (today + timedelta(days=3)).isoformat(),
+            "vets": str(self.vet.pk),
+        })
+        self.assertEqual(response.status_code, 200)
+        [item] = response.json()
+        days = item["availability"]
+        self.assertEqual(len(days), 6)
+        # the fixture books the vet at 9:00 two days ago, 11:00 today and 10:00 in two days
+        self.assertEqual(days[(today - timedelta(days=2)).isoformat()], ["10:00", "11:00", "12:00"])
+        self.assertEqual(days[today.isoformat()], ["09:00", "10:00", "12:00"])
+        self.assertEqual(days[(today + timedelta(days=1)).isoformat()], ["09:00", "10:00", "11:00", "12:00"])
+        self.assertEqual(days[(today + timedelta(days=2)).isoformat()], ["09:00", "11:00", "12:00"])
+
+    def test_matches_single_day_engine(self):
+        today = date.today()
+        self.vet.work_days = "lun,mié,vie"
+        self.vet.save()
+        vets = list(Veterinario.objects.all())
+        with self.assertNumQueries(1):
+            ranged = availability_for_range(vets, today - timedelta(days=3), today + timedelta(days=10), 30)
+        for offset in range(-3, 11):
+            fecha = today + timedelta(days=offset)
+            single = availability_for_date(vets, fecha, 30)
+            for v in vets:
+                self.assertEqual(ranged[v.pk][fecha], single[v.pk])
+
+    def test_invalid_ranges(self):
+        today = date.today()
+        self.assertEqual(self.client.get(self.url).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {"start": today.isoformat(), "end": (today - timedelta(days=1)).isoformat()}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {"start": today.isoformat(), "end": (today + timedelta(days=400)).isoformat()}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {"start": today.isoformat(), "vets": "a,b"}).status_code, 400)
+
+
+class AvailabilityCacheTest(ClinicFixturesMixin, APITestCase):
+    def free(self, fecha, vet=None):
+        vet = vet or Veterinario.objects.get(pk=self.vet.pk)
+        return availability_for_date([vet], fecha)[vet.pk]
+
+    def test_repeated_reads_hit_the_cache(self):
+        today = date.today()
+        with self.assertNumQueries(1):
+            first = self.free(today, self.vet)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.free(today, self.vet), first)
+        stats = availability_cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+
+    def test_consulta_changes_invalidate_their_day(self):
+        today = date.today()
+        tomorrow = today + timedelta(days=1)
+        availability_for_range([self.vet], today, tomorrow)
+
+        consulta = Consulta.objects.create(motivo="x", fecha=tomorrow, hora=time(12), veterinario=self.vet, mascota=self.mascota)
+        self.assertEqual(self.free(tomorrow), ["09:00", "10:00", "11:00"])
+        # today's entry was untouched
+        with self.assertNumQueries(0):
+            availability_for_date([self.vet], today)
+
+        # moving the consulta frees its old day
+        consulta.fecha = today
+        consulta.hora = time(9)
+        consulta.save()
+        self.assertEqual(self.free(tomorrow), ["09:00", "10:00", "11:00", "12:00"])
+        self.assertEqual(self.free(today), ["10:00", "12:00"])
+
+        Consulta.objects.get(pk=consulta.pk).delete()
+        self.assertEqual(self.free(today), ["09:00", "10:00", "12:00"])
+
+    def test_dates_assigned_as_strings_invalidate_their_day(self):
+        tomorrow = date.today() + timedelta(days=1)
+        self.free(tomorrow)
+
+        Consulta.objects.create(motivo="x", fecha=tomorrow.isoformat(), hora=time(12), veterinario=self.vet, mascota=self.mascota)
+        self.assertEqual(self.free(tomorrow), ["09:00", "10:00", "11:00"])
+
+    def test_working_hours_edits_invalidate_the_vet(self):
+        today = date.today()
+        self.free(today)
+
+        self.vet.nombre = "Renamed"
+        self.vet.save()
+        with self.assertNumQueries(1):  # the vet itself
+            self.free(today)
+
+        self.vet.work_end = time(11)
+        self.vet.save()
+        self.assertEqual(self.free(today), ["09:00", "10:00"])
+
+    def test_hit_rate_is_exposed_in_metrics(self):
+        self.free(date.today())
+        self.free(date.today())
+        self.login_as("admin")
+        response = self.client.get(reverse("api:metrics"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["availability_cache"]["hit_rate"], 0.5)
+
+
+class BookingTest(ClinicFixturesMixin, APITestCase):
+    url = reverse("clinic:consulta-list")
+
+    def book(self, fecha, hora, **extra):
+        return self.client.post(self.url, {
+            "motivo": "turno", "fecha": fecha.isoformat(), "hora": hora,
+            "veterinario": self.vet.pk, "mascota_id": self.mascota.pk, **extra,
+        })
+
+    def test_taken_slot_returns_conflict_with_alternatives(self):
+        today = date.today()
+        # the fixture books the vet at 11:00 today
+        response = self.book(today, "11:00")
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()["alternatives"], [
+            {"fecha": today.isoformat(), "hora": "10:00"},
+            {"fecha": today.isoformat(), "hora": "12:00"},
+            {"fecha": today.isoformat(), "hora": "09:00"},
+        ])
+        self.assertEqual(Consulta.objects.filter(fecha=today, hora=time(11)).count(), 1)
+
+    def test_cancelled_consultas_free_their_slot(self):
+        today = date.today()
+        Consulta.objects.filter(veterinario=self.vet, fecha=today, hora=time(11)).update(cancelada=True)
+        availability_cache.clear()
+        self.assertIn("11:00", availability_for_date([self.vet], today)[self.vet.pk])
+        self.assertEqual(self.book(today, "11:00").status_code, 201)
+
+    def test_moving_into_a_taken_slot_conflicts(self):
+        today = date.today()
+        created = self.book(today, "09:00")
+        self.assertEqual(created.status_code, 201)
+
+        url = reverse("clinic:consulta-detail", args=[created.json()["idConsulta"]])
+        response = self.client.patch(url, {"hora": "11:00"})
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(self.client.patch(url, {"hora": "12:00"}).status_code, 200)
+
+
+class BookingContentionTest(APITransactionTestCase):
+    """Receptionists racing for one slot: exactly one booking wins."""
+
+    THREADS = 8
+
+    def setUp(self):
+        if connection.vendor == "sqlite" and connection.is_in_memory_db():
+            self.skipTest("in-memory SQLite locks whole tables; set DB_TEST_NAME to a file")
+
+    def test_concurrent_bookings_of_one_slot(self):
+        availability_cache.clear()
+        vet = Veterinario.objects.create(nombre="Vet", work_start=time(9), work_end=time(13))
+        mascota = Mascota.objects.create(nombre="Firulais", especie="perro", dueno=Dueno.objects.create(nombre="Ana"))
+        payload = {
+            "motivo": "turno", "fecha": date.today().isoformat(), "hora": "10:00",
+            "veterinario": vet.pk, "mascota_id": mascota.pk,
+        }
+        barrier = threading.Barrier(self.THREADS)
+        statuses = []
+
+        def receptionist():
+            try:
+                client = APIClient()
+                barrier.wait()
+                statuses.append(client.post(reverse("clinic:consulta-list"), payload).status_code)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=receptionist) for _ in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(statuses), [201] + [409] * (self.THREADS - 1))
+        self.assertEqual(Consulta.objects.filter(veterinario=vet).count(), 1)
+
+
+class ProjectedListTest(ClinicFixturesMixin, APITestCase):
+    """The projected list path renders exactly the bytes of the regular serializers."""
+
+    def setUp(self):
+        super().setUp()
+        # Rows exercising nulls and the SerializerMethodField projections
+        User.objects.filter(pk=self.vet.user_id).update(telefono="555")
+        self.recepcionista.user.telefono = "777"
+        self.recepcionista.user.save()
+        Recepcionista.objects.create(
+            user=User.objects.create_user(email="recep2@clinic.test", password="pass"), nombre="Recep Dos", telefono="888"
+        )
+        Veterinario.objects.create(
+            user=User.objects.create_user(email="vet2@clinic.test", password="pass", telefono=""), nombre="Vet Tres", work_start=None
+        )
+        Consulta.objects.create(motivo="sin mascota", fecha=date.today(), veterinario=self.other_vet, asistio=True, cancelada=True)
+
+    def endpoints(self):
+        mascota = self.mascota.pk
+        dueno = self.dueno.pk
+        return [
+            (None, reverse("clinic:dueno-list")),
+            ("recepcionista", reverse("clinic:recepcionista-list")),
+            (None, reverse("clinic:veterinario-list")),
+            ("recepcionista", reverse("clinic:mascota-list")),
+            (None, reverse("clinic:consulta-list")),
+            ("veterinario", reverse("clinic:consulta-list") + f"?mascota_id={mascota}"),
+            ("recepcionista", reverse("clinic:consulta-user-recent") + f"?dueno_id={dueno}"),
+            ("veterinario", reverse("clinic:veterinario-consultas", args=[self.vet.pk])),
+            ("veterinario", reverse("clinic:mascota-consultas", args=[mascota])),
+            ("veterinario", reverse("clinic:mascota-consultas-asistidas", args=[mascota])),
+            ("recepcionista", reverse("clinic:dueno-me-past-citas") + f"?dueno_id={dueno}"),
+            ("recepcionista", reverse("clinic:dueno-me-future-citas") + f"?dueno_id={dueno}"),
+        ]
+
+    def test_byte_identical_to_serializers(self):
+        for role, url in self.endpoints():
+            with self.subTest(role=role, url=url):
+                self.login_as(role)
+                fast = self.client.get(url)
+                with override_settings(CLINIC_FAST_LISTS=False):
+                    slow = self.client.get(url)
+                self.assertEqual(fast.status_code, 200)
+                self.assertEqual(fast.content, slow.content)
+                self.assertNotEqual(fast.json(), [])
+
+    def test_method_fields_need_a_projection(self):
+        class Unprojected(serializers.ModelSerializer):
+            extra = serializers.SerializerMethodField()
+
+            class Meta:
+                model = Dueno
+                fields = ("idDueno", "extra")
+
+        with self.assertRaises(ImproperlyConfigured):
+            projection_for(Unprojected)
+
+
+class KeysetPaginationTest(ClinicFixturesMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        # Ties on fecha and hora, and unscheduled consultas (hora NULL)
+        today = date.today()
+        for hora, vet in ((time(9), self.vet), (None, self.vet), (time(9), self.other_vet), (None, self.other_vet)):
+            Consulta.objects.create(motivo="extra", fecha=today, hora=hora, veterinario=vet, mascota=self.mascota)
+        self.login_as("veterinario")
+
+    def walk(self, url, link="next"):
+        ids, pages = [], 0
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            body = response.json()
+            page = [item["idConsulta"] for item in body["results"]]
+            ids = page + ids if link == "previous" else ids + page
+            url, pages = body[link], pages + 1
+        return ids, pages
+
+    def expected(self, descending):
+        # NULL hora ranks above every time
+        rows = Consulta.objects.filter(mascota=self.mascota).values_list("fecha", "hora", "idConsulta")
+        key = lambda row: (row[0], row[1] is None, row[1] or time(0), row[2])  # noqa: E731
+        return [row[2] for row in sorted(rows, key=key, reverse=descending)]
+
+    def test_walks_every_row_once_in_both_directions(self):
+        for name, descending in (("clinic:consulta-list", False), ("clinic:mascota-consultas", True)):
+            args = [self.mascota.pk] if name == "clinic:mascota-consultas" else []
+            url = reverse(name, args=args) + "?page_size=3"
+            for fast in (True, False):
+                with self.subTest(url=url, fast=fast), override_settings(CLINIC_FAST_LISTS=fast):
+                    ids, pages = self.walk(url)
+                    self.assertEqual(ids, self.expected(descending))
+                    self.assertEqual(pages, 4)
+
+                    # and back from the last page
+                    last = url
+                    while True:
+                        body = self.client.get(last).json()
+                        if body["next"] is None:
+                            break
+                        last = body["next"]
+                    self.assertEqual(self.walk(last, "previous")[0], ids)
+
+    def test_deep_pages_seek_instead_of_offset(self):
+        response = self.client.get(reverse("clinic:consulta-list") + "?page_size=2")
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(response.json()["next"])
+        [sql] = [q["sql"] for q in ctx.captured_queries if 'FROM "api_clinic_consulta"' in q["sql"] and "COUNT" not in q["sql"]]
+        self.assertIn("LIMIT 3", sql)
+        self.assertNotIn("OFFSET", sql)
+
+    def test_invalid_cursor(self):
+        for cursor in ("x", "eyJwIjpbMV19", "eyJwIjpbIm5vIiwxLDJdfQ=="):
+            with self.subTest(cursor=cursor):
+                response = self.client.get(reverse("clinic:consulta-list") + "?cursor=" + cursor)
+                self.assertEqual(response.status_code, 404)
+
+    def test_compat_mode_serves_arrays(self):
+        url = reverse("clinic:consulta-list")
+        with override_settings(API_PAGINATION={"COMPAT": True}):
+            self.assertEqual(len(self.client.get(url).json()), Consulta.objects.count())
+            self.assertEqual(len(self.client.get(url + "?page_size=2").json()["results"]), 2)
+        with override_settings(API_PAGINATION={"COMPAT": False}):
+            self.assertEqual(len(self.client.get(url).json()["results"]), Consulta.objects.count())
+
+
+class ExportTest(ClinicFixturesMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.login_as("recepcionista")
+
+    def export(self, name, params=None, **extra):
+        response = self.client.get(reverse("clinic:export-" + name), params, **extra)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, b"".join(response.streaming_content).decode("utf-8")
+
+    def test_csv(self):
+        response, body = self.export("consultas", HTTP_ACCEPT="text/csv")
+        self.assertEqual(response["Content-Type"], "text/csv; charset=utf-8")
+        self.assertIn('filename="consultas.csv"', response["Content-Disposition"])
+        rows = list(csv.reader(io.StringIO(body)))
+        self.assertEqual(rows[0][:4], ["idConsulta", "fecha", "hora", "motivo"])
+        first = Consulta.objects.order_by("fecha", "hora").first()
+        self.assertEqual(rows[1][:3], [str(first.pk), first.fecha.isoformat(), "09:00:00"])
+        self.assertEqual(len(rows), 1 + Consulta.objects.count())
+
+    def test_ndjson_filters(self):
+        today = date.today()
+        params = {"output": "ndjson", "start_date": today.isoformat(), "vets": str(self.vet.pk)}
+        _, body = self.export("consultas", params)
+        rows = [json.loads(line) for line in body.splitlines()]
+        expected = Consulta.objects.filter(fecha__gte=today, veterinario=self.vet).order_by("fecha")
+        self.assertEqual([row["idConsulta"] for row in rows], [c.pk for c in expected])
+        self.assertEqual(rows[0]["dueno"], "Ana")
+        self.assertIsNone(rows[0]["asistio"])
+
+        _, body = self.export("mascotas", params)
+        self.assertEqual([json.loads(line)["idMascota"] for line in body.splitlines()], [self.mascota.pk])
+        _, body = self.export("duenos", {"output": "csv", "vets": str(self.other_vet.pk)})
+        self.assertEqual(body.splitlines(), ["idDueno,nombre,telefono", f"{self.dueno.pk},Ana,123"])
+
+    def test_one_query_whatever_the_size(self):
+        with override_settings(CLINIC_EXPORT_CHUNK_SIZE=2):
+            response = self.client.get(reverse("clinic:export-consultas"))
+            with self.assertNumQueries(1):
+                lines = b"".join(response.streaming_content).splitlines()
+        self.assertEqual(len(lines), 1 + Consulta.objects.count())
+
+    def test_staff_only_and_validated(self):
+        self.login_as("plain")
+        self.assertEqual(self.client.get(reverse("clinic:export-consultas")).status_code, 403)
+        self.login_as("recepcionista")
+        self.assertEqual(self.client.get(reverse("clinic:export-consultas"), {"output": "xml"}).status_code, 400)
+        self.assertEqual(self.client.get(reverse("clinic:export-duenos"), {"end_date": "junio"}).status_code, 400)
+
+
+class SparseFieldsetTest(ClinicFixturesMixin, APITestCase):
+    AGENDA = "hora,veterinario,mascota.nombre"
+
+    def setUp(self):
+        super().setUp()
+        Consulta.objects.update(descripcion="d" * 500, sintomas="s" * 500, tratamiento="t" * 500)
+        self.login_as("veterinario")
+
+    def get(self, url, **params):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, params)
+        [sql] = [q["sql"] for q in ctx.captured_queries if 'FROM "api_clinic_consulta"' in q["sql"] and "COUNT" not in q["sql"]] or [""]
+        return response, sql
+
+    def test_fields_are_trimmed_and_never_selected(self):
+        url = reverse("clinic:consulta-list")
+        full, _ = self.get(url)
+        for fast in (True, False):
+            with self.subTest(fast=fast), override_settings(CLINIC_FAST_LISTS=fast):
+                sparse, sql = self.get(url, fields=self.AGENDA)
+                items = sparse.json()["results"]
+                self.assertEqual(items[0], {"hora": "09:00:00", "veterinario": self.vet.pk, "mascota": {"nombre": "Firulais"}})
+                for column in ("descripcion", "sintomas", "tratamiento", "api_clinic_dueno"):
+                    self.assertNotIn(column, sql)
+                # payload of the agenda view against the full rows
+                self.assertLess(len(sparse.content) * 10, len(full.content))
+        with override_settings(CLINIC_FAST_LISTS=False):
+            slow, _ = self.get(url, fields=self.AGENDA)
+        self.assertEqual(slow.content, sparse.content)
+
+    def test_exclude_and_nested_paths(self):
+        response, sql = self.get(reverse("clinic:mascota-consultas", args=[self.mascota.pk]), exclude="descripcion,sintomas,tratamiento,mascota.dueno_nombre")
+        item = response.json()["results"][0]
+        self.assertNotIn("descripcion", item)
+        self.assertEqual(set(item["mascota"]), {"idMascota", "nombre", "especie", "raza", "edad", "dueno"})
+        self.assertNotIn("sintomas", sql)
+
+    def test_retrieve(self):
+        consulta = Consulta.objects.first()
+        url = reverse("clinic:consulta-detail", args=[consulta.pk])
+        response, sql = self.get(url, fields="idConsulta,motivo")
+        self.assertEqual(response.json(), {"idConsulta": consulta.pk, "motivo": "control"})
+        self.assertNotIn("descripcion", sql)
+        self.assertNotIn("api_clinic_mascota", sql)
+
+        # writes always go through the whole serializer
+        response = self.client.patch(url + "?fields=motivo", {"motivo": "vacuna"})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("descripcion", response.json())
+
+    def test_invalid(self):
+        url = reverse("clinic:consulta-list")
+        for params in ({"fields": "hora,nope"}, {"fields": "hora.x"}, {"exclude": "mascota.nope"}, {"fields": "hora", "exclude": "motivo"}):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get(url, params).status_code, 400)
+
+
+class ConditionalGetTest(ClinicFixturesMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.login_as("recepcionista")
+
+    def revalidate(self, url, response, **params):
+        """Status of a conditional GET of `url` with the validators of `response`."""
+        return self.client.get(url, params, HTTP_IF_NONE_MATCH=response["ETag"]).status_code
+
+    def test_not_modified_without_fetching_rows(self):
+        url = reverse("clinic:consulta-list")
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("Last-Modified", response)
+        token_cache.clear()
+        with CaptureQueriesContext(connection) as ctx:
+            again = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again.content, b"")
+        self.assertEqual(again["ETag"], response["ETag"])
+        self.assertIn("no-cache", response["Cache-Control"])
+        # authentication and the validators aggregate only
+        self.assertEqual(len(ctx.captured_queries), 2)
+
+        since = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"])
+        self.assertEqual(since.status_code, 304)
+
+    def test_changes_to_listed_and_related_rows(self):
+        url = reverse("clinic:consulta-list")
+        changes = (
+            lambda: Consulta.objects.filter(pk=Consulta.objects.first().pk).first().save(),
+            lambda: self.mascota.save(),
+            lambda: self.dueno.save(),
+            lambda: Consulta.objects.last().delete(),
+        )
+        for change in changes:
+            response = self.client.get(url)
+            change()
+            with self.subTest(change=change):
+                self.assertEqual(self.revalidate(url, response), 200)
+
+    def test_vet_list_follows_user_telefono(self):
+        url = reverse("clinic:veterinario-list")
+        response = self.client.get(url)
+        self.assertEqual(self.revalidate(url, response), 304)
+        self.vet.user.telefono = "999"
+        self.vet.user.save()
+        self.assertEqual(self.revalidate(url, response), 200)
+
+    def test_pages_fieldsets_and_details(self):
+        url = reverse("clinic:consulta-list")
+        first = self.client.get(url, {"page_size": 2})
+        self.assertEqual(self.revalidate(url, first, page_size=2), 304)
+        self.assertEqual(self.revalidate(url, first, page_size=3), 200)
+        self.assertEqual(self.revalidate(url, first, page_size=2, fields="hora"), 200)
+
+        # a change outside the page leaves it valid
+        Consulta.objects.order_by("fecha").last().save()
+        self.assertEqual(self.revalidate(url, first, page_size=2), 304)
+
+        detail = reverse("clinic:consulta-detail", args=[Consulta.objects.first().pk])
+        response = self.client.get(detail)
+        self.assertEqual(self.revalidate(detail, response), 304)
+        missing = reverse("clinic:consulta-detail", args=[0])
+        self.assertEqual(self.client.get(missing, HTTP_IF_NONE_MATCH="*").status_code, 404)
+
+    def test_untracked_serializers_have_no_validators(self):
+        # RecepcionistaSerializer reads the user's telefono, which has no updated_at
+        response = self.client.get(reverse("clinic:recepcionista-list"))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("ETag", response)
+
+
+class VetDailyStatsTest(ClinicFixturesMixin, APITestCase):
+    def rows(self):
+        return {
+            (row.veterinario_id, row.fecha): tuple(getattr(row, name) for name in stats.COUNTERS)
+            for row in VetDailyStats.objects.exclude(booked=0)
+        }
+
+    def assertMatchesRebuild(self):
+        incremental = self.rows()
+        stats.rebuild()
+        self.assertEqual(self.rows(), incremental)
+
+    def test_fixtures_are_counted(self):
+        today = date.today()
+        rows = self.rows()
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(rows[(self.vet.pk, today - timedelta(days=2))], (1, 1, 0, 0))
+        self.assertEqual(rows[(self.other_vet.pk, today - timedelta(days=1))], (1, 0, 1, 0))
+        self.assertEqual(rows[(self.vet.pk, today)], (1, 0, 0, 1))
+        self.assertMatchesRebuild()
+
+    def test_edits_move_counts(self):
+        today = date.today()
+        consulta = Consulta.objects.get(fecha=today)
+        consulta.asistio = True
+        consulta.save()
+        self.assertEqual(self.rows()[(self.vet.pk, today)], (1, 1, 0, 0))
+
+        consulta.veterinario = self.other_vet
+        consulta.fecha = today + timedelta(days=1)
+        consulta.save()
+        rows = self.rows()
+        self.assertNotIn((self.vet.pk, today), rows)
+        self.assertEqual(rows[(self.other_vet.pk, today + timedelta(days=1))], (2, 1, 0, 1))
+        self.assertMatchesRebuild()
+
+        consulta.cancelada = True
+        consulta.save(update_fields=["cancelada"])
+        self.assertEqual(self.rows()[(self.other_vet.pk, today + timedelta(days=1))], (1, 0, 0, 1))
+        consulta.cancelada = False
+        consulta.save()
+        Consulta.objects.get(pk=consulta.pk).delete()
+        self.assertEqual(self.rows()[(self.other_vet.pk, today + timedelta(days=1))], (1, 0, 0, 1))
+        self.assertMatchesRebuild()
+
+    def test_untracked_edits_cost_nothing(self):
+        consulta = Consulta.objects.get(fecha=date.today())
+        consulta.motivo = "vacuna"
+        with self.assertNumQueries(1):
+            consulta.save(update_fields=["motivo"])
+        with CaptureQueriesContext(connection) as ctx:
+            Consulta.objects.only("motivo").get(pk=consulta.pk).save(update_fields=["motivo"])
+        self.assertFalse([q for q in ctx.captured_queries if "vetdailystats" in q["sql"]])
+
+    def test_deferred_fields_are_recounted(self):
+        today = date.today()
+        consulta = Consulta.objects.only("pk").get(fecha=today)
+        consulta.asistio = False
+        consulta.save(update_fields=["asistio"])
+        self.assertEqual(self.rows()[(self.vet.pk, today)], (1, 0, 1, 0))
+        self.assertMatchesRebuild()
+
+    def test_rebuild_after_bulk_update(self):
+        Consulta.objects.update(asistio=True)
+        self.assertNotEqual(stats.totals(VetDailyStats.objects.all())["attended"], 6)
+        out = io.StringIO()
+        call_command("rebuild_vet_stats", "--batch-days", "2", stdout=out)
+        self.assertIn("Wrote 6 daily stats rows", out.getvalue())
+        self.assertEqual(stats.totals(VetDailyStats.objects.all()), {"booked": 6, "attended": 6, "no_show": 0, "pending": 0})
+
+    def test_stats_endpoint(self):
+        url = reverse("clinic:veterinario-stats")
+        today = date.today()
+        self.login_as("recepcionista")
+        response = self.client.get(url, {"start_date": today - timedelta(days=2), "end_date": today + timedelta(days=3)})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["total"], {"booked": 6, "attended": 1, "no_show": 1, "pending": 4})
+        by_vet = {row["idVeterinario"]: row for row in response.data["veterinarios"]}
+        self.assertEqual(by_vet[self.vet.pk]["booked"], 3)
+        self.assertEqual(by_vet[self.other_vet.pk]["no_show"], 1)
+
+        response = self.client.get(url, {"end_date": today, "vets": str(self.other_vet.pk)})
+        self.assertEqual(response.data["total"]["booked"], 1)
+        response = self.client.get(url, {"start_date": today, "end_date": today - timedelta(days=1)})
+        self.assertEqual(response.status_code, 400)
+
+        self.login_as("plain")
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+
+class ConsultaSearchTest(ClinicFixturesMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        today = date.today()
+        self.tos = Consulta.objects.create(
+            motivo="Tos persistente", sintomas="tos seca y fiebre", fecha=today, hora=time(12),
+            veterinario=self.vet, mascota=self.mascota,
+        )
+        self.fiebre = Consulta.objects.create(
+            motivo="Control", descripcion="<b>fiebre</b> alta", tratamiento="antibiótico", fecha=today, hora=time(12),
+            veterinario=self.other_vet, mascota=self.mascota,
+        )
+        self.url = reverse("clinic:consulta-search")
+        self.login_as("veterinario")
+
+    def ids(self, response):
+        self.assertEqual(response.status_code, 200)
+        return [row["idConsulta"] for row in response.data["results"]]
+
+    def test_ranked_results_with_snippets(self):
+        response = self.client.get(self.url, {"q": "fiebre"})
+        self.assertEqual(set(self.ids(response)), {self.tos.pk, self.fiebre.pk})
+        if connection.vendor == "sqlite":
+            first = response.data["results"][0]
+            self.assertIsNotNone(first["rank"])
+            snippets = [row["snippet"] for row in response.data["results"]]
+            self.assertIn("&lt;b&gt;<mark>fiebre</mark>&lt;/b&gt; alta", " ".join(snippets))
+        # every word must match, accents and case aside
+        self.assertEqual(self.ids(self.client.get(self.url, {"q": "TOS Fiebre"})), [self.tos.pk])
+        self.assertEqual(self.ids(self.client.get(self.url, {"q": "antibiotico"})), [self.fiebre.pk])
+        # query syntax is not interpreted
+        self.assertEqual(self.ids(self.client.get(self.url, {"q": '"tos (fiebre*'})), [self.tos.pk])
+
+    def test_index_follows_writes(self):
+        self.tos.sintomas = "vómitos"
+        self.tos.save()
+        self.assertEqual(self.ids(self.client.get(self.url, {"q": "vomitos"})), [self.tos.pk])
+        Consulta.objects.filter(pk=self.fiebre.pk).update(tratamiento="reposo")
+        self.assertEqual(self.ids(self.client.get(self.url, {"q": "antibiotico"})), [])
+        Consulta.objects.filter(pk=self.tos.pk).delete()
+        self.assertEqual(self.ids(self.client.get(self.url, {"q": "fiebre"})), [self.fiebre.pk])
+
+    def test_pages(self):
+        first = self.client.get(self.url, {"q": "fiebre", "page_size": 1})
+        self.assertEqual(len(first.data["results"]), 1)
+        self.assertIsNone(first.data["previous"])
+        second = self.client.get(first.data["next"])
+        self.assertEqual(len(second.data["results"]), 1)
+        self.assertIsNone(second.data["next"])
+        self.assertIsNotNone(second.data["previous"])
+        self.assertNotEqual(self.ids(first), self.ids(second))
+
+    def test_validation_and_permissions(self):
+        self.assertEqual(self.client.get(self.url).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {"q": "tos", "page": "0"}).status_code, 400)
+        self.login_as("plain")
+        self.assertEqual(self.client.get(self.url, {"q": "tos"}).status_code, 403)
+
+    def test_scan_fallback(self):
+        with mock.patch.object(search, "_search_function", return_value=search._scan):
+            self.assertEqual(self.ids(self.client.get(self.url, {"q": "fiebre alta"})), [self.fiebre.pk])
+
+
+@override_settings(CLINIC_ARCHIVE={"AFTER_DAYS": 0, "BATCH_SIZE": 1})
+class ArchiveTest(ClinicFixturesMixin, APITestCase):
+    """AFTER_DAYS=0: the fixtures dated before today (2 consultas) are archived."""
+
+    def setUp(self):
+        super().setUp()
+        self.login_as("veterinario")
+        self.url = reverse("clinic:mascota-consultas", args=[self.mascota.pk])
+
+    def walk(self, url, **params):
+        ids, response = [], self.client.get(url, {"page_size": 2, **params})
+        while True:
+            self.assertEqual(response.status_code, 200)
+            ids += [row["idConsulta"] for row in response.data["results"]]
+            if not response.data["next"]:
+                return ids
+            response = self.client.get(response.data["next"])
+
+    def test_tables_have_the_same_columns(self):
+        self.assertEqual(archive.FIELDS, [field.attname for field in Consulta._meta.concrete_fields])
+
+    def test_archive_and_restore(self):
+        before = self.client.get(self.url).data
+        walked = self.walk(self.url)
+        counted = stats.totals(VetDailyStats.objects.all())
+
+        out = io.StringIO()
+        call_command("archive_consultas", stdout=out)
+        self.assertIn("Archived 2 consultas", out.getvalue())
+        self.assertEqual(Consulta.objects.count(), 4)
+        self.assertFalse(Consulta.objects.filter(fecha__lt=date.today()).exists())
+        self.assertEqual(list(ConsultaArchivada.objects.values_list("dueno_id", flat=True)), [self.dueno.pk] * 2)
+
+        # reads reaching back before the cutoff are unchanged, page after page
+        self.assertEqual(self.client.get(self.url).data, before)
+        self.assertEqual(self.walk(self.url), walked)
+        with override_settings(CLINIC_FAST_LISTS=False):
+            self.assertEqual(self.client.get(self.url).data, before)
+        asistidas = self.client.get(reverse("clinic:mascota-consultas-asistidas", args=[self.mascota.pk]))
+        self.assertEqual([row["fecha"] for row in asistidas.data["results"]], [str(date.today() - timedelta(days=2))])
+        recent = self.client.get(self.url, {"start_date": date.today()})
+        self.assertEqual(len(recent.data["results"]), 4)
+
+        # archived consultas keep counting, also after a rebuild, and leave search
+        self.assertEqual(stats.totals(VetDailyStats.objects.all()), counted)
+        stats.rebuild()
+        self.assertEqual(stats.totals(VetDailyStats.objects.all()), counted)
+        self.assertEqual(len(search.search("control", 10)), 4)
+
+        out = io.StringIO()
+        call_command("restore_consultas", "--mascota", str(self.mascota.pk), stdout=out)
+        self.assertIn("Restored 2 consultas", out.getvalue())
+        self.assertFalse(ConsultaArchivada.objects.exists())
+        self.assertEqual(self.client.get(self.url).data, before)
+        self.assertEqual(len(search.search("control", 10)), 6)
+
+    def test_merged_lists_answer_conditional_gets(self):
+        archive.archive()
+        response = self.client.get(self.url)
+        again = self.client.get(self.url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(again.status_code, 304)
+        ConsultaArchivada.objects.update(motivo="otro", updated_at=timezone.now())
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 200)
+
+    def test_archive_follows_owner_changes(self):
+        archive.archive()
+        other = Dueno.objects.create(nombre="Nuevo")
+        self.mascota.dueno = other
+        self.mascota.save()
+        self.assertEqual(set(ConsultaArchivada.objects.values_list("dueno_id", flat=True)), {other.pk})
+
+    def test_command_arguments(self):
+        with self.assertRaises(CommandError):
+            call_command("archive_consultas", "--before", str(date.today() + timedelta(days=1)))
+        with self.assertRaises(CommandError):
+            call_command("restore_consultas")
+
+
+class ImportTest(ClinicFixturesMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.login_as("recepcionista")
+
+    def post(self, name, body, content_type="text/csv", **params):
+        url = reverse("clinic:import-" + name)
+        if params:
+            url += "?" + "&".join("%s=%s" % item for item in params.items())
+        return self.client.generic("POST", url, body, content_type=content_type)
+
+    def ndjson(self, *records):
+        return "\n".join(record if isinstance(record, str) else json.dumps(record) for record in records)
+
+    def consulta(self, **values):
+        return {"fecha": str(date.today()), "hora": "08:00", "motivo": "vacuna", "idVeterinario": self.vet.pk, "idMascota": self.mascota.pk, **values}
+
+    def test_export_round_trip(self):
+        body = b"".join(self.client.get(reverse("clinic:export-consultas")).streaming_content)
+        columns = ["idConsulta", "fecha", "hora", "motivo", "asistio", "cancelada", "veterinario_id", "mascota_id", "dueno_id"]
+        exported = list(Consulta.objects.order_by("pk").values_list(*columns))
+        counted = stats.totals(VetDailyStats.objects.all())
+        Consulta.objects.all().delete()
+
+        response = self.post("consultas", b"\xef\xbb\xbf" + body)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {"created": 6, "invalid": 0, "dry_run": False, "errors": []})
+        self.assertEqual(list(Consulta.objects.order_by("pk").values_list(*columns)), exported)
+        self.assertEqual(set(Consulta.objects.values_list("registrada_por_id", flat=True)), {self.recepcionista.pk})
+        self.assertEqual(stats.totals(VetDailyStats.objects.all()), counted)
+        # the same ids again are all taken
+        self.assertEqual(self.post("consultas", body).data["invalid"], 6)
+
+    def test_errors_are_reported_by_line(self):
+        today = str(date.today())
+        body = self.ndjson(
+            self.consulta(),
+            self.consulta(idVeterinario=999),
+            self.consulta(idMascota=999, fecha="junio"),
+            self.consulta(hora="11:00"),  # fixture slot
+            self.consulta(),  # same slot as line 1
+            self.consulta(hora="11:00", cancelada="true", asistio="false"),
+            "{not json",
+            "",
+            "[1]",
+            self.consulta(idConsulta=Consulta.objects.first().pk, hora="08:30"),
+            self.consulta(motivo="", hora="08:45"),
+        )
+        response = self.post("consultas", body, content_type="application/x-ndjson")
+        self.assertEqual(response.data["created"], 2)
+        errors = {error["line"]: error["errors"] for error in response.data["errors"]}
+        self.assertEqual(sorted(errors), [2, 3, 4, 5, 7, 9, 10, 11])
+        self.assertEqual(set(errors[2]), {"idVeterinario"})
+        self.assertEqual(set(errors[3]), {"fecha"})
+        self.assertEqual(set(errors[4]), {"hora"})
+        self.assertEqual(set(errors[5]), {"hora"})
+        self.assertEqual(errors[7], {"non_field_errors": ["Invalid JSON"]})
+        self.assertEqual(set(errors[10]), {"idConsulta"})
+        self.assertEqual(set(errors[11]), {"motivo"})
+        imported = Consulta.objects.filter(fecha=today, motivo="vacuna").order_by("hora")
+        self.assertEqual([(c.hora, c.cancelada, c.asistio, c.dueno_id) for c in imported], [
+            (time(8), False, None, self.dueno.pk),
+            (time(11), True, False, self.dueno.pk),
+        ])
+        self.assertEqual(VetDailyStats.objects.get(veterinario=self.vet, fecha=today).booked, 2)
+
+    def test_duenos_and_mascotas_upload(self):
+        duenos = io.BytesIO("idDueno,nombre,telefono\n500,Marta,555\n,Sin id,\n".encode())
+        duenos.name = "duenos.csv"
+        response = self.client.post(reverse("clinic:import-duenos"), {"file": duenos}, format="multipart")
+        self.assertEqual(response.data["created"], 2)
+        marta = Dueno.objects.get(pk=500)
+        self.assertEqual((marta.telefono, marta.registrado_por_recepcionista), ("555", self.recepcionista))
+        self.assertIsNone(Dueno.objects.get(nombre="Sin id").telefono)
+
+        body = self.ndjson(
+            {"nombre": "Toby", "especie": "perro", "edad": 3, "idDueno": 500},
+            {"nombre": "Nube", "especie": "gato", "edad": -1, "idDueno": 500},
+            {"nombre": "Rocco", "idDueno": 501},
+        )
+        response = self.post("mascotas", body, content_type="application/x-ndjson")
+        self.assertEqual(response.data["created"], 1)
+        self.assertEqual([set(error["errors"]) for error in response.data["errors"]], [{"edad"}, {"especie"}])
+        self.assertEqual(list(marta.mascotas.values_list("nombre", flat=True)), ["Toby"])
+
+    def test_dry_run_staff_and_input(self):
+        body = self.ndjson(self.consulta())
+        response = self.post("consultas", body, content_type="application/x-ndjson", dry_run="1")
+        self.assertEqual((response.data["created"], response.data["dry_run"]), (1, True))
+        self.assertEqual(Consulta.objects.count(), 6)
+        self.assertEqual(self.post("consultas", body, content_type="application/x-ndjson", input="xml").status_code, 400)
+        self.assertEqual(self.client.post(reverse("clinic:import-consultas"), {}, format="multipart").status_code, 400)
+        self.assertEqual(self.post("consultas", "\xff".encode("latin-1"), input="csv").data["errors"][0]["line"], 1)
+        self.login_as("plain")
+        self.assertEqual(self.post("consultas", body, content_type="application/x-ndjson").status_code, 403)
+
+    def test_queries_per_chunk_not_per_row(self):
+        def queries(rows):
+            records = (
+                (number, self.consulta(idConsulta=1000 + number, hora="%02d:%02d" % (14 + number // 60, number % 60)))
+                for number in range(rows)
+            )
+            with CaptureQueriesContext(connection) as ctx:
+                report = imports.ConsultaImporter(chunk_size=100).run(records)
+            self.assertEqual(report["created"], rows)
+            return len(ctx.captured_queries)
+
+        few = queries(3)
+        Consulta.objects.filter(pk__gte=1000).delete()
+        # SQLite splits a bulk_create() of more than 66 consultas (999 parameters) in several INSERTs
+        self.assertEqual(queries(60), few)
+
+    def test_command(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".ndjson") as file:
+            file.write(self.ndjson(self.consulta(), self.consulta(idVeterinario=999, hora="08:30")))
+            file.flush()
+            out, err = io.StringIO(), io.StringIO()
+            call_command("import_clinic_data", "consultas", file.name, "--dry-run", stdout=out, stderr=err)
+            self.assertIn("Would import 1 rows, 1 invalid", out.getvalue())
+            self.assertIn("Line 2: idVeterinario", err.getvalue())
+            self.assertEqual(Consulta.objects.count(), 6)
+            call_command("import_clinic_data", "consultas", file.name, stdout=out, stderr=err)
+            self.assertEqual(Consulta.objects.count(), 7)
+        with self.assertRaises(CommandError):
+            call_command("import_clinic_data", "consultas", "consultas.txt")
@@ -1,16 +1,19 @@
 from rest_framework import viewsets
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.decorators import action
+from rest_framework.parsers import MultiPartParser
 from drf_spectacular.utils import extend_schema_view, extend_schema, OpenApiParameter
 from drf_spectacular.types import OpenApiTypes
-from datetime import date, datetime
-from django.db.models import Q
+from datetime import date, datetime, timedelta
+from django.db.models import Q, Sum
 from .models import (
     Dueno,
     Recepcionista,
     Mascota,
     Consulta,
+    ConsultaArchivada,
     Veterinario,
+    VetDailyStats,
 )
 from .serializers import (
     DuenoSerializer,
@@ -23,9 +26,63 @@ from .serializers import (
     VeterinarioSerializer,
     VeterinarioCreateSerializer,
     RecepcionistaCreateSerializer,
+    RecepcionistaUpdateSerializer,
+    VeterinarioUpdateSerializer,
+    UserNestedSerializer,
+    UserUpdateSerializer,
 )
 from rest_framework.response import Response
 from rest_framework import serializers
+from api.authentication.principal import get_principal, resolve_principal
+from api.user.models import User
+from .availability import availability_for_date, availability_for_range, default_slot_minutes
+from .booking import book
+from . import archive, export, imports, search, stats
+from .projection import ProjectedListMixin
+
+# Longest span accepted by VeterinarioViewSet.availability_range, in days
+MAX_AVAILABILITY_RANGE_DAYS = 62
+
+
+def _slot_minutes_param(request):
+    """Validated `?slot_minutes=` (5-480), defaulting to CLINIC_SLOT_MINUTES."""
+    value = request.query_params.get("slot_minutes")
+    if not value:
+        return default_slot_minutes()
+    try:
+        minutes = int(value)
+        if not 5 <= minutes <= 480:
+            raise ValueError
+    except ValueError:
+        from rest_framework.exceptions import ValidationError
+
+        raise ValidationError({"slot_minutes": "Expected an integer between 5 and 480"})
+    return minutes
+
+
+def _date_param(request, name, default=None):
+    value = request.query_params.get(name)
+    if not value:
+        return default
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        from rest_framework.exceptions import ValidationError
+
+        raise ValidationError({name: "Invalid date format, expected YYYY-MM-DD"})
+
+
+def _id_list_param(request, name):
+    """Comma-separated ids in `?name=1,2,3`, or None when absent."""
+    value = request.query_params.get(name)
+    if not value:
+        return None
+    try:
+        return [int(part) for part in value.split(",") if part.strip()]
+    except ValueError:
+        from rest_framework.exceptions import ValidationError
+
+        raise ValidationError({name: "Expected a comma-separated list of ids"})
 
 
 @extend_schema_view(
@@ -36,7 +93,7 @@ from rest_framework import serializers
     partial_update=extend_schema(tags=["Dueños"], summary="Actualizar parcialmente dueño"),
     destroy=extend_schema(tags=["Dueños"], summary="Eliminar dueño"),
 )
-class DuenoViewSet(viewsets.ModelViewSet):
+class DuenoViewSet(ProjectedListMixin, viewsets.ModelViewSet):
     queryset = Dueno.objects.all()
     serializer_class = DuenoSerializer
     permission_classes = (AllowAny,)
@@ -61,8 +118,8 @@ class DuenoViewSet(viewsets.ModelViewSet):
             return Response(out_serializer.data, status=201)
 
         # Authenticated: must be superuser or recepcionista to create via DuenoCreateSerializer
-        is_recepcionista = hasattr(user, "recepcionista_profile")
-        if not (user.is_superuser or is_recepcionista):
+        principal = get_principal(request)
+        if not (principal.is_superuser or principal.is_recepcionista):
             from rest_framework.exceptions import PermissionDenied
 
             raise PermissionDenied({"detail": "Only recepcionistas or superusers can create dueños."})
@@ -93,18 +150,19 @@ class DuenoViewSet(viewsets.ModelViewSet):
         # Since Dueno objects are no longer linked to User accounts, this endpoint will
         # provide a recepcionista/veterinario/admin oriented summary when applicable.
         user = request.user
+        principal = get_principal(request)
         from .serializers import RecepcionistaSerializer, VeterinarioSerializer
 
-        if hasattr(user, "recepcionista_profile") and user.recepcionista_profile is not None:
-            profile = RecepcionistaSerializer(user.recepcionista_profile, context={"request": request}).data
+        if principal.is_recepcionista:
+            profile = RecepcionistaSerializer(principal.recepcionista, context={"request": request}).data
             return Response({"role": "recepcionista", "profile": profile, "mascotas": [], "citas": []}, status=200)
 
-        if hasattr(user, "veterinario_profile") and user.veterinario_profile is not None:
-            vet = user.veterinario_profile
+        if principal.is_veterinario:
+            vet = principal.veterinario
             vet_data = VeterinarioSerializer(vet, context={"request": request}).data
             return Response({"role": "veterinario", "profile": vet_data, "mascotas": [], "citas": []}, status=200)
 
-        if user.is_superuser:
+        if principal.is_superuser:
             return Response({"role": "admin", "profile": {"id": user.id, "email": user.email}}, status=200)
 
         return Response({"role": "unknown", "profile": {}, "mascotas": [], "citas": []}, status=200)
@@ -115,28 +173,26 @@ class DuenoViewSet(viewsets.ModelViewSet):
         # Dueno is no longer a User. Accept a `dueno_id` query param to fetch past consultas for an owner.
         dueno_id = request.query_params.get("dueno_id")
         if not dueno_id:
-            return Response([], status=200)
+            return self.projected_response(Consulta.objects.none(), ConsultaSerializer)
 
         today = date.today()
         now_time = datetime.now().time()
         past_q = Q(fecha__lt=today) | (Q(fecha=today) & Q(hora__lt=now_time))
-        consultas = Consulta.objects.filter(mascota__dueno_id=dueno_id).filter(past_q).order_by("-fecha", "-hora")
-        serializer = ConsultaSerializer(consultas, many=True, context={"request": request})
-        return Response(serializer.data, status=200)
+        consultas = Consulta.objects.for_listing().filter(dueno_id=dueno_id).filter(past_q).order_by("-fecha", "-hora")
+        return self.projected_response(consultas, ConsultaSerializer)
 
     @extend_schema(tags=["Dueños"], summary="Citas futuras no atendidas del dueño autenticado")
     @action(detail=False, methods=["get"], url_path="me/future-citas", permission_classes=[IsAuthenticated])
     def me_future_citas(self, request):
         dueno_id = request.query_params.get("dueno_id")
         if not dueno_id:
-            return Response([], status=200)
+            return self.projected_response(Consulta.objects.none(), ConsultaSerializer)
 
         today = date.today()
         now_time = datetime.now().time()
         future_q = Q(fecha__gt=today) | (Q(fecha=today) & Q(hora__gte=now_time)) | Q(hora__isnull=True)
-        consultas = Consulta.objects.filter(mascota__dueno_id=dueno_id).filter(future_q).order_by("fecha", "hora")
-        serializer = ConsultaSerializer(consultas, many=True, context={"request": request})
-        return Response(serializer.data, status=200)
+        consultas = Consulta.objects.for_listing().filter(dueno_id=dueno_id).filter(future_q).order_by("fecha", "hora")
+        return self.projected_response(consultas, ConsultaSerializer)
 
 
 @extend_schema_view(
@@ -147,7 +203,7 @@ class DuenoViewSet(viewsets.ModelViewSet):
     partial_update=extend_schema(tags=["Recepcionistas"], summary="Actualizar parcialmente recepcionista"),
     destroy=extend_schema(tags=["Recepcionistas"], summary="Eliminar recepcionista"),
 )
-class RecepcionistaViewSet(viewsets.ModelViewSet):
+class RecepcionistaViewSet(ProjectedListMixin, viewsets.ModelViewSet):
     queryset = Recepcionista.objects.all()
     serializer_class = RecepcionistaSerializer
     # list/retrieve can be open or restricted later; creation must be admin-only
@@ -160,8 +216,7 @@ class RecepcionistaViewSet(viewsets.ModelViewSet):
 
     def create(self, request, *args, **kwargs):
         # Only superusers (admin) can create recepcionistas
-        user = request.user
-        if not (user and user.is_superuser):
+        if not get_principal(request).is_superuser:
             from rest_framework.exceptions import PermissionDenied
 
             raise PermissionDenied({"detail": "Only admin users can create recepcionistas."})
@@ -175,11 +230,10 @@ class RecepcionistaViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=["get", "put", "patch"], url_path="me", permission_classes=[IsAuthenticated])
     def me(self, request):
         """Return or update the Recepcionista profile for the authenticated user."""
-        user = request.user
-        if not hasattr(user, "recepcionista_profile") or user.recepcionista_profile is None:
+        recep = get_principal(request).recepcionista
+        if recep is None:
             return Response({}, status=200)
 
-        recep = user.recepcionista_profile
         if request.method == "GET":
             serializer = RecepcionistaSerializer(recep, context={"request": request})
             return Response(serializer.data, status=200)
@@ -196,11 +250,10 @@ class RecepcionistaViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=["get"], url_path="me/summary", permission_classes=[IsAuthenticated])
     def me_summary(self, request):
         """Return a small summary for the authenticated recepcionista: profile, counts and recent mascotas."""
-        user = request.user
-        if not hasattr(user, "recepcionista_profile") or user.recepcionista_profile is None:
+        rec = get_principal(request).recepcionista
+        if rec is None:
             return Response({}, status=200)
 
-        rec = user.recepcionista_profile
         profile = RecepcionistaSerializer(rec, context={"request": request}).data
 
         # counts and recent items
@@ -209,7 +262,7 @@ class RecepcionistaViewSet(viewsets.ModelViewSet):
         recent_mascotas = MascotaSerializer(recent_mascotas_qs, many=True, context={"request": request}).data
 
         # recent consultas across the clinic (limit 5) to give context to recepcionista
-        recent_consultas_qs = Consulta.objects.all().order_by("-fecha", "-hora")[:5]
+        recent_consultas_qs = Consulta.objects.for_listing().order_by("-fecha", "-hora")[:5]
         recent_consultas = ConsultaSerializer(recent_consultas_qs, many=True, context={"request": request}).data
 
         return Response(
@@ -232,7 +285,7 @@ class RecepcionistaViewSet(viewsets.ModelViewSet):
     partial_update=extend_schema(tags=["Veterinarios"], summary="Actualizar parcialmente veterinario"),
     destroy=extend_schema(tags=["Veterinarios"], summary="Eliminar veterinario"),
 )
-class VeterinarioViewSet(viewsets.ModelViewSet):
+class VeterinarioViewSet(ProjectedListMixin, viewsets.ModelViewSet):
     queryset = Veterinario.objects.all()
     serializer_class = VeterinarioSerializer
     permission_classes = (AllowAny,)
@@ -245,8 +298,7 @@ class VeterinarioViewSet(viewsets.ModelViewSet):
 
     def create(self, request, *args, **kwargs):
         # Only superusers can create veterinarios (and their users)
-        user = request.user
-        if not (user and user.is_superuser):
+        if not get_principal(request).is_superuser:
             from rest_framework.exceptions import PermissionDenied
 
             raise PermissionDenied({"detail": "Only admin users can create veterinarios."})
@@ -271,11 +323,10 @@ class VeterinarioViewSet(viewsets.ModelViewSet):
         Note: Veterinario has an optional OneToOne `user` relation; this endpoint will act on the
         linked Veterinario (if any). If no Veterinario is linked to the user, returns empty.
         """
-        user = request.user
-        if not hasattr(user, "veterinario_profile") or user.veterinario_profile is None:
+        vet = get_principal(request).veterinario
+        if vet is None:
             return Response({}, status=200)
 
-        vet = user.veterinario_profile
         if request.method == "GET":
             serializer = VeterinarioSerializer(vet, context={"request": request})
             return Response(serializer.data, status=200)
@@ -292,37 +343,24 @@ class VeterinarioViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=["get"], url_path="me/summary", permission_classes=[IsAuthenticated])
     def me_summary(self, request):
         """Return a small summary for the authenticated veterinarian: profile, today's consultas and availability."""
-        user = request.user
-        if not hasattr(user, "veterinario_profile") or user.veterinario_profile is None:
+        vet = get_principal(request).veterinario
+        if vet is None:
             return Response({}, status=200)
 
-        vet = user.veterinario_profile
         profile = VeterinarioSerializer(vet, context={"request": request}).data
 
         today = date.today()
         # consultas for today
-        today_consultas_qs = Consulta.objects.filter(veterinario=vet, fecha=today).order_by("hora")
+        today_consultas_qs = Consulta.objects.for_listing().filter(veterinario=vet, fecha=today).order_by("hora")
         today_consultas = ConsultaSerializer(today_consultas_qs, many=True, context={"request": request}).data
 
-        # upcoming not attended consultas count
-        upcoming_count = Consulta.objects.filter(veterinario=vet, fecha__gte=today, asistio=False).count()
-
-        # compute simple availability for today based on work_start/work_end
-        available_slots = []
-        if vet.work_start and vet.work_end:
-            from datetime import datetime as _dt, timedelta as _td
-
-            start_dt = _dt.combine(today, vet.work_start)
-            end_dt = _dt.combine(today, vet.work_end)
-            cur = start_dt
-            while cur < end_dt:
-                hora_only = cur.time()
-                exists = Consulta.objects.filter(veterinario=vet, fecha=today, hora=hora_only).exists()
-                if not exists:
-                    available_slots.append(hora_only.strftime("%H:%M"))
-                cur = cur + _td(hours=1)
-
-        recent_consultas_qs = Consulta.objects.filter(veterinario=vet).order_by("-fecha", "-hora")[:5]
+        # upcoming not attended consultas count, from a handful of pre-aggregated rows
+        upcoming_count = stats.totals(VetDailyStats.objects.filter(veterinario=vet, fecha__gte=today))["no_show"]
+
+        # free slots for today (honours work_days)
+        available_slots = availability_for_date([vet], today)[vet.pk]
+
+        recent_consultas_qs = Consulta.objects.for_listing().filter(veterinario=vet).order_by("-fecha", "-hora")[:5]
         recent_consultas = ConsultaSerializer(recent_consultas_qs, many=True, context={"request": request}).data
 
         return Response(
@@ -337,7 +375,14 @@ class VeterinarioViewSet(viewsets.ModelViewSet):
             status=200,
         )
 
-    @extend_schema(tags=["Veterinarios"], summary="Obtener veterinarios con disponibilidad para una fecha")
+    @extend_schema(
+        tags=["Veterinarios"],
+        summary="Obtener veterinarios con disponibilidad para una fecha",
+        parameters=[
+            OpenApiParameter(name="fecha", type=OpenApiTypes.DATE, required=False),
+            OpenApiParameter(name="slot_minutes", type=OpenApiTypes.INT, required=False),
+        ],
+    )
     @action(detail=False, methods=["get"], url_path="with-availability", permission_classes=[AllowAny])
     def with_availability(self, request):
         # Optional query param: fecha=YYYY-MM-DD (default: today)
@@ -349,29 +394,101 @@ class VeterinarioViewSet(viewsets.ModelViewSet):
 
             raise ValidationError({"fecha": "Invalid date format, expected YYYY-MM-DD"})
 
+        slot_minutes = _slot_minutes_param(request)
+
+        vets = list(self.queryset.all())
+        # one query for every booking of the day, slots computed in memory
+        free = availability_for_date(vets, fecha, slot_minutes)
+        out = []
+        for v in vets:
+            item = {"idVeterinario": v.idVeterinario, "nombre": v.nombre, "work_start": v.work_start, "work_end": v.work_end, "work_days": v.work_days}
+            item["available_slots"] = free[v.pk]
+            out.append(item)
+        return Response(out, status=200)
+
+    @extend_schema(
+        tags=["Veterinarios"],
+        summary="Disponibilidad de veterinarios en un rango de fechas",
+        parameters=[
+            OpenApiParameter(name="start", type=OpenApiTypes.DATE, required=True),
+            OpenApiParameter(name="end", type=OpenApiTypes.DATE, required=False, description="Inclusive, defaults to start"),
+            OpenApiParameter(name="vets", type=OpenApiTypes.STR, required=False, description="Comma-separated idVeterinario list"),
+            OpenApiParameter(name="slot_minutes", type=OpenApiTypes.INT, required=False),
+        ],
+    )
+    @action(detail=False, methods=["get"], url_path="availability-range", permission_classes=[AllowAny])
+    def availability_range(self, request):
+        from rest_framework.exceptions import ValidationError
+
+        start = _date_param(request, "start")
+        if start is None:
+            raise ValidationError({"start": "This query parameter is required"})
+        end = _date_param(request, "end", start)
+        if end < start:
+            raise ValidationError({"end": "Must not be before start"})
+        if (end - start).days >= MAX_AVAILABILITY_RANGE_DAYS:
+            raise ValidationError({"end": f"The range may span at most {MAX_AVAILABILITY_RANGE_DAYS} days"})
+        slot_minutes = _slot_minutes_param(request)
+
         vets = self.queryset.all()
+        vet_ids = _id_list_param(request, "vets")
+        if vet_ids is not None:
+            vets = vets.filter(idVeterinario__in=vet_ids)
+        vets = list(vets)
+
+        # one range query over Consulta, per-day occupancy folded into bitsets
+        free = availability_for_range(vets, start, end, slot_minutes)
         out = []
         for v in vets:
             item = {"idVeterinario": v.idVeterinario, "nombre": v.nombre, "work_start": v.work_start, "work_end": v.work_end, "work_days": v.work_days}
-            slots = []
-            if v.work_start and v.work_end:
-                # build hourly slots between start and end
-                from datetime import datetime as _dt, timedelta as _td
-
-                start_dt = _dt.combine(fecha, v.work_start)
-                end_dt = _dt.combine(fecha, v.work_end)
-                cur = start_dt
-                while cur < end_dt:
-                    # Check if a Consulta exists at this fecha+hora for this vet
-                    hora_only = cur.time()
-                    exists = Consulta.objects.filter(veterinario=v, fecha=fecha, hora=hora_only).exists()
-                    if not exists:
-                        slots.append(hora_only.strftime("%H:%M"))
-                    cur = cur + _td(hours=1)
-            item["available_slots"] = slots
+            item["availability"] = {day.isoformat(): slots for day, slots in free[v.pk].items()}
             out.append(item)
         return Response(out, status=200)
 
+    @extend_schema(
+        tags=["Veterinarios"],
+        summary="Consultas por veterinario en un rango de fechas (staff)",
+        parameters=[
+            OpenApiParameter(name="start_date", type=OpenApiTypes.DATE, required=False, description="Defaults to 29 days before end_date"),
+            OpenApiParameter(name="end_date", type=OpenApiTypes.DATE, required=False, description="Inclusive, defaults to today"),
+            OpenApiParameter(name="vets", type=OpenApiTypes.STR, required=False, description="Comma-separated idVeterinario list"),
+        ],
+        responses=OpenApiTypes.OBJECT,
+    )
+    @action(detail=False, methods=["get"], url_path="stats", permission_classes=[IsAuthenticated])
+    def stats(self, request):
+        """Booked, attended, no-show and pending consultas per veterinario, read from VetDailyStats."""
+        from rest_framework.exceptions import PermissionDenied, ValidationError
+
+        if not get_principal(request).is_clinic_staff:
+            raise PermissionDenied({"detail": "Only clinic staff can view statistics."})
+        end = _date_param(request, "end_date", date.today())
+        start = _date_param(request, "start_date", end - timedelta(days=29))
+        if end < start:
+            raise ValidationError({"end_date": "Must not be before start_date"})
+
+        rows = VetDailyStats.objects.filter(fecha__range=(start, end))
+        vet_ids = _id_list_param(request, "vets")
+        if vet_ids is not None:
+            rows = rows.filter(veterinario_id__in=vet_ids)
+        per_vet = (
+            rows.values("veterinario_id", "veterinario__nombre")
+            .annotate(**{name: Sum(name) for name in stats.COUNTERS})
+            .order_by("veterinario_id")
+        )
+        return Response(
+            {
+                "start_date": start,
+                "end_date": end,
+                "total": stats.totals(rows),
+                "veterinarios": [
+                    {"idVeterinario": row["veterinario_id"], "nombre": row["veterinario__nombre"], **{name: row[name] for name in stats.COUNTERS}}
+                    for row in per_vet
+                ],
+            },
+            status=200,
+        )
+
     @extend_schema(tags=["Veterinarios"], summary="Consultas de un veterinario")
     @action(detail=True, methods=["get"], url_path="consultas", permission_classes=[IsAuthenticated])
     def consultas(self, request, pk=None):
@@ -385,7 +502,7 @@ class VeterinarioViewSet(viewsets.ModelViewSet):
 
             raise NotFound({"detail": "Veterinario not found"})
 
-        qs = Consulta.objects.filter(veterinario_id=pk)
+        qs = Consulta.objects.for_listing().filter(veterinario_id=pk)
         start = request.query_params.get("start_date")
         end = request.query_params.get("end_date")
         mascota_id = request.query_params.get("mascota_id")
@@ -397,14 +514,8 @@ class VeterinarioViewSet(viewsets.ModelViewSet):
             qs = qs.filter(mascota_id=mascota_id)
 
         qs = qs.order_by("fecha", "hora")
-        page = self.paginate_queryset(qs)
-        if page is not None:
-            # Use ConsultaSerializer explicitly to serialize Consulta objects
-            serializer = ConsultaSerializer(page, many=True, context={"request": request})
-            return self.get_paginated_response(serializer.data)
-
-        serializer = ConsultaSerializer(qs, many=True, context={"request": request})
-        return Response(serializer.data, status=200)
+        # Use ConsultaSerializer explicitly to serialize Consulta objects
+        return self.projected_response(qs, ConsultaSerializer)
 
 
 @extend_schema_view(
@@ -415,7 +526,7 @@ class VeterinarioViewSet(viewsets.ModelViewSet):
     partial_update=extend_schema(tags=["Mascotas"], summary="Actualizar parcialmente mascota"),
     destroy=extend_schema(tags=["Mascotas"], summary="Eliminar mascota"),
 )
-class MascotaViewSet(viewsets.ModelViewSet):
+class MascotaViewSet(ProjectedListMixin, viewsets.ModelViewSet):
     queryset = Mascota.objects.all()
     serializer_class = MascotaSerializer
     # Allow authenticated users to create mascotas by providing a `dueno` id
@@ -431,9 +542,9 @@ class MascotaViewSet(viewsets.ModelViewSet):
 
             raise ValidationError({"dueno": "dueno id is required when creating a mascota"})
 
-        user = request.user
-        is_recepcionista = hasattr(user, "recepcionista_profile") and user.recepcionista_profile is not None
-        if not (is_recepcionista or user.is_superuser):
+        principal = get_principal(request)
+        is_recepcionista = principal.is_recepcionista
+        if not (is_recepcionista or principal.is_superuser):
             from rest_framework.exceptions import PermissionDenied
 
             raise PermissionDenied({"detail": "Only recepcionistas or admin can create mascotas."})
@@ -445,7 +556,7 @@ class MascotaViewSet(viewsets.ModelViewSet):
         # Record who registered the mascota (recepcionista)
         try:
             if is_recepcionista:
-                mascota.registrada_por_recepcionista = user.recepcionista_profile
+                mascota.registrada_por_recepcionista = principal.recepcionista
                 mascota.save()
         except Exception:
             pass
@@ -456,35 +567,29 @@ class MascotaViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=["get"], url_path="user", permission_classes=[IsAuthenticated])
     def user(self, request):
         """Return mascotas for a given owner. Use `?dueno_id=<id>` to fetch an owner's mascotas."""
-        user = request.user
+        principal = get_principal(request)
         # Dueno objects are not linked to User accounts. Support fetching by `dueno_id` query param.
         dueno_id = request.query_params.get("dueno_id")
         if dueno_id:
-            mascotas = self.queryset.filter(dueno_id=dueno_id)
-            serializer = self.get_serializer(mascotas, many=True, context={"request": request})
-            return Response(serializer.data, status=200)
+            return self.projected_response(self.queryset.filter(dueno_id=dueno_id))
 
         # If the requester is staff, return all mascotas as a fallback
-        if hasattr(user, "recepcionista_profile") or user.is_superuser:
-            mascotas = self.queryset.all()
-            serializer = self.get_serializer(mascotas, many=True, context={"request": request})
-            return Response(serializer.data, status=200)
+        if principal.is_recepcionista or principal.is_superuser:
+            return self.projected_response(self.queryset.all())
 
-        return Response([], status=200)
+        return self.projected_response(self.queryset.none())
 
     @extend_schema(tags=["Mascotas"], summary="Listar mascotas con nombre de dueño")
     @action(detail=False, methods=["get"], url_path="with-dueno", permission_classes=[IsAuthenticated])
     def with_dueno(self, request):
         """Return all mascotas including their owner's `nombre` as `dueno_nombre`."""
-        qs = self.queryset.select_related("dueno").all()
-        serializer = self.get_serializer(qs, many=True, context={"request": request})
-        return Response(serializer.data, status=200)
+        return self.projected_response(self.queryset.select_related("dueno").all())
 
-    def _is_allowed_to_modify(self, user, mascota):
-        """Return True if user can modify the given mascota."""
-        if user.is_superuser:
+    def _is_allowed_to_modify(self, principal, mascota):
+        """Return True if the principal can modify the given mascota."""
+        if principal.is_superuser:
             return True
-        if hasattr(user, "recepcionista_profile"):
+        if principal.is_recepcionista:
             return True
         # Owners are no longer User accounts; owner-based modification must be performed
         # by staff using the `dueno_id` and the proper endpoints.
@@ -500,9 +605,8 @@ class MascotaViewSet(viewsets.ModelViewSet):
 
     def _perform_update(self, request, partial):
         instance = self.get_object()
-        user = request.user
 
-        if not self._is_allowed_to_modify(user, instance):
+        if not self._is_allowed_to_modify(get_principal(request), instance):
             from rest_framework.exceptions import PermissionDenied
 
             raise PermissionDenied({"detail": "Not allowed to modify this mascota."})
@@ -525,7 +629,8 @@ class MascotaViewSet(viewsets.ModelViewSet):
         """Return all consultas for this mascota, ordered by date and time descending.
 
         Access restricted to staff (recepcionista), veterinario or admin users.
-        Optional query params: start_date, end_date (YYYY-MM-DD format).
+        Optional query params: start_date, end_date (YYYY-MM-DD format). Archived
+        consultas are included when start_date is before the archive cutoff.
         """
         try:
             mascota = Mascota.objects.get(pk=pk)
@@ -534,34 +639,34 @@ class MascotaViewSet(viewsets.ModelViewSet):
 
             raise NotFound({"detail": "Mascota not found"})
 
-        user = request.user
-        if not (hasattr(user, "recepcionista_profile") or hasattr(user, "veterinario_profile") or user.is_superuser):
+        if not get_principal(request).is_clinic_staff:
             from rest_framework.exceptions import PermissionDenied
 
             raise PermissionDenied({"detail": "Not allowed to view this mascota's consultas"})
 
-        qs = Consulta.objects.filter(mascota=mascota).order_by("-fecha", "-hora")
+        start_date = _date_param(request, "start_date")
+        end_date = _date_param(request, "end_date")
+        querysets = [Consulta.objects.for_listing()]
+        if archive.reaches_archive(start_date):
+            querysets.append(ConsultaArchivada.objects.for_listing())
 
         # Optional filtering by date range
-        start_date = request.query_params.get("start_date")
-        end_date = request.query_params.get("end_date")
-        if start_date:
-            qs = qs.filter(fecha__gte=start_date)
-        if end_date:
-            qs = qs.filter(fecha__lte=end_date)
-
-        page = self.paginate_queryset(qs)
-        if page is not None:
-            serializer = ConsultaSerializer(page, many=True, context={"request": request})
-            return self.get_paginated_response(serializer.data)
-
-        serializer = ConsultaSerializer(qs, many=True, context={"request": request})
-        return Response(serializer.data, status=200)
+        for index, qs in enumerate(querysets):
+            qs = qs.filter(mascota=mascota).order_by("-fecha", "-hora")
+            if start_date:
+                qs = qs.filter(fecha__gte=start_date)
+            if end_date:
+                qs = qs.filter(fecha__lte=end_date)
+            querysets[index] = qs
+
+        if len(querysets) > 1:
+            return self.merged_response(querysets, ConsultaSerializer)
+        return self.projected_response(querysets[0], ConsultaSerializer)
 
     @extend_schema(tags=["Mascotas"], summary="Consultas asistidas de una mascota")
     @action(detail=True, methods=["get"], url_path="consultas/asistidas", permission_classes=[IsAuthenticated])
     def consultas_asistidas(self, request, pk=None):
-        """Return consultas for this mascota where `asistio` is True (attended visits).
+        """Return consultas for this mascota where `asistio` is True (attended visits), archived ones included.
 
         Access restricted to staff (recepcionista), veterinario or admin users.
         """
@@ -572,21 +677,17 @@ class MascotaViewSet(viewsets.ModelViewSet):
 
             raise NotFound({"detail": "Mascota not found"})
 
-        user = request.user
-        if not (hasattr(user, "recepcionista_profile") or hasattr(user, "veterinario_profile") or user.is_superuser):
+        if not get_principal(request).is_clinic_staff:
             from rest_framework.exceptions import PermissionDenied
 
             raise PermissionDenied({"detail": "Not allowed to view this mascota's attended consultas"})
 
-        qs = Consulta.objects.filter(mascota=mascota, asistio=True).order_by("-fecha", "-hora")
-
-        page = self.paginate_queryset(qs)
-        if page is not None:
-            serializer = ConsultaSerializer(page, many=True, context={"request": request})
-            return self.get_paginated_response(serializer.data)
-
-        serializer = ConsultaSerializer(qs, many=True, context={"request": request})
-        return Response(serializer.data, status=200)
+        # A whole history always reaches the archive
+        querysets = [
+            model.objects.for_listing().filter(mascota=mascota, asistio=True).order_by("-fecha", "-hora")
+            for model in (Consulta, ConsultaArchivada)
+        ]
+        return self.merged_response(querysets, ConsultaSerializer)
 
 
 
@@ -598,10 +699,12 @@ class MascotaViewSet(viewsets.ModelViewSet):
     partial_update=extend_schema(tags=["Consultas"], summary="Actualizar parcialmente consulta"),
     destroy=extend_schema(tags=["Consultas"], summary="Eliminar consulta"),
 )
-class ConsultaViewSet(viewsets.ModelViewSet):
-    queryset = Consulta.objects.all()
+class ConsultaViewSet(ProjectedListMixin, viewsets.ModelViewSet):
+    queryset = Consulta.objects.for_listing()
     serializer_class = ConsultaSerializer
     permission_classes = (AllowAny,)
+    # Pages of the plain listing walk consulta_fecha_hora_idx
+    keyset_ordering = ("fecha", "hora", "idConsulta")
 
     def list(self, request, *args, **kwargs):
         """Support listing consultas and also retrieving a mascota's historial via ?mascota_id=."""
@@ -614,16 +717,14 @@ class ConsultaViewSet(viewsets.ModelViewSet):
 
                 raise NotFound({"detail": "Mascota not found"})
 
-            user = request.user
             # Authorization: since Dueno is no longer a User, only staff and vets/admin are allowed
-            if not (hasattr(user, "recepcionista_profile") or hasattr(user, "veterinario_profile") or user.is_superuser):
+            if not get_principal(request).is_clinic_staff:
                 from rest_framework.exceptions import PermissionDenied
 
                 raise PermissionDenied({"detail": "Not allowed to view this mascota's historial"})
 
             consultas = self.queryset.filter(mascota=mascota).order_by("-fecha", "-hora")
-            serializer = self.get_serializer(consultas, many=True, context={"request": request})
-            return Response(serializer.data, status=200)
+            return self.projected_response(consultas)
 
         return super().list(request, *args, **kwargs)
 
@@ -641,30 +742,222 @@ class ConsultaViewSet(viewsets.ModelViewSet):
 
         serializer = self.get_serializer(data=data)
         serializer.is_valid(raise_exception=True)
-        obj = serializer.save()
+        # 409 with the nearest free slots when the vet is already booked at that time
+        obj = book(serializer)
         out = self.get_serializer(obj, context={"request": request})
         return Response(out.data, status=201)
 
+    def perform_update(self, serializer):
+        book(serializer)
+
     def perform_create(self, serializer):
-        user = self.request.user
-        recepcionista = getattr(user, "recepcionista_profile", None)
+        recepcionista = get_principal(self.request).recepcionista
         # Even if not a receptionist (e.g. admin), this will be None or handle it safely if logic allows
         serializer.save(registrada_por=recepcionista)
 
     @action(detail=False, methods=["get"], url_path="user/recent", permission_classes=[IsAuthenticated])
     def user_recent(self, request):
         """Return the 5 most recent consultas for the authenticated owner's mascotas."""
-        user = request.user
         # With Dueno not linked to User, require a dueno_id query param or return empty
         dueno_id = request.query_params.get("dueno_id")
         if not dueno_id:
             return Response([], status=200)
 
-        consultas = self.queryset.filter(mascota__dueno_id=dueno_id).order_by("-fecha")[:5]
-        serializer = self.get_serializer(consultas, many=True, context={"request": request})
-        return Response(serializer.data, status=200)
+        consultas = self.queryset.filter(dueno_id=dueno_id).order_by("-fecha")[:5]
+        return self.projected_response(consultas)
+
+    @extend_schema(
+        tags=["Consultas"],
+        summary="Buscar en las notas clínicas (staff)",
+        parameters=[
+            OpenApiParameter(name="q", type=OpenApiTypes.STR, required=True, description="Words searched in motivo, descripcion, sintomas and tratamiento"),
+            OpenApiParameter(name="page", type=OpenApiTypes.INT, required=False, description="1-based page number"),
+            OpenApiParameter(name="page_size", type=OpenApiTypes.INT, required=False),
+        ],
+        responses=OpenApiTypes.OBJECT,
+    )
+    @action(detail=False, methods=["get"], url_path="search", permission_classes=[IsAuthenticated])
+    def search(self, request):
+        """Consultas whose notes match `q`, best first, each with its `rank` and a highlighted `snippet`."""
+        from rest_framework.exceptions import PermissionDenied, ValidationError
+        from rest_framework.pagination import _positive_int
+        from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+        if not get_principal(request).is_clinic_staff:
+            raise PermissionDenied({"detail": "Only clinic staff can search clinical notes."})
+        text = request.query_params.get("q", "").strip()
+        if not text:
+            raise ValidationError({"q": "This parameter is required"})
+        try:
+            page = _positive_int(request.query_params.get("page", 1), strict=True)
+        except ValueError:
+            raise ValidationError({"page": "Expected a positive integer"})
+        page_size = self.paginator.get_page_size(request)
+
+        # Ranked, so pages are offsets; one hit past the page tells whether there is a next one
+        hits = search.search(text, page_size + 1, (page - 1) * page_size)
+        consultas = self.queryset.in_bulk([pk for pk, _, _ in hits[:page_size]])
+        results = []
+        for pk, rank, snippet in hits[:page_size]:
+            if pk in consultas:
+                results.append({**ConsultaSerializer(consultas[pk]).data, "rank": rank, "snippet": snippet})
+
+        url = request.build_absolute_uri()
+        return Response(
+            {
+                "next": replace_query_param(url, "page", page + 1) if len(hits) > page_size else None,
+                "previous": None if page == 1 else (
+                    remove_query_param(url, "page") if page == 2 else replace_query_param(url, "page", page - 1)
+                ),
+                "results": results,
+            },
+            status=200,
+        )
+
 
-    
+_EXPORT_PARAMETERS = [
+    OpenApiParameter(name="output", type=OpenApiTypes.STR, required=False, enum=list(export.OUTPUTS), description="Defaults to csv"),
+    OpenApiParameter(name="start_date", type=OpenApiTypes.DATE, required=False),
+    OpenApiParameter(name="end_date", type=OpenApiTypes.DATE, required=False),
+    OpenApiParameter(name="vets", type=OpenApiTypes.STR, required=False, description="Comma-separated idVeterinario list"),
+]
+_EXPORT_RESPONSES = {(200, media_type.split(";")[0]): OpenApiTypes.STR for media_type in export.OUTPUTS.values()}
+
+
+@extend_schema(tags=["Exportaciones"], parameters=_EXPORT_PARAMETERS, responses=_EXPORT_RESPONSES)
+class ExportViewSet(viewsets.ViewSet):
+    """Streaming CSV/NDJSON exports for clinic staff.
+
+    `start_date`/`end_date` bound consultas by fecha and `vets` by veterinario;
+    mascotas and dueños are those with at least one consulta matching the filters.
+    """
+
+    permission_classes = (IsAuthenticated,)
+    content_negotiation_class = export.ExportContentNegotiation
+
+    def _consultas(self, request):
+        if not get_principal(request).is_clinic_staff:
+            from rest_framework.exceptions import PermissionDenied
+
+            raise PermissionDenied({"detail": "Only clinic staff can export data."})
+
+        consultas = Consulta.objects.all()
+        filtered = False
+        start = _date_param(request, "start_date")
+        end = _date_param(request, "end_date")
+        vet_ids = _id_list_param(request, "vets")
+        if start:
+            consultas, filtered = consultas.filter(fecha__gte=start), True
+        if end:
+            consultas, filtered = consultas.filter(fecha__lte=end), True
+        if vet_ids is not None:
+            consultas, filtered = consultas.filter(veterinario_id__in=vet_ids), True
+        return consultas, filtered
+
+    def _output(self, request):
+        output = request.query_params.get("output", "csv")
+        if output not in export.OUTPUTS:
+            from rest_framework.exceptions import ValidationError
+
+            raise ValidationError({"output": "Expected one of: %s" % ", ".join(export.OUTPUTS)})
+        return output
+
+    @extend_schema(summary="Exportar consultas")
+    @action(detail=False, methods=["get"], url_path="consultas")
+    def consultas(self, request):
+        output = self._output(request)
+        consultas, _ = self._consultas(request)
+        consultas = consultas.order_by("fecha", "hora", "idConsulta")
+        return export.export_response(consultas, export.CONSULTA_COLUMNS, output, "consultas")
+
+    @extend_schema(summary="Exportar mascotas")
+    @action(detail=False, methods=["get"], url_path="mascotas")
+    def mascotas(self, request):
+        output = self._output(request)
+        consultas, filtered = self._consultas(request)
+        mascotas = Mascota.objects.order_by("idMascota")
+        if filtered:
+            mascotas = mascotas.filter(idMascota__in=consultas.values("mascota_id"))
+        return export.export_response(mascotas, export.MASCOTA_COLUMNS, output, "mascotas")
+
+    @extend_schema(summary="Exportar dueños")
+    @action(detail=False, methods=["get"], url_path="duenos")
+    def duenos(self, request):
+        output = self._output(request)
+        consultas, filtered = self._consultas(request)
+        duenos = Dueno.objects.order_by("idDueno")
+        if filtered:
+            duenos = duenos.filter(idDueno__in=consultas.values("dueno_id"))
+        return export.export_response(duenos, export.DUENO_COLUMNS, output, "duenos")
+
+
+_IMPORT_PARAMETERS = [
+    OpenApiParameter(
+        name="input",
+        type=OpenApiTypes.STR,
+        required=False,
+        enum=list(imports.INPUTS),
+        description="Defaults to the Content-Type of the body or the extension of the uploaded file",
+    ),
+    OpenApiParameter(name="dry_run", type=OpenApiTypes.BOOL, required=False, description="Validate without importing"),
+]
+_IMPORT_REQUEST = {
+    **{media_type: OpenApiTypes.BINARY for media_type in imports.INPUTS.values()},
+    "multipart/form-data": {"type": "object", "properties": {"file": {"type": "string", "format": "binary"}}},
+}
+
+
+@extend_schema(tags=["Importaciones"], parameters=_IMPORT_PARAMETERS, request=_IMPORT_REQUEST, responses=OpenApiTypes.OBJECT)
+class ImportViewSet(viewsets.ViewSet):
+    """Bulk CSV/NDJSON imports for clinic staff.
+
+    The file is the request body (text/csv or application/x-ndjson) or the `file`
+    field of a multipart form, with the columns of the matching export. Valid rows
+    are imported and the others listed by line in the report, see imports.py.
+    """
+
+    permission_classes = (IsAuthenticated,)
+    parser_classes = (imports.CSVUploadParser, imports.NDJSONUploadParser, MultiPartParser)
+
+    def _import(self, request, kind):
+        from rest_framework.exceptions import PermissionDenied, ValidationError
+
+        principal = get_principal(request)
+        if not principal.is_clinic_staff:
+            raise PermissionDenied({"detail": "Only clinic staff can import data."})
+
+        upload = request.data.get("file")
+        if upload is None:
+            raise ValidationError({"file": "Send the file as the request body or as the multipart field `file`."})
+        input = request.query_params.get("input") or imports.guess_input(
+            getattr(upload, "content_type", None) or request.content_type, getattr(upload, "name", None)
+        )
+        if input not in imports.INPUTS:
+            raise ValidationError({"input": "Expected one of: %s" % ", ".join(imports.INPUTS)})
+
+        report = imports.import_records(
+            kind,
+            imports.decode(upload),
+            input,
+            registrada_por=principal.recepcionista,
+            dry_run=request.query_params.get("dry_run") in ("1", "true", "True"),
+        )
+        return Response(report, status=200)
+
+    @extend_schema(summary="Importar dueños")
+    @action(detail=False, methods=["post"], url_path="duenos")
+    def duenos(self, request):
+        return self._import(request, "duenos")
+
+    @extend_schema(summary="Importar mascotas")
+    @action(detail=False, methods=["post"], url_path="mascotas")
+    def mascotas(self, request):
+        return self._import(request, "mascotas")
+
+    @extend_schema(summary="Importar consultas")
+    @action(detail=False, methods=["post"], url_path="consultas")
+    def consultas(self, request):
+        return self._import(request, "consultas")
 
 
 # CitaViewSet removed — Consulta now represents both appointments and clinical consultations.
@@ -696,41 +989,39 @@ class ProfileViewSet(viewsets.ViewSet):
 
     serializer_class = _ProfileFallbackSerializer
 
-    def _get_role(self, user):
+    def _get_role(self, request):
         # Dueno objects are not linked to User accounts in the current design
-        if hasattr(user, "recepcionista_profile") and user.recepcionista_profile is not None:
-            return "recepcionista"
-        if hasattr(user, "veterinario_profile") and user.veterinario_profile is not None:
-            return "veterinario"
-        if user.is_superuser:
-            return "admin"
-        return "unknown"
-
-    def retrieve(self, request):
+        return get_principal(request).role or "unknown"
+
+    def retrieve(self, request, pk=None):
         """GET /profile/me"""
         user = request.user
-        role = self._get_role(user)
+        principal = get_principal(request)
+        role = self._get_role(request)
         if role == "recepcionista":
-            return Response(RecepcionistaSerializer(user.recepcionista_profile, context={"request": request}).data)
+            return Response(RecepcionistaSerializer(principal.recepcionista, context={"request": request}).data)
         if role == "veterinario":
-            return Response(VeterinarioSerializer(user.veterinario_profile, context={"request": request}).data)
+            return Response(VeterinarioSerializer(principal.veterinario, context={"request": request}).data)
         if role == "admin":
             return Response(UserNestedSerializer(user, context={"request": request}).data)
         return Response({}, status=200)
 
-    def partial_update(self, request):
+    def partial_update(self, request, pk=None):
         """PATCH /profile/me"""
-        user = request.user
-        role = self._get_role(user)
+        # request.user may be built from access token claims or a cached snapshot;
+        # write through the current row so stale flags are never saved back
+        user = User.objects.get(pk=request.user.pk)
+        principal = resolve_principal(user)
+        role = principal.role or "unknown"
         if role == "recepcionista":
-            obj = user.recepcionista_profile
+            obj = principal.recepcionista
             serializer = RecepcionistaUpdateSerializer(obj, data=request.data, partial=True)
             serializer.is_valid(raise_exception=True)
             serializer.save()
             return Response(RecepcionistaSerializer(obj, context={"request": request}).data)
 
         if role == "veterinario":
-            obj = user.veterinario_profile
+            obj = principal.veterinario
             serializer = VeterinarioUpdateSerializer(obj, data=request.data, partial=True)
             serializer.is_valid(raise_exception=True)
             serializer.save()
@@ -745,5 +1036,5 @@ class ProfileViewSet(viewsets.ViewSet):
         return Response({}, status=200)
 
     # Support PUT as alias to partial_update for convenience
-    def update(self, request):
-        return self.partial_update(request)
+    def update(self, request, pk=None):
+        return self.partial_update(request, pk)
@@ -0,0 +1,151 @@
+"""In-process pool of database connections shared by the threads of a worker.
+
+Django keeps one connection per thread. With CONN_MAX_AGE each thread holds its
+connection between requests, so a worker with many mostly idle threads keeps as
+many connections open on the server. A pool lets the threads share fewer
+connections: a thread takes one when it first queries and gives it back when
+Django closes it at the end of the request (see api/db/postgresql).
+
+Up to `max_size` connections are kept open while idle; `max_overflow` more are
+opened under load and closed once given back. When all of them are in use a
+thread waits up to `timeout` seconds for one before PoolTimeout is raised.
+"""
+
+import threading
+import time
+from collections import deque
+
+
+class PoolTimeout(Exception):
+    """No connection became available within the pool's timeout."""
+
+
+class ConnectionPool:
+    def __init__(self, max_size=5, max_overflow=5, timeout=10.0, reset=None):
+        self.max_size = max_size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        # reset(connection) -> whether the connection can go back to the pool
+        self._reset = reset or (lambda connection: True)
+        # LIFO, so the connections in use stay warm and the surplus ages out
+        self._idle = deque()
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        self.in_use = 0
+        self.created = 0
+        self.reused = 0
+        self.discarded = 0
+        self.waits = 0
+        self.timeouts = 0
+        # recent samples in seconds
+        self._wait_latency = deque(maxlen=1000)
+
+    def acquire(self, connect):
+        """(connection, reused); `connect()` opens a new one when the pool has room."""
+        start = time.monotonic()
+        deadline = None
+        with self._available:
+            while not self._idle and self.in_use >= self.max_size + self.max_overflow:
+                if deadline is None:
+                    deadline = start + self.timeout
+                    self.waits += 1
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.timeouts += 1
+                    raise PoolTimeout(
+                        "No database connection available within %.1fs (%d in use)" % (self.timeout, self.in_use)
+                    )
+                self._available.wait(remaining)
+            self.in_use += 1
+            self._wait_latency.append(time.monotonic() - start)
+            if self._idle:
+                self.reused += 1
+                return self._idle.pop(), True
+
+        try:
+            connection = connect()
+        except BaseException:
+            with self._available:
+                self.in_use -= 1
+                self._available.notify()
+            raise
+        with self._lock:
+            self.created += 1
+        return connection, False
+
+    def release(self, connection, discard=False):
+        """Give `connection` back; it is closed when broken, beyond `max_size` or `discard`."""
+        try:
+            reusable = not discard and self._reset(connection)
+        except Exception:
+            reusable = False
+        with self._available:
+            self.in_use -= 1
+            keep = reusable and len(self._idle) < self.max_size
+            if keep:
+                self._idle.append(connection)
+            self._available.notify()
+        if not keep:
+            self._discard(connection)
+
+    def clear(self):
+        """Close the idle connections."""
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+        for connection in idle:
+            self._discard(connection)
+
+    def _discard(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+        with self._lock:
+            self.discarded += 1
+
+    def stats(self):
+        # api.metrics imports DRF; keep it out of the database backend's imports
+        from api.metrics import percentiles
+
+        with self._lock:
+            return {
+                "max_size": self.max_size,
+                "max_overflow": self.max_overflow,
+                "in_use": self.in_use,
+                "idle": len(self._idle),
+                "overflow": max(0, self.in_use + len(self._idle) - self.max_size),
+                "created": self.created,
+                "reused": self.reused,
+                "discarded": self.discarded,
+                "waits": self.waits,
+                "timeouts": self.timeouts,
+                "wait_ms": percentiles(self._wait_latency),
+            }
+
+
+# alias -> (connection parameters, pool) of this process
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias, conn_params, options, reset=None):
+    """The pool of `alias`, replaced when its connection parameters change (test databases)."""
+    with _pools_lock:
+        params, pool = _pools.get(alias, (None, None))
+        if pool is None or params != conn_params:
+            if pool is not None:
+                pool.clear()
+            pool = ConnectionPool(
+                max_size=int(options.get("MAX_SIZE", 5)),
+                max_overflow=int(options.get("MAX_OVERFLOW", 5)),
+                timeout=float(options.get("TIMEOUT", 10)),
+                reset=reset,
+            )
+            _pools[alias] = (dict(conn_params), pool)
+        return pool
+
+
+def stats():
+    with _pools_lock:
+        pools = {alias: pool for alias, (_, pool) in _pools.items()}
+    return {alias: pool.stats() for alias, pool in pools.items()}
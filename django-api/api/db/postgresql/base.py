@@ -0,0 +1,91 @@
+"""PostgreSQL backend with health-checked persistent connections and an optional pool.
+
+Use ENGINE "api.db.postgresql"; it reads two extra keys of the DATABASES entry:
+
+- CONN_HEALTH_CHECKS: with CONN_MAX_AGE, a connection kept from an earlier
+  request is checked with `SELECT 1` before its first query in the next one and
+  replaced if the server went away, instead of failing that query (backport of
+  the Django 4.1 setting).
+- POOL: {"MAX_SIZE", "MAX_OVERFLOW", "TIMEOUT"} with MAX_SIZE > 0 to share the connections of the
+  worker's threads through api.db.pool. Connections then go back to the pool at
+  the end of every request, whatever CONN_MAX_AGE says; pooled connections that
+  sat idle get the same health check.
+"""
+
+import time
+
+from django.db.backends.postgresql import base
+from psycopg2 import extensions
+
+from api.db.pool import PoolTimeout, get_pool
+
+
+def _reset(connection):
+    """Roll back what a request left open; False for a connection that is broken."""
+    if connection.closed:
+        return False
+    status = connection.info.transaction_status
+    if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+        return False
+    if status != extensions.TRANSACTION_STATUS_IDLE:
+        connection.rollback()
+    return True
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    health_check_done = False
+    # Pool the current connection was taken from
+    _pool = None
+
+    @property
+    def health_check_enabled(self):
+        return bool(self.settings_dict.get("CONN_HEALTH_CHECKS"))
+
+    def connect(self):
+        super().connect()
+        if self._pool is not None:
+            # Back to the pool when the request finishes (close_if_unusable_or_obsolete)
+            self.close_at = time.monotonic()
+
+    def get_new_connection(self, conn_params):
+        options = self.settings_dict.get("POOL")
+        if options and int(options.get("MAX_SIZE", 0)) > 0:
+            self._pool = get_pool(self.alias, conn_params, options, reset=_reset)
+        else:
+            self._pool = None
+        if self._pool is None:
+            self.health_check_done = True
+            return super().get_new_connection(conn_params)
+        try:
+            connection, reused = self._pool.acquire(
+                lambda: super(DatabaseWrapper, self).get_new_connection(conn_params)
+            )
+        except PoolTimeout as e:
+            raise base.Database.OperationalError(str(e)) from e
+        if reused:
+            self.isolation_level = self.settings_dict["OPTIONS"].get("isolation_level", connection.isolation_level)
+        self.health_check_done = not reused
+        return connection
+
+    def _close(self):
+        if self._pool is None or self.connection is None:
+            return super()._close()
+        # Closed inside atomic(): this wrapper keeps a reference until the block
+        # exits, so the connection cannot go to another thread
+        self._pool.release(self.connection, discard=self.in_atomic_block)
+
+    def close_if_unusable_or_obsolete(self):
+        super().close_if_unusable_or_obsolete()
+        # Called when a request starts and ends: check again before the next query
+        self.health_check_done = False
+
+    def close_if_health_check_failed(self):
+        if self.connection is None or not self.health_check_enabled or self.health_check_done or self.in_atomic_block:
+            return
+        if not self.is_usable():
+            self.close()
+        self.health_check_done = True
+
+    def _cursor(self, name=None):
+        self.close_if_health_check_failed()
+        return super()._cursor(name)
@@ -0,0 +1,108 @@
+"""Read replicas with read-your-writes stickiness.
+
+ReplicaMiddleware marks the requests whose reads may go to a replica: safe
+methods (GET, HEAD, OPTIONS) from clients that have not written recently.
+Everything else reads from "default": requests that write, reads after a write
+or inside a transaction, and code running outside a request (commands, shell,
+background threads).
+
+A request that writes, through an unsafe method or any query routed with
+db_for_write, pins its client to the primary for DATABASE_REPLICA_STICKY_SECONDS.
+The next reads then see the write even if the replicas lag behind. Clients are
+told apart by their bearer token (their address when anonymous) in the default
+cache, so several workers need a shared cache backend to agree. A request that
+issues a token (login, refresh) calls `stick_to_primary()` so the client's next
+request, the first one sending that token, is pinned too.
+"""
+
+import hashlib
+import random
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+_state = threading.local()
+
+
+def replicas():
+    return getattr(settings, "DATABASE_REPLICAS", [])
+
+
+def _key(client):
+    return "db:primary:" + hashlib.sha256(client.encode("utf-8")).hexdigest()
+
+
+def _sticky_key(request):
+    # The token alone, whatever scheme it is sent with (see ActiveSessionAuthentication)
+    parts = request.META.get("HTTP_AUTHORIZATION", "").split()
+    if len(parts) == 2 and parts[0].lower() in ("bearer", "token"):
+        parts = parts[1:]
+    if parts:
+        return _key(" ".join(parts))
+    return _key("address:" + request.META.get("REMOTE_ADDR", ""))
+
+
+def stick_to_primary(request, token):
+    """Pin the client that will send `token`, issued by this request, to the primary too."""
+    request = getattr(request, "_request", request)  # a DRF Request wraps the HttpRequest
+    request._sticky_tokens = [*getattr(request, "_sticky_tokens", ()), token]
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if not getattr(_state, "use_replica", False) or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        aliases = replicas()
+        return random.choice(aliases) if aliases else DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        _state.use_replica = False
+        _state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Every alias holds the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas replay the primary's schema
+        return False if db in replicas() else None
+
+
+def _on_replica(chunks):
+    _state.use_replica = True
+    try:
+        yield from chunks
+    finally:
+        _state.use_replica = False
+
+
+class ReplicaMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not replicas():
+            return self.get_response(request)
+
+        key = _sticky_key(request)
+        safe = request.method in SAFE_METHODS
+        _state.use_replica = safe and not cache.get(key)
+        _state.wrote = False
+        try:
+            response = self.get_response(request)
+            use_replica, wrote = _state.use_replica, _state.wrote or not safe
+        finally:
+            _state.use_replica = _state.wrote = False
+
+        if wrote:
+            keys = [key, *(_key(token) for token in getattr(request, "_sticky_tokens", ()))]
+            cache.set_many(dict.fromkeys(keys, True), getattr(settings, "DATABASE_REPLICA_STICKY_SECONDS", 5))
+        elif use_replica and response.streaming:
+            # Exports read while the response is sent, after this method returned
+            response.streaming_content = _on_replica(response.streaming_content)
+        return response
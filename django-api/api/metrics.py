@@ -0,0 +1,44 @@
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from drf_spectacular.utils import extend_schema
+from drf_spectacular.types import OpenApiTypes
+
+# name -> zero-argument callable returning a JSON serializable dict.
+# Subsystems (token cache, availability cache, ...) register themselves here so the
+# counters of the current worker process can be inspected from a single endpoint.
+_providers = {}
+
+
+def register_provider(name, provider):
+    """Expose `provider()` under `name` in the metrics endpoint."""
+    _providers[name] = provider
+
+
+def percentiles(samples):
+    """p50 and p99 in milliseconds of latency `samples` given in seconds."""
+    if not samples:
+        return {"p50": None, "p99": None}
+    ordered = sorted(samples)
+    return {
+        "p50": round(ordered[len(ordered) // 2] * 1000, 3),
+        "p99": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1000, 3),
+    }
+
+
+def collect():
+    out = {}
+    for name, provider in _providers.items():
+        try:
+            out[name] = provider()
+        except Exception as e:
+            out[name] = {"error": str(e)}
+    return out
+
+
+@extend_schema(tags=["Usuarios"], summary="Métricas internas del proceso (admin)", responses=OpenApiTypes.OBJECT)
+@api_view(["GET"])
+@permission_classes([IsAdminUser])
+def metrics(request):
+    """Return the counters collected by this worker process."""
+    return Response(collect())
@@ -0,0 +1,49 @@
+"""Migration operations shared by the apps of this project.
+
+Production runs PostgreSQL while tests and local setups may run SQLite, so the
+PostgreSQL-only operations here fall back to their portable counterpart on other
+backends.
+"""
+
+from django.db import NotSupportedError, migrations
+
+
+class AddIndexConcurrently(migrations.AddIndex):
+    """AddIndex built with CREATE INDEX CONCURRENTLY on PostgreSQL.
+
+    The table stays writable while the index is built. CONCURRENTLY cannot run in a
+    transaction, so migrations using this operation must set `atomic = False`; a
+    build that fails leaves an INVALID index behind, which has to be dropped before
+    migrating again.
+    """
+
+    def _concurrently(self, schema_editor):
+        if schema_editor.connection.vendor != "postgresql":
+            return False
+        if schema_editor.connection.in_atomic_block:
+            raise NotSupportedError(
+                "%s cannot be executed inside a transaction; set atomic = False on the migration."
+                % self.__class__.__name__
+            )
+        return True
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if not self._concurrently(schema_editor):
+            return super().database_forwards(app_label, schema_editor, from_state, to_state)
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            schema_editor.add_index(model, self.index, concurrently=True)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if not self._concurrently(schema_editor):
+            return super().database_backwards(app_label, schema_editor, from_state, to_state)
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            schema_editor.remove_index(model, self.index, concurrently=True)
+
+    def describe(self):
+        return "Concurrently create index %s on field(s) %s of model %s" % (
+            self.index.name,
+            ", ".join(self.index.fields),
+            self.model_name,
+        )
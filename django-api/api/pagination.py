@@ -0,0 +1,322 @@
+"""Keyset (cursor) pagination over composite orderings.
+
+A page is located by the ordering values of the row at its edge instead of an
+OFFSET, so fetching the thousandth page costs the same as fetching the first as
+long as an index covers the ordering. The ordering comes from the queryset's
+`order_by()`, else from the view's `keyset_ordering`, else the model's
+`Meta.ordering`; the primary key is always appended as the last tiebreaker so every
+position is unique. NULLs rank above every value (NULLS LAST ascending, NULLS FIRST
+descending) on every backend.
+
+`paginate_querysets()` pages over the union of querysets of models sharing the
+ordering columns and no rows (a table and its archive), merging their windows.
+
+Responses are `{"next", "previous", "results"}`. With API_PAGINATION["COMPAT"] on,
+requests carrying neither `cursor` nor `page_size` get the legacy bare array of every
+row, so clients written before pagination keep working.
+"""
+
+import base64
+import binascii
+import json
+import operator
+from collections import OrderedDict, namedtuple
+from functools import cmp_to_key, reduce
+from itertools import chain
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured, ValidationError
+from django.db.models import F, Q
+from django.db.models.query import FlatValuesListIterable, NamedValuesListIterable, ValuesIterable
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+Cursor = namedtuple("Cursor", ["reverse", "position"])
+
+
+def pagination_settings():
+    return getattr(settings, "API_PAGINATION", {})
+
+
+def _encode_value(value):
+    if value is None or isinstance(value, (bool, int, str)):
+        return value
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(value)
+
+
+def _order_by(field, descending):
+    expression = F(field.attname)
+    if not field.null:
+        return expression.desc() if descending else expression.asc()
+    return expression.desc(nulls_first=True) if descending else expression.asc(nulls_last=True)
+
+
+def _equal(field, value):
+    if value is None:
+        return Q(**{field.attname + "__isnull": True})
+    return Q(**{field.attname: value})
+
+
+def _beyond(field, descending, value, inclusive=False):
+    """Rows ranking after `value` in one column, or None when nothing can."""
+    if value is None:
+        if descending:
+            return Q(**{field.attname + "__isnull": False})
+        return _equal(field, None) if inclusive else None
+    lookup = ("lt" if descending else "gt") + ("e" if inclusive else "")
+    condition = Q(**{"%s__%s" % (field.attname, lookup): value})
+    if field.null and not descending:
+        condition |= _equal(field, None)
+    return condition
+
+
+def _after(ordering, position):
+    """Rows strictly after `position` under `ordering`."""
+    disjuncts = []
+    for index, ((field, descending), value) in enumerate(zip(ordering, position)):
+        step = _beyond(field, descending, value)
+        if step is not None:
+            prefix = [_equal(f, v) for (f, _), v in zip(ordering[:index], position[:index])]
+            disjuncts.append(reduce(operator.and_, prefix, step))
+    if not disjuncts:
+        return Q(pk__in=[])
+    condition = reduce(operator.or_, disjuncts)
+    # Redundant with the above, but a plain range on the leading column is what lets
+    # the database seek into the index instead of filtering the OR row by row
+    (field, descending), value = ordering[0], position[0]
+    bound = _beyond(field, descending, value, inclusive=True)
+    return condition if bound is None else bound & condition
+
+
+def _compare(ordering):
+    """cmp() of two positions under `ordering`, NULLs ranking above every value."""
+
+    def compare(left, right):
+        for (_, descending), a, b in zip(ordering, left, right):
+            if a == b:
+                continue
+            if a is None or b is None:
+                result = 1 if a is None else -1
+            else:
+                result = 1 if a > b else -1
+            return -result if descending else result
+        return 0
+
+    return compare
+
+
+class KeysetPagination(BasePagination):
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        window = self.get_window(queryset, request, view)
+        if window is None:
+            return None
+        return self._paginate(list(window))
+
+    def paginate_querysets(self, querysets, request, view=None):
+        """paginate_queryset() over the union of `querysets`, which never share a row."""
+        windows = [self.get_window(queryset, request, view) for queryset in querysets]
+        if any(window is None for window in windows):
+            return None
+        reverse = self.cursor is not None and self.cursor.reverse
+        ordering = [(field, descending != reverse) for field, descending in self.ordering]
+        return self._paginate(self._sorted(chain.from_iterable(windows), ordering)[: self.page_size + 1])
+
+    def merge(self, querysets, view=None):
+        """Every row of `querysets`, unpaginated, in their shared ordering."""
+        self.ordering = self.get_ordering(querysets[0], view)
+        querysets = [self._select_position(queryset) for queryset in querysets]
+        return self._sorted(chain.from_iterable(querysets), self.ordering)
+
+    def _sorted(self, rows, ordering):
+        key = cmp_to_key(_compare(ordering))
+        return sorted(rows, key=lambda row: key(self._position(row)))
+
+    def _paginate(self, rows):
+        has_more = len(rows) > self.page_size
+        self.page = rows[: self.page_size]
+        if self.cursor is not None and self.cursor.reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.cursor is not None
+        return self.page
+
+    def get_window(self, queryset, request, view=None):
+        """The sliced `queryset` the page is read from (one row past it), or None when unpaginated."""
+        self.request = request
+        if queryset.query.is_sliced:
+            # Already bounded ("the 5 most recent ..."): served as is
+            return None
+        params = request.query_params
+        if (
+            pagination_settings().get("COMPAT", False)
+            and self.cursor_query_param not in params
+            and self.page_size_query_param not in params
+        ):
+            return None
+
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(queryset, view)
+        self.cursor = self.decode_cursor(request)
+
+        reverse = self.cursor is not None and self.cursor.reverse
+        ordering = [(field, descending != reverse) for field, descending in self.ordering]
+        queryset = queryset.order_by(*[_order_by(field, descending) for field, descending in ordering])
+        if self.cursor is not None:
+            queryset = queryset.filter(_after(ordering, self.cursor.position))
+        return self._select_position(queryset)[: self.page_size + 1]
+
+    def get_paginated_response(self, data):
+        return Response(
+            OrderedDict(
+                [
+                    ("next", self.get_next_link()),
+                    ("previous", self.get_previous_link()),
+                    ("results", data),
+                ]
+            )
+        )
+
+    def get_page_size(self, request):
+        try:
+            size = _positive_int(request.query_params[self.page_size_query_param], strict=True)
+        except (KeyError, ValueError):
+            return api_settings.PAGE_SIZE
+        return min(size, pagination_settings().get("MAX_PAGE_SIZE", 500))
+
+    def get_ordering(self, queryset, view):
+        """[(field, descending)] ending with the primary key."""
+        opts = queryset.model._meta
+        names = queryset.query.order_by or getattr(view, "keyset_ordering", None) or opts.ordering
+        ordering = []
+        for name in names:
+            if not isinstance(name, str):
+                raise ImproperlyConfigured("Keyset pagination needs field name orderings, got %r" % (name,))
+            descending = name.startswith("-")
+            name = name.lstrip("-")
+            try:
+                field = opts.pk if name == "pk" else opts.get_field(name)
+            except FieldDoesNotExist:
+                raise ImproperlyConfigured("Keyset pagination cannot order %s by %r" % (opts.label, name))
+            if not field.concrete:
+                raise ImproperlyConfigured("Keyset pagination cannot order %s by %r" % (opts.label, name))
+            ordering.append((field, descending))
+            if field.primary_key:
+                # Unique from here on: any later column would never be compared
+                return ordering
+        last_descending = ordering[-1][1] if ordering else False
+        return ordering + [(opts.pk, last_descending)]
+
+    def _select_position(self, queryset):
+        """Make sure the rows carry every ordering column, and note where values() rows do."""
+        iterable = queryset._iterable_class
+        self._columns = None
+        if queryset._fields is None:
+            return self._load_position(queryset)
+        if iterable is FlatValuesListIterable:
+            raise ImproperlyConfigured("Keyset pagination cannot paginate values_list(flat=True)")
+
+        fields = list(queryset._fields)
+        columns = []
+        for field, _ in self.ordering:
+            aliases = [field.name, field.attname] + (["pk"] if field.primary_key else [])
+            name = next((alias for alias in aliases if alias in fields), None)
+            if name is None:
+                # Appended after the requested columns, which keep their positions
+                name = field.name
+                fields.append(name)
+            columns.append(name if iterable is ValuesIterable else fields.index(name))
+        self._columns = columns
+        if len(fields) == len(queryset._fields):
+            return queryset
+        if iterable is ValuesIterable:
+            return queryset.values(*fields)
+        return queryset.values_list(*fields, named=iterable is NamedValuesListIterable)
+
+    def _load_position(self, queryset):
+        """Undefer the ordering columns of an only()/defer() queryset."""
+        names, defer = queryset.query.deferred_loading
+        if not names:
+            return queryset
+        ordering = {name for field, _ in self.ordering for name in (field.name, field.attname)}
+        if defer:
+            return queryset.defer(None).defer(*(names - ordering)) if names & ordering else queryset
+        missing = [field.name for field, _ in self.ordering if not {field.name, field.attname} & names]
+        return queryset.only(*names, *missing) if missing else queryset
+
+    def _position(self, row):
+        if self._columns is None:
+            return [getattr(row, field.attname) for field, _ in self.ordering]
+        return [row[column] for column in self._columns]
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode("ascii")).decode("utf-8"))
+            position = payload["p"]
+            if not isinstance(position, list) or len(position) != len(self.ordering):
+                raise ValueError
+            position = [
+                None if value is None else field.to_python(value)
+                for (field, _), value in zip(self.ordering, position)
+            ]
+            return Cursor(reverse=bool(payload.get("r")), position=position)
+        except (TypeError, ValueError, KeyError, UnicodeError, binascii.Error, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, cursor):
+        payload = {"p": [_encode_value(value) for value in cursor.position]}
+        if cursor.reverse:
+            payload["r"] = 1
+        encoded = base64.urlsafe_b64encode(json.dumps(payload, separators=(",", ":")).encode("utf-8")).decode("ascii")
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(Cursor(reverse=False, position=self._position(self.page[-1])))
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(Cursor(reverse=True, position=self._position(self.page[0])))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "properties": {
+                "next": {"type": "string", "nullable": True},
+                "previous": {"type": "string", "nullable": True},
+                "results": schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                "name": self.cursor_query_param,
+                "required": False,
+                "in": "query",
+                "description": "The pagination cursor value.",
+                "schema": {"type": "string"},
+            },
+            {
+                "name": self.page_size_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Number of results to return per page.",
+                "schema": {"type": "integer"},
+            },
+        ]
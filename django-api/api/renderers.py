@@ -0,0 +1,68 @@
+"""JSON renderer and parser backed by orjson when it is installed.
+
+Both are drop-in replacements for DRF's JSONRenderer/JSONParser and produce the same
+bytes for the default settings (compact, UNICODE_JSON). Dates, times and datetimes
+are passed through to DRF's JSONEncoder so their formatting (e.g. millisecond
+datetimes with a trailing "Z") does not change; Decimal and the other non-native
+types take the same route. Anything orjson cannot handle (integers over 64 bits,
+indented output, ...) falls back to the stdlib implementation.
+
+NaN and Infinity are the exception: the stdlib encoder refuses them under
+STRICT_JSON (DRF's default) where orjson renders null.
+"""
+
+import io
+
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+_LINE_SEPARATORS = ("\u2028".encode(), "\u2029".encode())
+
+
+class FastJSONRenderer(JSONRenderer):
+    options = (orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS) if orjson else 0
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        if (
+            orjson is None
+            or self.ensure_ascii
+            or not self.compact
+            or self.get_indent(accepted_media_type, renderer_context or {}) is not None
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(data, default=self.encoder_class().default, option=self.options)
+        except TypeError:
+            # orjson.JSONEncodeError; the stdlib path renders it or raises the real error
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # Keep the output a strict javascript subset, as JSONRenderer does
+        if b"\xe2\x80" in ret:
+            ret = ret.replace(_LINE_SEPARATORS[0], b"\\u2028").replace(_LINE_SEPARATORS[1], b"\\u2029")
+        return ret
+
+
+class FastJSONParser(JSONParser):
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get("encoding", "utf-8")
+        if orjson is None or encoding.lower().replace("-", "") != "utf8":
+            return super().parse(stream, media_type, parser_context)
+
+        body = stream.read()
+        try:
+            return orjson.loads(body)
+        except orjson.JSONDecodeError:
+            # Let the stdlib decide: it accepts NaN when STRICT_JSON is off and words
+            # the error the way clients already expect
+            return super().parse(io.BytesIO(body), media_type, parser_context)
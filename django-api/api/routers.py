@@ -3,10 +3,12 @@ from api.authentication.viewsets import (
     LoginViewSet,
     ActiveSessionViewSet,
     LogoutViewSet,
+    RefreshViewSet,
 )
 from rest_framework import routers
 from api.user.viewsets import UserViewSet
 from api.user.viewsets import current_user
+from api.metrics import metrics
 from django.urls import path
 
 router = routers.SimpleRouter(trailing_slash=False)
@@ -21,7 +23,10 @@ router.register(r"checkSession", ActiveSessionViewSet, basename="check-session")
 
 router.register(r"logout", LogoutViewSet, basename="logout")
 
+router.register(r"refresh", RefreshViewSet, basename="refresh")
+
 urlpatterns = [
     *router.urls,
     path("me", current_user, name="current-user"),
+    path("metrics", metrics, name="metrics"),
 ]
@@ -0,0 +1,259 @@
+import io
+import threading
+from collections import OrderedDict
+from datetime import date, datetime, time, timezone
+from decimal import Decimal
+from unittest import mock, skipUnless
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, connections
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from rest_framework.utils.serializer_helpers import ReturnList
+
+from api import renderers
+from api.db.pool import ConnectionPool, PoolTimeout
+from api.db.replicas import ReplicaMiddleware, ReplicaRouter, stick_to_primary
+from api.renderers import FastJSONParser, FastJSONRenderer
+
+
+class FastJSONTest(SimpleTestCase):
+    payload = ReturnList(
+        [
+            OrderedDict(
+                [
+                    ("id", 1),
+                    ("fecha", date(2024, 5, 1)),
+                    ("hora", time(9, 30)),
+                    ("hora_precisa", time(9, 30, 0, 250)),
+                    ("creado", datetime(2024, 5, 1, 9, 30, 0, 123456, tzinfo=timezone.utc)),
+                    ("precio", Decimal("12.50")),
+                    ("nombre", "Ñandú \u2028 \u2029 🐶"),
+                    ("motivo", gettext_lazy("control")),
+                    ("tags", ("a", "b")),
+                    ("nested", {3: None, "ok": True, "ratio": 0.25}),
+                ]
+            )
+        ],
+        serializer=None,
+    )
+
+    def assert_same_bytes(self, data, accepted_media_type=None):
+        self.assertEqual(
+            FastJSONRenderer().render(data, accepted_media_type),
+            JSONRenderer().render(data, accepted_media_type),
+        )
+
+    def test_renders_the_same_bytes_as_json_renderer(self):
+        self.assert_same_bytes(self.payload)
+        self.assert_same_bytes({"detail": "x"})
+        self.assert_same_bytes([])
+        self.assertEqual(FastJSONRenderer().render(None), b"")
+
+    def test_falls_back_to_the_stdlib(self):
+        # indented output and integers orjson cannot encode
+        self.assert_same_bytes(self.payload, "application/json; indent=4")
+        self.assert_same_bytes({"big": 2 ** 70})
+        with mock.patch.object(renderers, "orjson", None):
+            self.assert_same_bytes(self.payload)
+
+    def test_parser(self):
+        parser = FastJSONParser()
+        self.assertEqual(parser.parse(io.BytesIO('{"a": [1, 2.5, "ñ"]}'.encode())), {"a": [1, 2.5, "ñ"]})
+
+        def error(p, body):
+            with self.assertRaises(ParseError) as raised:
+                p.parse(io.BytesIO(body))
+            return str(raised.exception.detail)
+
+        # Same errors as the stock parser, including STRICT_JSON's rejection of NaN
+        for body in (b'{"a": ', b'{"a": NaN}'):
+            self.assertEqual(error(parser, body), error(JSONParser(), body))
+
+
+class FakeConnection:
+    def __init__(self, broken=False):
+        self.broken = broken
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTest(SimpleTestCase):
+    def make_pool(self, **kwargs):
+        return ConnectionPool(reset=lambda c: not c.broken, **kwargs)
+
+    def test_reuses_up_to_max_size_and_closes_the_overflow(self):
+        pool = self.make_pool(max_size=1, max_overflow=1, timeout=0.05)
+        first, reused = pool.acquire(FakeConnection)
+        self.assertFalse(reused)
+        second, _ = pool.acquire(FakeConnection)
+        self.assertEqual(pool.stats()["overflow"], 1)
+
+        pool.release(first)
+        pool.release(second)
+        self.assertFalse(first.closed)
+        self.assertTrue(second.closed)
+        self.assertEqual(pool.acquire(FakeConnection), (first, True))
+
+        stats = pool.stats()
+        self.assertEqual((stats["in_use"], stats["idle"], stats["created"], stats["reused"], stats["discarded"]), (1, 0, 2, 1, 1))
+
+    def test_waits_for_a_connection_then_times_out(self):
+        pool = self.make_pool(max_size=1, max_overflow=0, timeout=2)
+        held, _ = pool.acquire(FakeConnection)
+        threading.Timer(0.05, pool.release, (held,)).start()
+        self.assertEqual(pool.acquire(FakeConnection), (held, True))
+
+        pool.timeout = 0.05
+        with self.assertRaises(PoolTimeout):
+            pool.acquire(FakeConnection)
+        stats = pool.stats()
+        self.assertEqual((stats["waits"], stats["timeouts"]), (2, 1))
+
+    def test_broken_and_failed_connections_free_their_slot(self):
+        pool = self.make_pool(max_size=1, max_overflow=0, timeout=0.05)
+        broken, _ = pool.acquire(lambda: FakeConnection(broken=True))
+        pool.release(broken)
+        self.assertTrue(broken.closed)
+
+        def refuse():
+            raise OSError("connection refused")
+
+        with self.assertRaises(OSError):
+            pool.acquire(refuse)
+        connection, reused = pool.acquire(FakeConnection)
+        self.assertFalse(reused)
+        pool.release(connection, discard=True)
+        self.assertEqual(pool.stats()["idle"], 0)
+
+
+@skipUnless(connection.vendor == "postgresql" and hasattr(connection, "health_check_enabled"), "api.db.postgresql only")
+class HealthCheckTest(TransactionTestCase):
+    def test_dropped_connection_is_replaced_before_the_next_query(self):
+        from django.db import close_old_connections
+
+        connection.settings_dict["CONN_HEALTH_CHECKS"] = True
+        connection.ensure_connection()
+        pid = connection.connection.get_backend_pid()
+        # Another session kills ours, as a server restart would
+        other = connections.create_connection("default")
+        try:
+            with other.cursor() as cursor:
+                cursor.execute("SELECT pg_terminate_backend(%s)", [pid])
+        finally:
+            other.close()
+
+        close_old_connections()  # request boundary
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_backend_pid()")
+            self.assertNotEqual(cursor.fetchone()[0], pid)
+
+
+@override_settings(DATABASE_REPLICAS=["replica1"], DATABASE_REPLICA_STICKY_SECONDS=60)
+class ReplicaRoutingTest(SimpleTestCase):
+    """Where reads go; the replica aliases are never connected to."""
+
+    router = ReplicaRouter()
+
+    def setUp(self):
+        cache.clear()
+
+    def request(self, method="get", token="Token a", view=None):
+        seen = []
+
+        def get_response(request):
+            seen.append(self.router.db_for_read(None))
+            if view is not None:
+                view()
+                seen.append(self.router.db_for_read(None))
+            return HttpResponse()
+
+        request = getattr(RequestFactory(), method)("/", HTTP_AUTHORIZATION=token)
+        ReplicaMiddleware(get_response)(request)
+        return seen
+
+    def test_safe_requests_read_from_replicas(self):
+        self.assertEqual(self.request(), ["replica1"])
+        self.assertEqual(self.request("head"), ["replica1"])
+        self.assertEqual(self.request("post"), ["default"])
+        # outside a request
+        self.assertEqual(self.router.db_for_read(None), "default")
+        self.assertEqual(self.router.db_for_write(None), "default")
+
+    def test_clients_read_their_writes_from_the_primary(self):
+        self.request("post", token="Token a")
+        self.assertEqual(self.request(token="Token a"), ["default"])
+        self.assertEqual(self.request(token="Token b"), ["replica1"])
+
+        with override_settings(DATABASE_REPLICA_STICKY_SECONDS=0):
+            self.request("patch", token="Token b")
+        self.assertEqual(self.request(token="Token b"), ["replica1"])
+
+    def test_issued_tokens_stick_to_the_primary(self):
+        def login(request):
+            stick_to_primary(request, "new")
+            return HttpResponse()
+
+        ReplicaMiddleware(login)(RequestFactory().post("/login"))
+        for header in ("new", "Bearer new", "Token new"):
+            self.assertEqual(self.request(token=header), ["default"])
+        self.assertEqual(self.request(token="Bearer other"), ["replica1"])
+
+    def test_writes_during_a_get_stick_to_the_primary(self):
+        self.assertEqual(self.request(view=lambda: self.router.db_for_write(None)), ["replica1", "default"])
+        self.assertEqual(self.request(), ["default"])
+
+    def test_streaming_responses_read_from_replicas_while_streaming(self):
+        def stream():
+            yield self.router.db_for_read(None).encode()
+
+        request = RequestFactory().get("/")
+        response = ReplicaMiddleware(lambda request: StreamingHttpResponse(stream()))(request)
+        self.assertEqual(self.router.db_for_read(None), "default")
+        self.assertEqual(b"".join(response.streaming_content), b"replica1")
+
+    def test_no_replicas(self):
+        with override_settings(DATABASE_REPLICAS=[]):
+            self.assertEqual(self.request(), ["default"])
+
+
+@skipUnless(settings.DATABASE_REPLICAS, "set DB_REPLICA_HOSTS (and DB_TEST_NAME on SQLite) to run")
+class ReplicaIntegrationTest(TransactionTestCase):
+    """Requests against a real replica alias, a test mirror of default."""
+
+    databases = "__all__"
+
+    # Lists answer with pages, whatever API_PAGINATION_COMPAT the run uses
+    @override_settings(API_PAGINATION={**settings.API_PAGINATION, "COMPAT": False})
+    def test_booking_then_listing(self):
+        from api.authentication.models import ActiveSession
+        from api.authentication.serializers.login import _generate_jwt_token
+        from api.user.models import User
+
+        cache.clear()
+        admin = User.objects.create_superuser(email="admin@clinic.test", password="pass")
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=ActiveSession.objects.create(user=admin, token=_generate_jwt_token(admin)).token)
+        url = reverse("clinic:dueno-list")
+        replica = connections[settings.DATABASE_REPLICAS[0]]
+
+        with CaptureQueriesContext(replica) as on_replica, CaptureQueriesContext(connection) as on_primary:
+            self.assertEqual(client.get(url).status_code, 200)
+        self.assertTrue(on_replica.captured_queries)
+        self.assertFalse(on_primary.captured_queries)
+
+        self.assertEqual(client.post(url, {"nombre": "Ana"}).status_code, 201)
+        with CaptureQueriesContext(replica) as on_replica:
+            response = client.get(url)
+        self.assertFalse(on_replica.captured_queries)
+        self.assertEqual([d["nombre"] for d in response.json()["results"]], ["Ana"])
@@ -11,6 +11,7 @@ from drf_spectacular.utils import OpenApiParameter
 from drf_spectacular.types import OpenApiTypes
 
 from api.user.serializers import UserSerializer
+from api.authentication.principal import get_principal, resolve_principal
 from api.clinic.serializers import (
     DuenoUpdateSerializer,
     RecepcionistaUpdateSerializer,
@@ -51,17 +52,15 @@ class CurrentUserSerializer(serializers.Serializer):
 def current_user(request):
     """Return the authenticated user's data (no id required)."""
     user = request.user
+    principal = get_principal(request)
+    if request.method in ("PUT", "PATCH"):
+        # request.user may be built from access token claims or a cached snapshot;
+        # write through the current row so stale flags are never saved back
+        user = User.objects.get(pk=user.pk)
+        principal = resolve_principal(user)
 
-    # determine role (Note: owners are not users in the current design)
-    role = None
-    if hasattr(user, "recepcionista_profile") and user.recepcionista_profile is not None:
-        role = "recepcionista"
-    elif hasattr(user, "veterinario_profile") and user.veterinario_profile is not None:
-        role = "veterinario"
-    elif user.is_superuser:
-        role = "admin"
-    else:
-        role = "user"
+    # role resolved by the authentication layer (Note: owners are not users in the current design)
+    role = principal.role or "user"
 
     payload = {
         "role": role,
@@ -78,12 +77,12 @@ def current_user(request):
     # enrich with profile fields for staff roles; owners are represented by Dueno objects
     try:
         if role == "recepcionista":
-            rec = user.recepcionista_profile
+            rec = principal.recepcionista
             payload["nombre"] = rec.nombre or (user.email.split("@")[0] if getattr(user, "email", None) else "")
             payload["telefono"] = rec.telefono or getattr(user, "telefono", None)
             payload["profile_id"] = getattr(rec, "idRecepcionista", None) or getattr(rec, "pk", None)
         elif role == "veterinario":
-            vet = user.veterinario_profile
+            vet = principal.veterinario
             payload["nombre"] = vet.nombre or (user.email.split("@")[0] if getattr(user, "email", None) else "")
             payload["telefono"] = getattr(user, "telefono", None)
             payload["profile_id"] = getattr(vet, "idVeterinario", None) or getattr(vet, "pk", None)
@@ -118,16 +117,16 @@ def current_user(request):
             pass
 
         # Then update role-specific profile fields if present (staff roles only)
-        if role == "recepcionista" and hasattr(user, "recepcionista_profile"):
-            rec = user.recepcionista_profile
+        if role == "recepcionista":
+            rec = principal.recepcionista
             profile_serializer = RecepcionistaUpdateSerializer(rec, data=request.data, partial=partial)
             profile_serializer.is_valid(raise_exception=True)
             profile_serializer.save()
             payload["nombre"] = rec.nombre or (user.email.split("@")[0] if getattr(user, "email", None) else "")
             payload["telefono"] = rec.telefono
 
-        if role == "veterinario" and hasattr(user, "veterinario_profile"):
-            vet = user.veterinario_profile
+        if role == "veterinario":
+            vet = principal.veterinario
             profile_serializer = VeterinarioUpdateSerializer(vet, data=request.data, partial=partial)
             profile_serializer.is_valid(raise_exception=True)
             profile_serializer.save()
@@ -148,13 +147,13 @@ def current_user(request):
 
         # Ensure profile_id / nombre reflect updated profile after save (staff roles)
         try:
-            if role == "recepcionista" and hasattr(user, "recepcionista_profile") and user.recepcionista_profile:
-                rec = user.recepcionista_profile
+            if role == "recepcionista":
+                rec = principal.recepcionista
                 payload["nombre"] = rec.nombre or payload.get("nombre")
                 payload["telefono"] = rec.telefono or payload.get("telefono")
                 payload["profile_id"] = getattr(rec, "idRecepcionista", None) or getattr(rec, "pk", None)
-            if role == "veterinario" and hasattr(user, "veterinario_profile") and user.veterinario_profile:
-                vet = user.veterinario_profile
+            if role == "veterinario":
+                vet = principal.veterinario
                 payload["nombre"] = vet.nombre or payload.get("nombre")
                 payload["profile_id"] = getattr(vet, "idVeterinario", None) or getattr(vet, "pk", None)
                 payload["telefono"] = getattr(user, "telefono", payload.get("telefono"))
@@ -200,7 +199,7 @@ class UserViewSet(
         if not user_id:
             raise ValidationError(self.error_message)
 
-        if self.request.user.pk != int(user_id) and not self.request.user.is_superuser:
+        if self.request.user.pk != int(user_id) and not get_principal(request).is_superuser:
             raise ValidationError(self.error_message)
 
         self.update(request)
@@ -0,0 +1,64 @@
+"""Shared bootstrap for the scripts in this folder.
+
+Every benchmark runs against a throwaway test database created from the configured
+`DATABASES["default"]` (use DB_ENGINE/DB_NAME/... to point it at Postgres or SQLite),
+so production data is never touched. Run them from the `django-api` folder, e.g.:
+
+    python -m benchmarks.token_lookup 10000 100000
+"""
+
+import os
+import statistics
+import sys
+import time
+from contextlib import contextmanager
+
+import django
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
+django.setup()
+
+
+@contextmanager
+def test_database():
+    """Create a fresh test database for the duration of the block."""
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    setup_test_environment()
+    old_name = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+def sizes_from_argv(default):
+    args = [int(a.replace("_", "")) for a in sys.argv[1:] if a.replace("_", "").isdigit()]
+    return args or list(default)
+
+
+def timed(fn, repeat):
+    """Call `fn` `repeat` times and return the per-call latencies in milliseconds."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def summarize(samples):
+    ordered = sorted(samples)
+    p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+    return "mean %.3f ms  p50 %.3f ms  p99 %.3f ms" % (
+        statistics.mean(ordered),
+        statistics.median(ordered),
+        p99,
+    )
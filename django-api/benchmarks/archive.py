@@ -0,0 +1,76 @@
+"""Hot-path latency before and after archiving consultas older than 90 days.
+
+    python -m benchmarks.archive [rows ...]   (default: 100000 300000)
+
+The seeded consultas, 200 a day, are moved to end 30 days from now, so archiving
+leaves Consulta with 90 days of history plus the appointments ahead. Timed through the
+test client as an admin: the first page of the consulta list, a mascota's last
+90 days (hot table only) and a mascota's whole history (hot and archive merged);
+plus counting Consulta, which stands for the full scans of exports and reports.
+Reads walking an index cost about the same either way; scans shrink with the table.
+"""
+
+import time as clock
+from datetime import date, timedelta
+
+from benchmarks._setup import sizes_from_argv, summarize, test_database, timed
+from benchmarks.serialization import seed
+
+AFTER_DAYS = 90
+
+
+def main():
+    from django.conf import settings
+    from django.db.models import F, Max
+    from django.urls import reverse
+    from rest_framework.test import APIClient
+
+    from api.authentication.models import ActiveSession
+    from api.authentication.serializers.login import _generate_jwt_token
+    from api.clinic import archive
+    from api.clinic.models import Consulta, ConsultaArchivada, Dueno, Mascota, Veterinario
+    from api.user.models import User
+
+    settings.CLINIC_ARCHIVE = {"AFTER_DAYS": AFTER_DAYS, "BATCH_SIZE": 5000}
+
+    with test_database():
+        admin = User.objects.create_superuser(email="bench@clinic.test", password="bench")
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=ActiveSession.objects.create(user=admin, token=_generate_jwt_token(admin)).token)
+
+        for rows in sizes_from_argv((100000, 300000)):
+            ConsultaArchivada.objects.all().delete()
+            Consulta.objects.all().delete()
+            Mascota.objects.all().delete()
+            Dueno.objects.all().delete()
+            Veterinario.objects.all().delete()
+            seed(rows)
+            # Twice, each time past the other dates, so no slot is ever taken twice midway
+            span = Consulta.objects.aggregate(last=Max("fecha"))["last"] - (date.today() + timedelta(days=30))
+            Consulta.objects.update(fecha=F("fecha") - span - timedelta(days=rows))
+            Consulta.objects.update(fecha=F("fecha") + timedelta(days=rows))
+            mascota = Consulta.objects.order_by("-fecha").values_list("mascota_id", flat=True).first()
+            history = reverse("clinic:mascota-consultas", args=[mascota])
+            requests = (
+                ("list page", reverse("clinic:consulta-list"), {"page_size": 50}),
+                ("mascota 90d", history, {"start_date": date.today() - timedelta(days=AFTER_DAYS)}),
+                ("mascota all", history, {}),
+            )
+
+            def run(label):
+                print("  %s (%d hot, %d archived)" % (label, Consulta.objects.count(), ConsultaArchivada.objects.count()))
+                for name, url, params in requests:
+                    assert client.get(url, params).status_code == 200
+                    print("    %-12s %s" % (name, summarize(timed(lambda: client.get(url, params), 30))))
+                print("    %-12s %s" % ("count", summarize(timed(Consulta.objects.count, 30))))
+
+            print("%d consultas" % rows)
+            run("before")
+            start = clock.perf_counter()
+            moved = archive.archive()
+            print("  archived %d in %.1f s" % (moved, clock.perf_counter() - start))
+            run("after")
+
+
+if __name__ == "__main__":
+    main()
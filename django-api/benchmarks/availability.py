@@ -0,0 +1,114 @@
+"""Per-slot `exists()` loop vs the batched availability engine.
+
+    python -m benchmarks.availability [vets ...]   (default: 5 20 50)
+
+Also times a 30-day range for every vet against one single-day call per day.
+The engine is timed with the availability cache disabled and then warm.
+"""
+
+import random
+from datetime import date, datetime, time, timedelta
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from benchmarks._setup import sizes_from_argv, summarize, test_database, timed
+
+REPEAT = 30
+RANGE_DAYS = 30
+
+
+def legacy_availability(vets, fecha):
+    # The loop VeterinarioViewSet.with_availability used before the engine existed
+    from api.clinic.models import Consulta
+
+    out = {}
+    for v in vets:
+        slots = []
+        if v.work_start and v.work_end:
+            cur = datetime.combine(fecha, v.work_start)
+            end_dt = datetime.combine(fecha, v.work_end)
+            while cur < end_dt:
+                hora_only = cur.time()
+                if not Consulta.objects.filter(veterinario=v, fecha=fecha, hora=hora_only).exists():
+                    slots.append(hora_only.strftime("%H:%M"))
+                cur = cur + timedelta(hours=1)
+        out[v.pk] = slots
+    return out
+
+
+def seed(vets, fecha, days=1):
+    from api.clinic.models import Consulta, Dueno, Mascota, Veterinario
+
+    dueno = Dueno.objects.create(nombre="bench")
+    mascota = Mascota.objects.create(nombre="bench", especie="perro", dueno=dueno)
+    created = [
+        Veterinario.objects.create(nombre=f"vet {i}", work_start=time(9), work_end=time(17))
+        for i in range(vets)
+    ]
+    consultas = []
+    for vet in created:
+        for day in range(days):
+            for hour in random.sample(range(9, 17), 4):
+                consultas.append(Consulta(
+                    motivo="bench", fecha=fecha + timedelta(days=day), hora=time(hour), veterinario=vet, mascota=mascota
+                ))
+    Consulta.objects.bulk_create(consultas)
+    return created
+
+
+def measure(label, fn):
+    fn()  # warm up, so the counts below are those of a steady-state call
+    with CaptureQueriesContext(connection) as ctx:
+        fn()
+    print("  %-7s %4d queries | %s" % (label, len(ctx.captured_queries), summarize(timed(fn, REPEAT))))
+
+
+def uncached(fn):
+    from api.clinic.cache import availability_cache
+
+    def run():
+        timeout, availability_cache.timeout = availability_cache.timeout, 0
+        try:
+            return fn()
+        finally:
+            availability_cache.timeout = timeout
+
+    return run
+
+
+def main():
+    from api.clinic.availability import availability_for_date, availability_for_range
+    from api.clinic.cache import availability_cache
+    from api.clinic.models import Consulta, Veterinario
+
+    fecha = date.today()
+    with test_database():
+        availability_cache.clear()
+        for vets in sizes_from_argv((5, 20, 50)):
+            Consulta.objects.all().delete()
+            Veterinario.objects.all().delete()
+            seed(vets, fecha)
+            all_vets = list(Veterinario.objects.all())
+
+            assert legacy_availability(all_vets, fecha) == availability_for_date(all_vets, fecha)
+            print("%d vets x 8 hourly slots" % vets)
+            measure("legacy", lambda: legacy_availability(all_vets, fecha))
+            measure("engine", uncached(lambda: availability_for_date(all_vets, fecha)))
+            measure("cached", lambda: availability_for_date(all_vets, fecha))
+
+            Consulta.objects.all().delete()
+            Veterinario.objects.all().delete()
+            seed(vets, fecha, days=RANGE_DAYS)
+            all_vets = list(Veterinario.objects.all())
+            end = fecha + timedelta(days=RANGE_DAYS - 1)
+            days = [fecha + timedelta(days=n) for n in range(RANGE_DAYS)]
+
+            print("%d vets x %d days" % (vets, RANGE_DAYS))
+            measure("per-day", uncached(lambda: [availability_for_date(all_vets, day) for day in days]))
+            measure("range", uncached(lambda: availability_for_range(all_vets, fecha, end)))
+            measure("cached", lambda: availability_for_range(all_vets, fecha, end))
+
+
+if __name__ == "__main__":
+    main()
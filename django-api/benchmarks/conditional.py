@@ -0,0 +1,45 @@
+"""Latency of a full consulta list page vs the 304 answering a revalidation.
+
+    python -m benchmarks.conditional [rows ...]   (default: 1000 10000)
+
+Requests go through the test client as an admin for the first page, with every
+field and with `?fields=`; the 304 run sends back the ETag of the first response.
+"""
+
+from benchmarks._setup import sizes_from_argv, summarize, test_database, timed
+from benchmarks.serialization import seed
+
+
+def main():
+    from django.urls import reverse
+    from rest_framework.test import APIClient
+
+    from api.authentication.models import ActiveSession
+    from api.authentication.serializers.login import _generate_jwt_token
+    from api.clinic.models import Consulta, Dueno, Mascota, Veterinario
+    from api.user.models import User
+
+    with test_database():
+        admin = User.objects.create_superuser(email="bench@clinic.test", password="bench")
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=ActiveSession.objects.create(user=admin, token=_generate_jwt_token(admin)).token)
+        url = reverse("clinic:consulta-list")
+
+        for rows in sizes_from_argv((1000, 10000)):
+            Consulta.objects.all().delete()
+            Mascota.objects.all().delete()
+            Dueno.objects.all().delete()
+            Veterinario.objects.all().delete()
+            seed(rows)
+
+            print("%d consultas" % rows)
+            for label, params in (("page", {"page_size": 50}), ("agenda", {"fields": "hora,mascota.nombre"})):
+                etag = client.get(url, params)["ETag"]
+                full = timed(lambda: client.get(url, params), 20)
+                cached = timed(lambda: client.get(url, params, HTTP_IF_NONE_MATCH=etag), 20)
+                print("  %-6s 200 %s" % (label, summarize(full)))
+                print("  %-6s 304 %s" % (label, summarize(cached)))
+
+
+if __name__ == "__main__":
+    main()
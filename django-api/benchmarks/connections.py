@@ -0,0 +1,67 @@
+"""Request latency with per-request, persistent and pooled database connections.
+
+    python -m benchmarks.connections [threads ...]   (default: 4 16)
+
+Needs PostgreSQL with ENGINE api.db.postgresql (DB_ENGINE, DB_HOST, ...); on
+SQLite connecting costs next to nothing and the numbers say little. Every thread
+sends REQUESTS requests for the veterinario list through the test client, so
+connections are opened and closed at the request boundaries as under gunicorn.
+"""
+
+import threading
+
+from benchmarks._setup import sizes_from_argv, summarize, test_database, timed
+
+REQUESTS = 200
+
+MODES = (
+    ("reconnect", {"CONN_MAX_AGE": 0, "CONN_HEALTH_CHECKS": False, "POOL": None}),
+    ("persistent", {"CONN_MAX_AGE": 60, "CONN_HEALTH_CHECKS": False, "POOL": None}),
+    ("+ health", {"CONN_MAX_AGE": 60, "CONN_HEALTH_CHECKS": True, "POOL": None}),
+    ("pool 2+2", {"CONN_MAX_AGE": 0, "CONN_HEALTH_CHECKS": True, "POOL": {"MAX_SIZE": 2, "MAX_OVERFLOW": 2}}),
+)
+
+
+def main():
+    from django.db import connection, connections
+    from django.urls import reverse
+    from rest_framework.test import APIClient
+
+    from api.authentication.models import ActiveSession
+    from api.authentication.serializers.login import _generate_jwt_token
+    from api.clinic.models import Veterinario
+    from api.db import pool
+    from api.user.models import User
+
+    print("%s (%s)" % (connection.vendor, connection.settings_dict["ENGINE"]))
+    with test_database():
+        admin = User.objects.create_superuser(email="bench@clinic.test", password="bench")
+        token = ActiveSession.objects.create(user=admin, token=_generate_jwt_token(admin)).token
+        Veterinario.objects.bulk_create([Veterinario(nombre="vet %d" % i) for i in range(10)])
+        url = reverse("clinic:veterinario-list")
+
+        for threads in sizes_from_argv((4, 16)):
+            print("%d threads x %d requests" % (threads, REQUESTS))
+            for label, config in MODES:
+                connections.settings["default"].update(config)
+                samples = []
+
+                def worker():
+                    client = APIClient()
+                    client.credentials(HTTP_AUTHORIZATION=token)
+                    client.get(url)  # warm up
+                    samples.extend(timed(lambda: client.get(url), REQUESTS))
+                    connections["default"].close()
+
+                workers = [threading.Thread(target=worker) for _ in range(threads)]
+                for thread in workers:
+                    thread.start()
+                for thread in workers:
+                    thread.join()
+                print("  %-10s %s" % (label, summarize(samples)))
+                if config["POOL"]:
+                    print("             %s" % pool.stats().get("default"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Peak Python memory and throughput of the streaming consulta export.
+
+    python -m benchmarks.export [rows ...]   (default: 1000 10000 100000)
+
+The peak (tracemalloc) of streaming the export should not grow with the number of
+rows; the in-memory JSON list of the same rows is shown for comparison.
+"""
+
+import time
+import tracemalloc
+
+from benchmarks._setup import sizes_from_argv, test_database
+from benchmarks.serialization import seed
+
+
+def peak(fn):
+    """(result, peak MiB, seconds) of `fn()`."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    _, top = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, top / 2 ** 20, elapsed
+
+
+def main():
+    from rest_framework.renderers import JSONRenderer
+
+    from api.clinic import export
+    from api.clinic.models import Consulta, Dueno, Mascota, Veterinario
+    from api.clinic.projection import projection_for
+    from api.clinic.serializers import ConsultaSerializer
+
+    projection = projection_for(ConsultaSerializer)
+    ordered = Consulta.objects.order_by("fecha", "hora", "idConsulta")
+
+    def stream(output):
+        response = export.export_response(ordered, export.CONSULTA_COLUMNS, output, "consultas")
+        return sum(len(chunk) for chunk in response.streaming_content)
+
+    def json_list():
+        return len(JSONRenderer().render(projection.data(ordered)))
+
+    with test_database():
+        for rows in sizes_from_argv((1000, 10000, 100000)):
+            Consulta.objects.all().delete()
+            Mascota.objects.all().delete()
+            Dueno.objects.all().delete()
+            Veterinario.objects.all().delete()
+            seed(rows)
+
+            print("%d consultas" % rows)
+            for label, fn in (("csv", lambda: stream("csv")), ("ndjson", lambda: stream("ndjson")), ("json list", json_list)):
+                size, mib, seconds = peak(fn)
+                print("  %-9s peak %7.2f MiB  %8.0f rows/s  (%.1f MiB out)" % (label, mib, rows / seconds, size / 2 ** 20))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Latency and payload of full consulta rows vs the agenda fieldset.
+
+    python -m benchmarks.fieldsets [rows ...]   (default: 1000 10000)
+
+Renders every consulta through the projection (the default list path) and through
+the serializers with only(), with all fields and with
+`?fields=hora,veterinario,mascota.nombre`.
+"""
+
+from benchmarks._setup import sizes_from_argv, summarize, test_database, timed
+from benchmarks.serialization import seed
+
+AGENDA = "hora,veterinario,mascota.nombre"
+
+
+def main():
+    from rest_framework.renderers import JSONRenderer
+
+    from api.clinic.fieldsets import _fieldset, restrict, trim
+    from api.clinic.models import Consulta, Dueno, Mascota, Veterinario
+    from api.clinic.projection import projection_for
+    from api.clinic.serializers import ConsultaSerializer
+
+    renderer = JSONRenderer()
+    agenda = _fieldset(ConsultaSerializer, AGENDA, False)
+    ordered = Consulta.objects.for_listing().order_by("fecha", "hora", "idConsulta")
+
+    def projected(fieldset):
+        return renderer.render(projection_for(ConsultaSerializer, fieldset).data(ordered))
+
+    def serialized(fieldset):
+        queryset = ordered.all() if fieldset is None else restrict(ordered, ConsultaSerializer, fieldset)
+        serializer = ConsultaSerializer(queryset, many=True)
+        if fieldset is not None:
+            trim(serializer, fieldset)
+        return renderer.render(serializer.data)
+
+    with test_database():
+        for rows in sizes_from_argv((1000, 10000)):
+            Consulta.objects.all().delete()
+            Mascota.objects.all().delete()
+            Dueno.objects.all().delete()
+            Veterinario.objects.all().delete()
+            seed(rows)
+            Consulta.objects.update(sintomas="tos " * 40, tratamiento="reposo " * 40)
+
+            repeat = max(3, 20000 // rows)
+            print("%d consultas" % rows)
+            for path, render in (("projection", projected), ("serializer", serialized)):
+                for label, fieldset in (("all fields", None), ("agenda", agenda)):
+                    size = len(render(fieldset))
+                    samples = timed(lambda: render(fieldset), repeat)
+                    print("  %-10s %-10s %8.1f KiB  %s" % (path, label, size / 1024, summarize(samples)))
+
+
+if __name__ == "__main__":
+    main()
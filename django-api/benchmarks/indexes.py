@@ -0,0 +1,76 @@
+"""Query plan and latency of the Consulta access paths on a large table.
+
+    python -m benchmarks.indexes [rows ...]   (default: 1000000)
+
+After seeding and ANALYZE, prints for every access path used by the clinic
+endpoints the index the planner picked (EXPLAIN), flagging those that differ
+from the expected one, and the latency of fetching the first page of 50 rows.
+"""
+
+from datetime import date, timedelta
+
+from benchmarks._setup import sizes_from_argv, summarize, test_database, timed
+from benchmarks.serialization import seed
+
+PAGE = 50
+
+
+def access_paths(vet_id, mascota_id, dueno_id, day):
+    """(label, queryset, expected index) for the hot Consulta queries in viewsets.py."""
+    from api.clinic.models import Consulta
+
+    newest = ("-fecha", "-hora", "-idConsulta")
+    return (
+        ("vet agenda", Consulta.objects.filter(veterinario_id=vet_id).order_by("fecha", "hora", "idConsulta"),
+         "consulta_vet_fecha_idx"),
+        ("vet day", Consulta.objects.filter(veterinario_id=vet_id, fecha=day).order_by("hora"),
+         "consulta_vet_fecha_idx"),
+        ("vet upcoming", Consulta.objects.filter(veterinario_id=vet_id, fecha__gte=day, asistio=False),
+         "consulta_vet_fecha_idx"),
+        ("mascota history", Consulta.objects.filter(mascota_id=mascota_id).order_by(*newest),
+         "consulta_mascota_fecha_idx"),
+        ("mascota attended", Consulta.objects.filter(mascota_id=mascota_id, asistio=True).order_by(*newest),
+         "consulta_mascota_fecha_idx"),
+        ("dueno timeline", Consulta.objects.filter(dueno_id=dueno_id).order_by(*newest),
+         "consulta_dueno_fecha_idx"),
+        ("dueno via join", Consulta.objects.filter(mascota__dueno_id=dueno_id).order_by(*newest),
+         "mascota_dueno_idx"),
+        ("date range", Consulta.objects.filter(fecha__range=(day, day + timedelta(days=7))).order_by("fecha", "hora", "idConsulta"),
+         "consulta_fecha_hora_idx"),
+        ("recent", Consulta.objects.order_by("-fecha", "-hora", "-idConsulta"), "consulta_fecha_hora_idx"),
+        ("availability",
+         Consulta.objects.filter(veterinario_id=vet_id, fecha__range=(day, day + timedelta(days=14)), hora__isnull=False, cancelada=False),
+         "consulta_vet_fecha_idx"),
+    )
+
+
+def main():
+    from django.db import connection
+
+    from api.clinic.models import Consulta, Dueno, Mascota, Veterinario
+
+    with test_database():
+        for rows in sizes_from_argv((1000000,)):
+            Consulta.objects.all().delete()
+            Mascota.objects.all().delete()
+            Dueno.objects.all().delete()
+            Veterinario.objects.all().delete()
+            seed(rows)
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE")
+
+            vet_id = Veterinario.objects.order_by("pk").values_list("pk", flat=True)[0]
+            mascota_id, dueno_id = Mascota.objects.order_by("pk").values_list("pk", "dueno_id")[0]
+            day = date.today() - timedelta(days=180)
+            print("%d consultas" % rows)
+            for label, queryset, index in access_paths(vet_id, mascota_id, dueno_id, day):
+                page = queryset[:PAGE]
+                plan = page.explain()
+                flag = "" if index in plan else "  <-- expected %s" % index
+                print("  %-16s %s%s" % (label, summarize(timed(lambda: list(page.all()), 20)), flag))
+                for line in plan.splitlines():
+                    print("      " + line)
+
+
+if __name__ == "__main__":
+    main()
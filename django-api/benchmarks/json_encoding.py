@@ -0,0 +1,44 @@
+"""Encode throughput of JSONRenderer vs FastJSONRenderer on ConsultaSerializer output.
+
+    python -m benchmarks.json_encoding [rows ...]   (default: 1000 10000 50000)
+"""
+
+from benchmarks._setup import sizes_from_argv, test_database, timed
+from benchmarks.serialization import seed
+
+
+def main():
+    from rest_framework.renderers import JSONRenderer
+
+    from api.clinic.models import Consulta, Dueno, Mascota, Veterinario
+    from api.clinic.serializers import ConsultaSerializer
+    from api.renderers import FastJSONRenderer, orjson
+
+    if orjson is None:
+        print("orjson is not installed; FastJSONRenderer falls back to the stdlib")
+
+    with test_database():
+        for rows in sizes_from_argv((1000, 10000, 50000)):
+            Consulta.objects.all().delete()
+            Mascota.objects.all().delete()
+            Dueno.objects.all().delete()
+            Veterinario.objects.all().delete()
+            seed(rows)
+            # Serialized once; only the encoding step is timed
+            data = ConsultaSerializer(Consulta.objects.for_listing(), many=True).data
+            stock, fast = JSONRenderer(), FastJSONRenderer()
+            body = stock.render(data)
+            assert fast.render(data) == body
+
+            repeat = max(3, 50000 // rows)
+            print("%d consultas, %.1f MB" % (rows, len(body) / 1e6))
+            for label, renderer in (("stdlib", stock), ("orjson", fast)):
+                best = min(timed(lambda: renderer.render(data), repeat))
+                print(
+                    "  %-7s %8.1f MB/s %10.0f rows/s  (best of %d: %.2f ms)"
+                    % (label, len(body) / 1e6 / (best / 1000), rows / best * 1000, repeat, best)
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Page fetch latency of keyset pagination vs LIMIT/OFFSET at growing depths.
+
+    python -m benchmarks.pagination [rows ...]   (default: 10000 100000)
+
+Both paths fetch 50 consultas ordered by (fecha, hora, idConsulta) through the
+projection, starting at the first row, the middle and the last page.
+"""
+
+from urllib.parse import parse_qs, urlsplit
+
+from benchmarks._setup import sizes_from_argv, summarize, test_database, timed
+from benchmarks.serialization import seed
+
+PAGE_SIZE = 50
+
+
+def main():
+    from rest_framework.request import Request
+    from rest_framework.test import APIRequestFactory
+
+    from api.clinic.models import Consulta, Dueno, Mascota, Veterinario
+    from api.clinic.projection import projection_for
+    from api.clinic.serializers import ConsultaSerializer
+    from api.pagination import Cursor, KeysetPagination
+
+    projection = projection_for(ConsultaSerializer)
+    ordered = Consulta.objects.order_by("fecha", "hora", "idConsulta")
+    factory = APIRequestFactory()
+
+    def keyset_page(cursor):
+        params = {"page_size": PAGE_SIZE, "cursor": cursor} if cursor else {"page_size": PAGE_SIZE}
+        rows = KeysetPagination().paginate_queryset(projection.values(ordered), Request(factory.get("/consultas", params)))
+        return projection.convert_many(rows)
+
+    def offset_page(offset):
+        return projection.convert_many(projection.values(ordered)[offset : offset + PAGE_SIZE])
+
+    def cursor_at(offset):
+        """The cursor a client walking the list would hold before row `offset`."""
+        if offset == 0:
+            return None
+        paginator = KeysetPagination()
+        paginator.paginate_queryset(ordered, Request(factory.get("/consultas", {"page_size": 1})))
+        url = paginator.encode_cursor(Cursor(reverse=False, position=paginator._position(ordered[offset - 1])))
+        return parse_qs(urlsplit(url).query)["cursor"][0]
+
+    with test_database():
+        for rows in sizes_from_argv((10000, 100000)):
+            Consulta.objects.all().delete()
+            Mascota.objects.all().delete()
+            Dueno.objects.all().delete()
+            Veterinario.objects.all().delete()
+            seed(rows)
+
+            print("%d consultas, %d per page" % (rows, PAGE_SIZE))
+            for offset in (0, rows // 2, rows - PAGE_SIZE):
+                cursor = cursor_at(offset)
+                assert keyset_page(cursor) == offset_page(offset)
+                print("  row %-8d keyset  %s" % (offset, summarize(timed(lambda: keyset_page(cursor), 50))))
+                print("  row %-8d offset  %s" % (offset, summarize(timed(lambda: offset_page(offset), 50))))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""Clinical notes search: the full-text index vs a case-insensitive scan.
+
+    python -m benchmarks.search [rows ...]   (default: 10000 100000)
+
+One consulta in 100 mentions "fiebre" and a single one "parvovirus"; both paths
+return the first page of 50 hits. The scan is what backends without a full-text
+index fall back to: it stops early on common words but reads the whole table for
+rare ones, while the index costs grow with the number of hits it ranks.
+"""
+
+from benchmarks._setup import sizes_from_argv, summarize, test_database, timed
+from benchmarks.serialization import seed
+
+
+def main():
+    from django.db.models import F, Value
+    from django.db.models.functions import Concat
+
+    from api.clinic import search
+    from api.clinic.models import Consulta, Dueno, Mascota, Veterinario
+
+    indexed = search._search_function
+
+    with test_database():
+        for rows in sizes_from_argv((10000, 100000)):
+            Consulta.objects.all().delete()
+            Mascota.objects.all().delete()
+            Dueno.objects.all().delete()
+            Veterinario.objects.all().delete()
+            seed(rows)
+            Consulta.objects.update(sintomas=Concat(Value("tos leve, apetito normal, control "), F("pk"), output_field=Consulta._meta.get_field("sintomas")))
+            Consulta.objects.annotate(bucket=F("pk") % 100).filter(bucket=0).update(sintomas="fiebre alta y decaimiento")
+            Consulta.objects.filter(pk=Consulta.objects.order_by("pk").values("pk")[:1]).update(tratamiento="parvovirus")
+
+            print("%d consultas (%s)" % (rows, indexed().__name__))
+            for word in ("fiebre", "parvovirus"):
+                for label, fn in (("index", indexed()), ("scan", search._scan)):
+                    hits = len(fn(word, 50, 0))
+                    samples = timed(lambda: fn(word, 50, 0), 20)
+                    print("  %-10s %-6s %3d hits  %s" % (word, label, hits, summarize(samples)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Rows/sec of ConsultaSerializer vs its Projection, including query and rendering.
+
+    python -m benchmarks.serialization [rows ...]   (default: 1000 10000 100000)
+"""
+
+from datetime import date, time, timedelta
+
+from benchmarks._setup import sizes_from_argv, test_database, timed
+
+
+def seed(rows):
+    from api.clinic.models import Consulta, Dueno, Mascota, Veterinario
+
+    vets = [Veterinario.objects.create(nombre=f"vet {i}") for i in range(20)]
+    # Re-read after bulk_create: SQLite does not hand back the primary keys
+    Dueno.objects.bulk_create([Dueno(nombre=f"dueño {i}", telefono="555") for i in range(max(1, rows // 10))])
+    duenos = list(Dueno.objects.order_by("pk"))
+    Mascota.objects.bulk_create(
+        [Mascota(nombre=f"mascota {i}", especie="perro", edad=i % 15, dueno=duenos[i % len(duenos)]) for i in range(max(1, rows // 4))]
+    )
+    mascotas = list(Mascota.objects.order_by("pk"))
+    start = date.today() - timedelta(days=365)
+    Consulta.objects.bulk_create(
+        [
+            Consulta(
+                motivo="control",
+                descripcion="revisión general",
+                fecha=start + timedelta(days=i // 200),
+                hora=time(8 + (i // 20) % 10),
+                asistio=(None, True, False)[i % 3],
+                veterinario=vets[i % len(vets)],
+                mascota=mascotas[i % len(mascotas)],
+                dueno_id=mascotas[i % len(mascotas)].dueno_id,
+            )
+            for i in range(rows)
+        ],
+        batch_size=2000,
+    )
+
+
+def main():
+    from rest_framework.renderers import JSONRenderer
+
+    from api.clinic.models import Consulta, Dueno, Mascota, Veterinario
+    from api.clinic.projection import projection_for
+    from api.clinic.serializers import ConsultaSerializer
+
+    renderer = JSONRenderer()
+    projection = projection_for(ConsultaSerializer)
+
+    def serializers_path():
+        return renderer.render(ConsultaSerializer(Consulta.objects.for_listing(), many=True).data)
+
+    def projection_path():
+        return renderer.render(projection.data(Consulta.objects.all()))
+
+    with test_database():
+        for rows in sizes_from_argv((1000, 10000, 100000)):
+            Consulta.objects.all().delete()
+            Mascota.objects.all().delete()
+            Dueno.objects.all().delete()
+            Veterinario.objects.all().delete()
+            seed(rows)
+            assert serializers_path() == projection_path()
+
+            repeat = max(1, 20000 // rows)
+            print("%d consultas" % rows)
+            for label, fn in (("serializer", serializers_path), ("projection", projection_path)):
+                samples = timed(fn, repeat)
+                best = min(samples)
+                print("  %-10s %10.0f rows/s  (best of %d: %.1f ms)" % (label, rows / best * 1000, repeat, best))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""Session lookup latency: plain `token` column vs indexed `token_digest`.
+
+    python -m benchmarks.token_lookup [rows ...]   (default: 10000 100000 1000000)
+"""
+
+import random
+import secrets
+
+from benchmarks._setup import sizes_from_argv, summarize, test_database, timed
+
+LOOKUPS = 200
+BATCH_SIZE = 5000
+
+
+def seed(user, rows):
+    from api.authentication.models import ActiveSession
+
+    tokens = []
+    pending = []
+    for _ in range(rows):
+        # same length as the HS256 tokens issued by the login endpoint
+        token = secrets.token_urlsafe(110)[:147]
+        tokens.append(token)
+        pending.append(ActiveSession(user=user, token=token, token_digest=ActiveSession.digest(token)))
+        if len(pending) == BATCH_SIZE:
+            ActiveSession.objects.bulk_create(pending)
+            pending = []
+    ActiveSession.objects.bulk_create(pending)
+    return tokens
+
+
+def main():
+    from api.authentication.models import ActiveSession
+    from api.user.models import User
+
+    with test_database():
+        user = User.objects.create_user(email="bench@example.com", password="bench")
+        tokens = []
+        for rows in sizes_from_argv((10_000, 100_000, 1_000_000)):
+            tokens += seed(user, rows - len(tokens))
+            sample = random.sample(tokens, LOOKUPS)
+
+            it = iter(sample)
+            by_token = timed(lambda: ActiveSession.objects.get(token=next(it)), LOOKUPS)
+            it = iter(sample)
+            by_digest = timed(
+                lambda: ActiveSession.objects.get(token_digest=ActiveSession.digest(next(it))), LOOKUPS
+            )
+
+            print("%9d rows | token:  %s" % (rows, summarize(by_token)))
+            print("%9d rows | digest: %s" % (rows, summarize(by_digest)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Per-veterinario monthly counts: live GROUP BY over Consulta vs VetDailyStats.
+
+    python -m benchmarks.vet_stats [rows ...]   (default: 10000 100000)
+
+Also times saving a consulta whose motivo changed (no stats write) and one whose
+asistio changed (one UPDATE of its daily row).
+"""
+
+from datetime import date, timedelta
+
+from benchmarks._setup import sizes_from_argv, summarize, test_database, timed
+from benchmarks.serialization import seed
+
+
+def main():
+    from django.db.models import Count, Q, Sum
+
+    from api.clinic import stats
+    from api.clinic.models import Consulta, Dueno, Mascota, VetDailyStats, Veterinario
+
+    end = date.today()
+    start = end - timedelta(days=30)
+
+    def live():
+        return list(
+            Consulta.objects.filter(fecha__range=(start, end), cancelada=False)
+            .values("veterinario_id")
+            .annotate(
+                booked=Count("pk"),
+                attended=Count("pk", filter=Q(asistio=True)),
+                no_show=Count("pk", filter=Q(asistio=False)),
+                pending=Count("pk", filter=Q(asistio__isnull=True)),
+            )
+            .order_by()
+        )
+
+    def from_stats():
+        return list(
+            VetDailyStats.objects.filter(fecha__range=(start, end))
+            .values("veterinario_id")
+            .annotate(**{name: Sum(name) for name in stats.COUNTERS})
+            .order_by()
+        )
+
+    with test_database():
+        for rows in sizes_from_argv((10000, 100000)):
+            Consulta.objects.all().delete()
+            Mascota.objects.all().delete()
+            Dueno.objects.all().delete()
+            Veterinario.objects.all().delete()
+            seed(rows)
+            stats.rebuild()
+
+            consulta = Consulta.objects.order_by("-fecha").first()
+            flips = iter(range(10 ** 9))
+
+            def edit_motivo():
+                consulta.motivo = "control %d" % next(flips)
+                consulta.save()
+
+            def edit_asistio():
+                consulta.asistio = bool(next(flips) % 2)
+                consulta.save()
+
+            print("%d consultas, %d daily rows" % (rows, VetDailyStats.objects.count()))
+            for label, fn in (("live", live), ("vet stats", from_stats), ("save motivo", edit_motivo), ("save asistio", edit_asistio)):
+                print("  %-12s %s" % (label, summarize(timed(fn, 50))))
+
+
+if __name__ == "__main__":
+    main()
@@ -60,6 +60,8 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.security.SecurityMiddleware",
+    # Before anything that reads the database
+    "api.db.replicas.ReplicaMiddleware",
     # "whitenoise.middleware.WhiteNoiseMiddleware",  # Uncomment for production
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -94,15 +96,74 @@ WSGI_APPLICATION = "core.wsgi.application"
 
 DATABASES = {
     'default': {
-        'ENGINE': env('DB_ENGINE', default='django.db.backends.postgresql'),
+        # django.db.backends.postgresql plus connection health checks and pooling
+        # (see api/db/postgresql/base.py)
+        'ENGINE': env('DB_ENGINE', default='api.db.postgresql'),
         # AQUÍ ESTABA EL ERROR: Cambiamos 'DB_DATABASE' por 'DB_NAME'
         'NAME': env('DB_NAME', default='mi_base_datos'),
         'USER': env('DB_USER', default='usuario_admin'),
         'PASSWORD': env('DB_PASSWORD', default='16C5313UXXF'),
         'HOST': env('DB_HOST', default='db-postgres'),
         'PORT': env('DB_PORT', default='5432'),
+        # Keep each thread's connection for this many seconds instead of reconnecting
+        # on every request; with health checks a connection the server dropped is
+        # replaced before it fails a query
+        'CONN_MAX_AGE': int(env('DB_CONN_MAX_AGE', default=60)),
+        'CONN_HEALTH_CHECKS': env('DB_CONN_HEALTH_CHECKS', default='1') not in ('0', 'false', 'False'),
+        # Share connections between the threads of a worker (when MAX_SIZE > 0):
+        # MAX_SIZE stay open, MAX_OVERFLOW more under load, TIMEOUT seconds of waiting
+        # for one before the request fails. Stats in the metrics endpoint (db_pool)
+        'POOL': {
+            'MAX_SIZE': int(env('DB_POOL_MAX_SIZE', default=0)),
+            'MAX_OVERFLOW': int(env('DB_POOL_MAX_OVERFLOW', default=4)),
+            'TIMEOUT': float(env('DB_POOL_TIMEOUT', default=5)),
+        },
+        # SQLite tests default to a shared in-memory database, which cannot take the
+        # concurrent writers of the contention tests; set a file name to run them
+        'TEST': {'NAME': env('DB_TEST_NAME', default=None)},
     }
 }
+
+# Read replicas: comma-separated hosts, each one a "replicaN" alias with the
+# credentials of default. Safe requests read from a random replica unless their
+# client wrote in the last DB_REPLICA_STICKY_SECONDS (see api/db/replicas.py).
+# For a local try, any host on SQLite makes a second alias on the same file.
+DATABASE_REPLICAS = []
+for _host in filter(None, (h.strip() for h in env('DB_REPLICA_HOSTS', default='').split(','))):
+    DATABASE_REPLICAS.append('replica%d' % (len(DATABASE_REPLICAS) + 1))
+    DATABASES[DATABASE_REPLICAS[-1]] = {**DATABASES['default'], 'HOST': _host, 'TEST': {'MIRROR': 'default'}}
+DATABASE_ROUTERS = ['api.db.replicas.ReplicaRouter']
+DATABASE_REPLICA_STICKY_SECONDS = int(env('DB_REPLICA_STICKY_SECONDS', default=5))
+
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+# The local-memory default is private to each worker process; point CACHE_BACKEND at a
+# shared cache (e.g. django.core.cache.backends.memcached.PyMemcacheCache) when running
+# several workers so invalidations reach all of them.
+
+CACHES = {
+    'default': {
+        'BACKEND': env('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': env('CACHE_LOCATION', default='clinic'),
+    }
+}
+if CACHES['default']['BACKEND'].endswith('LocMemCache'):
+    # The built-in limit of 300 keys is below a single month of availability entries
+    CACHES['default']['OPTIONS'] = {'MAX_ENTRIES': int(env('CACHE_MAX_ENTRIES', default=20000))}
+
+AUTHENTICATION_BACKENDS = ["api.authentication.backends.PooledModelBackend"]
+
+# Password hashing at the API login runs in a dedicated process pool; the admin login
+# and other authenticate() callers hash inline. When WORKERS + QUEUE_LIMIT API logins
+# are already in flight, new ones get a 429 with Retry-After: RETRY_AFTER.
+# WORKERS=0 hashes inline in the request thread.
+LOGIN_HASH_POOL = {
+    "WORKERS": int(env("LOGIN_HASH_WORKERS", default=2)),
+    "QUEUE_LIMIT": int(env("LOGIN_HASH_QUEUE_LIMIT", default=8)),
+    "TIMEOUT": float(env("LOGIN_HASH_TIMEOUT", default=10)),
+    "RETRY_AFTER": int(env("LOGIN_HASH_RETRY_AFTER", default=1)),
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -159,11 +220,94 @@ REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
         "api.authentication.backends.ActiveSessionAuthentication",
     ),
-    "DEFAULT_RENDERER_CLASSES": ("rest_framework.renderers.JSONRenderer",),
+    # orjson-backed when installed, stdlib json otherwise (see api/renderers.py)
+    "DEFAULT_RENDERER_CLASSES": ("api.renderers.FastJSONRenderer",),
+    "DEFAULT_PARSER_CLASSES": (
+        "api.renderers.FastJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ),
+    # Keyset pagination on every list (see api/pagination.py)
+    "DEFAULT_PAGINATION_CLASS": "api.pagination.KeysetPagination",
+    "PAGE_SIZE": int(env("API_PAGE_SIZE", default=50)),
     # drf-spectacular schema class
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
 }
 
+API_PAGINATION = {
+    # upper bound for ?page_size=
+    "MAX_PAGE_SIZE": int(env("API_MAX_PAGE_SIZE", default=500)),
+    # Serve unpaginated arrays to requests without ?cursor= or ?page_size=, as every
+    # list did before pagination (the bundled react-ui still expects them)
+    "COMPAT": env("API_PAGINATION_COMPAT", default="1") not in ("0", "false", "False"),
+}
+
+# In-process cache of verified tokens used by ActiveSessionAuthentication.
+# Set AUTH_TOKEN_CACHE_SIZE=0 to disable it.
+_token_cache_alias = env("AUTH_TOKEN_CACHE_ALIAS", default="default")
+AUTH_TOKEN_CACHE = {
+    "MAX_ENTRIES": int(env("AUTH_TOKEN_CACHE_SIZE", default=1024)),
+    # Logouts and user changes are published in CACHES[ALIAS] and checked on every
+    # hit; with the local-memory backend they only reach the worker that made them
+    "ALIAS": _token_cache_alias,
+    # seconds; with a per-process cache this also bounds how long another worker may
+    # keep accepting a revoked token, hence the short default there
+    "TTL": float(
+        env("AUTH_TOKEN_CACHE_TTL", default=5 if CACHES[_token_cache_alias]["BACKEND"].endswith("LocMemCache") else 60)
+    ),
+}
+
+AUTH_SESSIONS = {
+    # lifetime of the tokens issued at login; older sessions are reaped
+    "TOKEN_LIFETIME_DAYS": int(env("AUTH_TOKEN_LIFETIME_DAYS", default=7)),
+    # seconds between the sweeps of a long-running `python manage.py reap_sessions`
+    # (one process per deployment); 0 sweeps once and exits, e.g. from cron
+    "SWEEP_INTERVAL": int(env("AUTH_SESSION_SWEEP_INTERVAL", default=0)),
+    "REAP_BATCH_SIZE": int(env("AUTH_SESSION_REAP_BATCH_SIZE", default=1000)),
+}
+
+# Optional stateless mode: login returns a short-lived access token (verified in memory,
+# no DB query per request) plus a refresh token for `POST /api/users/refresh`.
+# Revocations reach other workers within REVOCATION_SYNC_INTERVAL seconds.
+AUTH_STATELESS_TOKENS = {
+    "ENABLED": str(env("AUTH_STATELESS_TOKENS", default="False")).lower() in ("1", "true", "yes"),
+    "ACCESS_LIFETIME_SECONDS": int(env("AUTH_ACCESS_TOKEN_LIFETIME", default=300)),
+    "REVOCATION_SYNC_INTERVAL": float(env("AUTH_REVOCATION_SYNC_INTERVAL", default=5)),
+}
+
+# ##################################################################### #
+# ################### CLINIC                     ###################### #
+# ##################################################################### #
+
+# Length of the appointment slots offered by the availability endpoints
+CLINIC_SLOT_MINUTES = int(env("CLINIC_SLOT_MINUTES", default=60))
+
+# List endpoints render through precompiled column projections of their serializers
+# (api.clinic.projection); the output is identical, set CLINIC_FAST_LISTS=0 to use the
+# regular serializers instead
+CLINIC_FAST_LISTS = env("CLINIC_FAST_LISTS", default="1") not in ("0", "false", "False")
+
+# Per (veterinario, fecha) occupancy cached in CACHES[ALIAS]; entries are invalidated
+# when consultas or working hours change, TIMEOUT (seconds) bounds anything missed.
+# CLINIC_AVAILABILITY_CACHE_TIMEOUT=0 disables it.
+CLINIC_AVAILABILITY_CACHE = {
+    "ALIAS": env("CLINIC_AVAILABILITY_CACHE_ALIAS", default="default"),
+    "TIMEOUT": int(env("CLINIC_AVAILABILITY_CACHE_TIMEOUT", default=300)),
+}
+
+# Rows fetched per round trip by the streaming exports (/api/clinic/export/...)
+CLINIC_EXPORT_CHUNK_SIZE = int(env("CLINIC_EXPORT_CHUNK_SIZE", default=2000))
+
+# Rows validated and inserted per transaction by the bulk imports (/api/clinic/import/...)
+CLINIC_IMPORT_CHUNK_SIZE = int(env("CLINIC_IMPORT_CHUNK_SIZE", default=2000))
+
+# Consultas dated more than AFTER_DAYS ago are moved to ConsultaArchivada by
+# `manage.py archive_consultas`, BATCH_SIZE rows per transaction (see api/clinic/archive.py)
+CLINIC_ARCHIVE = {
+    "AFTER_DAYS": int(env("CLINIC_ARCHIVE_AFTER_DAYS", default=730)),
+    "BATCH_SIZE": int(env("CLINIC_ARCHIVE_BATCH_SIZE", default=1000)),
+}
+
 # drf-spectacular settings
 SPECTACULAR_SETTINGS = {
     "TITLE": "React Soft Dashboard Django API",
@@ -3,8 +3,13 @@
 Copyright (c) 2019 - present AppSeed.us
 """
 
+import os
+
 bind = '0.0.0.0:5005'
 workers = 2
+# Several threads per worker so a request waiting on the login hashing pool
+# does not block the rest of the traffic handled by that worker
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
 accesslog = '-'
 # Lower loglevel for production
 loglevel = 'info'